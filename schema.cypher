@@ -13,6 +13,11 @@ CREATE CONSTRAINT source_id_unique IF NOT EXISTS
 FOR (s:Source)
 REQUIRE s.source_id IS UNIQUE;
 
+// Graph version bumped by ingestion; retrieval reprojects the GDS entity graph when it moves.
+CREATE CONSTRAINT graph_meta_name_unique IF NOT EXISTS
+FOR (m:GraphMeta)
+REQUIRE m.name IS UNIQUE;
+
 // Prime property keys to avoid UnknownPropertyKeyWarning in Community edition.
 MERGE (e:Entity {entity_id: "__schema_dummy__"})
 SET e.entity_type = "__schema_dummy_type__"
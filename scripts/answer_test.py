@@ -13,8 +13,7 @@ sys.path.insert(0, str(ROOT))
 
 from scripts.ingest_test import QUESTION_INDICES
 from tkg_rag.logging_utils import setup_logging
-from tkg_rag.answer import generate_answer
-from tkg_rag.retrieve import retrieve
+from tkg_rag.service import RetrievalService
 import time
 
 logger = logging.getLogger(__name__)
@@ -35,32 +34,75 @@ def main() -> None:
         action="store_true",
         help="Use predefined question indices from ingest_test.",
     )
+    parser.add_argument(
+        "--async-retrieve",
+        action="store_true",
+        help="Use retrieve_async, which overlaps the retrieval stages.",
+    )
+    parser.add_argument(
+        "--all-questions",
+        action="store_true",
+        help="Use every question in local_base.jsonl instead of the predefined indices.",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Retrieve and answer the questions as one batch (retrieve_many).",
+    )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        help="Skip opening connections before the first question.",
+    )
     args = parser.parse_args()
+    with RetrievalService(warm_up=not args.no_warm_up, overlap_stages=args.async_retrieve) as service:
+        run(args, service)
+
 
-    if args.question_indices:
+def run(args: argparse.Namespace, service: RetrievalService) -> None:
+    if args.question_indices or args.all_questions:
         ANSWER_PATH = "/home/shellwitz/Documents/uni_stuff/nlp_uni/tkg_eval/rag_results_to_evaluate/daniel_diy_tkg/vec_search_tkg_answers.jsonl"
 
         with open("ect-qa/questions/local_base.jsonl", "r") as f:
             questions_raw = f.readlines()
 
 
+        indices = range(len(questions_raw)) if args.all_questions else QUESTION_INDICES
+
         with open(ANSWER_PATH, "a") as f:
             start_ts = time.time()
-            for q_i in QUESTION_INDICES:
-                question_obj = json.loads(questions_raw[q_i])
-                result = retrieve(question_obj["question"])
-                answer = generate_answer(result["question"], result["context"])
-                question_obj["predicted_answer"]  = answer
-                question_obj["context"] = result["context"]
-                logger.info("Question %d answer: %s", q_i, answer)
-                f.write(json.dumps(question_obj) + "\n")
+            if args.batch:
+                question_objs = [json.loads(questions_raw[q_i]) for q_i in indices]
+                results = service.retrieve_many([obj["question"] for obj in question_objs])
+                answers = service.answer_many(
+                    [result["question"] for result in results],
+                    [result["context"] for result in results],
+                )
+                for q_i, question_obj, result, answer in zip(indices, question_objs, results, answers):
+                    question_obj["predicted_answer"] = answer
+                    question_obj["context"] = result["context"]
+                    logger.info("Question %d answer: %s", q_i, answer)
+                    f.write(json.dumps(question_obj) + "\n")
+            else:
+                for q_i in indices:
+                    question_obj = json.loads(questions_raw[q_i])
+                    result = service.retrieve(question_obj["question"])
+                    answer = service.answer(result["question"], result["context"])
+                    question_obj["predicted_answer"]  = answer
+                    question_obj["context"] = result["context"]
+                    logger.info("Question %d answer: %s", q_i, answer)
+                    f.write(json.dumps(question_obj) + "\n")
             end_ts = time.time()
             elapsed = end_ts - start_ts
             logger.info("RAG questions eval from question indices took time: %.2f seconds", elapsed)
+            if service.cache_stats() is not None:
+                logger.info("Query cache: %s", service.cache_stats())
+            if service.fast_path_stats() is not None:
+                logger.info("Query fast path: %s", service.fast_path_stats())
     else:
-        payload = retrieve(args.question)
+        payload = service.retrieve(args.question)
         logger.info("Context:\n%s", payload["context"])
-        logger.info("Answer:\n%s", generate_answer(args.question, payload["context"]))
+        logger.info("Answer:\n%s", service.answer(args.question, payload["context"]))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+#!.venv/bin/python3
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from tkg_rag.logging_utils import setup_logging
+from tkg_rag.bulk_import import build_import_files, neo4j_admin_import_args
+from tkg_rag.ingest import CorpusDocument
+from tkg_rag.ingest_journal import reset_ingest_journal
+
+logger = logging.getLogger(__name__)
+
+
+def _corpus_documents(entries):
+    for entry in entries:
+        doc_uri = entry["stock_code"] + "/" + entry["year"] + "/" + entry["quarter"]
+        yield CorpusDocument(entry["raw_content"], source_uri=doc_uri, source_last_modified=time.time())
+
+
+def load_into_neo4j():
+    # neo4j-admin import needs the database stopped; the entrypoint recreates the
+    # constraints, fulltext and vector indexes when the container comes back up.
+    admin_args = " ".join(neo4j_admin_import_args())
+    subprocess.run("docker compose stop tkg-neo4j", shell=True, check=True)
+    subprocess.run(
+        f"docker compose run --rm --no-deps --entrypoint neo4j-admin tkg-neo4j {admin_args}",
+        shell=True,
+        check=True,
+    )
+    subprocess.run("docker compose up -d", shell=True, check=True)
+    # The journal describes whatever graph was replaced.
+    reset_ingest_journal()
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Build neo4j-admin import files for the whole corpus.")
+    parser.add_argument(
+        "-o",
+        "--out-dir",
+        default=os.getenv("TKG_IMPORT_DIR", "import"),
+        help="Directory for the CSV files (mounted at /import in the Neo4j container).",
+    )
+    parser.add_argument(
+        "-r",
+        "--reuse-extractions",
+        action="store_true",
+        help="Replay cached LLM extractions for unchanged chunks/prompts instead of calling the LLM.",
+    )
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="Stop Neo4j, replace the database with the import files and start it again.",
+    )
+    args = parser.parse_args()
+
+    if args.reuse_extractions:
+        os.environ["INGEST_REUSE_EXTRACTIONS"] = "true"
+
+    with open("ect-qa/extracted/corpus/base.jsonl", "r") as f:
+        entries = [json.loads(line) for line in f]
+
+    def on_document(i, document, output):
+        logger.info("Built doc_id %s (%s/%s): %s", document.source_uri, i + 1, len(entries), output)
+
+    start_ts = time.time()
+    counts = build_import_files(_corpus_documents(entries), args.out_dir, on_document=on_document)
+    logger.info("%s", counts)
+    logger.info("Total build time: %.2f seconds", time.time() - start_ts)
+
+    if args.load:
+        try:
+            load_into_neo4j()
+        except subprocess.CalledProcessError as e:
+            logger.error("neo4j-admin import failed: %s", e)
+            exit(1)
+        logger.info("Import finished; Neo4j is restarting and rebuilding its indexes.")
+    else:
+        logger.info("Load with: neo4j-admin %s", " ".join(neo4j_admin_import_args()))
+
+
+if __name__ == "__main__":
+    main()
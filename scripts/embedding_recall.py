@@ -0,0 +1,137 @@
+#!.venv/bin/python3
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import defaultdict
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from tkg_rag.chunking import chunk_settings
+from tkg_rag.embedding_storage import embedding_truncate, int8_cosine, quantize_int8, truncate_embeddings
+from tkg_rag.ingest import CorpusDocument, document_chunks, embed_source_texts
+from tkg_rag.logging_utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _normalized(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0.0)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = [len(set(t) & set(f)) / len(t) for t, f in zip(truth.tolist(), found.tolist())]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def _int8_scores(queries: np.ndarray, codes: list) -> np.ndarray:
+    return np.stack([int8_cosine(q, codes) for q in queries])
+
+
+def _rescored_top_k(coarse: np.ndarray, exact: np.ndarray, k: int, oversample: int) -> np.ndarray:
+    # ANN stand-in: top k*oversample by the coarse scores, re-ranked by the exact ones.
+    candidates = _top_k(coarse, k * oversample)
+    rescored = np.take_along_axis(exact, candidates, axis=1)
+    order = rescored.argsort(axis=1)[:, ::-1][:, :k]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def load_eval_set(limit: int):
+    with open("ect-qa/questions/local_base.jsonl", "r") as f:
+        questions = [json.loads(line) for line in f]
+    questions = [q for q in questions if q["evidence_list"]][:limit]
+    stock_codes = {e["stock_code"] for q in questions for e in q["evidence_list"]}
+    with open("ect-qa/extracted/corpus/base.jsonl", "r") as f:
+        entries = [json.loads(line) for line in f]
+    by_stock_code = defaultdict(list)
+    for entry in entries:
+        by_stock_code[entry["stock_code"]].append(entry)
+    documents = [
+        CorpusDocument(
+            entry["raw_content"],
+            source_uri=entry["stock_code"] + "/" + entry["year"] + "/" + entry["quarter"],
+        )
+        for stock_code in sorted(stock_codes)
+        for entry in by_stock_code[stock_code]
+    ]
+    return [q["question"] for q in questions], documents
+
+
+def main() -> None:
+    setup_logging()
+    parser = argparse.ArgumentParser(
+        description="Compare chunk retrieval recall of compact embedding formats against full precision on ECT-QA."
+    )
+    parser.add_argument("-n", "--questions", type=int, default=50, help="Number of answerable local questions.")
+    parser.add_argument("-k", type=int, default=8, help="Recall cut-off (CHUNK_VECTOR_K).")
+    parser.add_argument("--dims", default="256,512,1024,1536", help="Comma-separated truncated dimensions to test.")
+    parser.add_argument("--oversample", type=int, default=4, help="Candidates per result for int8 rescoring.")
+    parser.add_argument("-o", "--output", help="Also write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    if embedding_truncate() == "api":
+        parser.error("EMBEDDING_TRUNCATE=api returns truncated vectors; use off or local to measure against full precision")
+
+    questions, documents = load_eval_set(args.questions)
+    chunk_options = chunk_settings()
+    chunks = [chunk for document in documents for chunk in document_chunks(document, chunk_options)[1]]
+    logger.info("Evaluating %s questions against %s chunks from %s documents", len(questions), len(chunks), len(documents))
+
+    chunk_full = np.asarray(embed_source_texts(chunks), dtype=np.float64)
+    query_full = np.asarray(embed_source_texts(questions), dtype=np.float64)
+    full_dim = chunk_full.shape[1]
+    exact = _normalized(query_full) @ _normalized(chunk_full).T
+    truth = _top_k(exact, args.k)
+
+    rows = []
+
+    def report(name: str, found: np.ndarray, bytes_per_vector: int) -> None:
+        rows.append({"format": name, "recall": _recall(truth, found), "bytes_per_vector": bytes_per_vector})
+
+    report(f"float64[{full_dim}] (reference)", truth, 8 * full_dim)
+    f32 = _normalized(query_full.astype(np.float32)) @ _normalized(chunk_full.astype(np.float32)).T
+    report(f"float32[{full_dim}]", _top_k(f32, args.k), 4 * full_dim)
+    codes = [quantize_int8(v) for v in chunk_full]
+    int8_full = _int8_scores(query_full, codes)
+    report(f"int8[{full_dim}]", _top_k(int8_full, args.k), full_dim)
+
+    for dim in sorted(int(d) for d in args.dims.split(",") if d.strip()):
+        if dim >= full_dim:
+            continue
+        truncated = truncate_embeddings(query_full, dim) @ truncate_embeddings(chunk_full, dim).T
+        report(f"float32[{dim}]", _top_k(truncated, args.k), 4 * dim)
+        report(
+            f"float32[{dim}] + int8[{full_dim}] rescoring x{args.oversample}",
+            _rescored_top_k(truncated, int8_full, args.k, args.oversample),
+            4 * dim + full_dim,
+        )
+
+    width = max(len(row["format"]) for row in rows)
+    print(f"recall@{args.k} vs float64[{full_dim}] over {len(questions)} questions, {len(chunks)} chunks")
+    print(f"{'format'.ljust(width)}  recall  bytes/vector")
+    for row in rows:
+        print(f"{row['format'].ljust(width)}  {row['recall']:.4f}  {row['bytes_per_vector']:>12}")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"k": args.k, "questions": len(questions), "chunks": len(chunks), "rows": rows}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
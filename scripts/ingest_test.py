@@ -3,6 +3,7 @@ from collections import defaultdict
 import json
 import argparse
 import logging
+import os
 import subprocess
 import time
 import sys
@@ -15,7 +16,14 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from tkg_rag.logging_utils import setup_logging
-from tkg_rag.ingest import ingest_text
+from tkg_rag.ingest import CorpusDocument, ingest_corpus, ingest_text
+from tkg_rag.ingest_journal import (
+    dead_letter_path,
+    finish_dead_letters,
+    journal_enabled,
+    reset_ingest_journal,
+    take_dead_letters,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -32,27 +40,41 @@ def insert_simple(base_data):
 
 QUESTION_INDICES = range(10) #[4, 5, 6,7, 8]
 
+def _corpus_documents(entries):
+    for entry in entries:
+        doc_uri = entry["stock_code"] + "/" + entry["year"] + "/" + entry["quarter"]
+        yield CorpusDocument(entry["raw_content"], source_uri=doc_uri, source_last_modified=time.time())
+
+
+def _log_document(total):
+    def on_document(i, document, output):
+        logger.info("Ingested doc_id %s (%s/%s): %s", document.source_uri, i + 1, total, output)
+    return on_document
+
+
 def insert_all(base_data):
     all_start_ts = time.time()
-    for i, line in enumerate(base_data):
-        info = json.loads(line)
-        text = info["raw_content"]
-        doc_uri = info["stock_code"] + "/" + info["year"] + "/" + info["quarter"]
-
-        logger.info(
-            "Ingesting text data for doc_id %s (%s/%s)",
-            doc_uri,
-            i + 1,
-            len(base_data),
-        )
-        i_start_ts = time.time()
-        output = ingest_text(text, source_uri=doc_uri, source_last_modified=time.time())
-        i_end_ts = time.time()
-        logger.info("Ingestion time: %.2f seconds", i_end_ts - i_start_ts)
-        logger.info("%s", output)
+    entries = [json.loads(line) for line in base_data]
+    result = ingest_corpus(_corpus_documents(entries), on_document=_log_document(len(entries)))
+    logger.info("%s", result["totals"])
     all_end_ts = time.time()
     logger.info("Total ingestion time for all documents: %.2f seconds", all_end_ts - all_start_ts)
 
+def insert_dead_letters(base_data):
+    # Re-ingests the documents of dead-lettered chunks; chunks already in the graph are skipped.
+    failed = take_dead_letters(dead_letter_path())
+    failed_uris = {entry["source_uri"] for entry in failed}
+    logger.info("Retrying %s failed chunks from %s documents", len(failed), len(failed_uris))
+    entries = [json.loads(line) for line in base_data]
+    to_retry = [
+        entry for entry in entries
+        if entry["stock_code"] + "/" + entry["year"] + "/" + entry["quarter"] in failed_uris
+    ]
+    result = ingest_corpus(_corpus_documents(to_retry), on_document=_log_document(len(to_retry)))
+    logger.info("%s", result["totals"])
+    # Chunks that failed again are back in the dead-letter file.
+    finish_dead_letters(dead_letter_path())
+
 def insert_wrt_q_indices(base_data):
 
     with open("ect-qa/questions/local_base.jsonl", "r") as f:
@@ -85,21 +107,8 @@ def insert_wrt_q_indices(base_data):
     stock_codes_to_insert = {entry["stock_code"] for entry in to_insert}
     logger.info("Ingesting documents for stock codes: %s", ", ".join(stock_codes_to_insert))
 
-    for i, entry in enumerate(to_insert):
-        text = entry["raw_content"]
-        doc_uri = entry["stock_code"] + "/" + entry["year"] + "/" + entry["quarter"]
-
-        logger.info(
-            "Ingesting text data for doc_id %s (%s/%s)",
-            doc_uri,
-            i + 1,
-            len(to_insert),
-        )
-        i_start_ts = time.time()
-        output = ingest_text(text, source_uri=doc_uri, source_last_modified=time.time())
-        i_end_ts = time.time()
-        logger.info("Ingestion time: %.2f seconds", i_end_ts - i_start_ts)
-        logger.info("%s", output)
+    result = ingest_corpus(_corpus_documents(to_insert), on_document=_log_document(len(to_insert)))
+    logger.info("%s", result["totals"])
     all_end_ts = time.time()
     logger.info("Total ingestion time for question-index-based documents: %.2f seconds", all_end_ts - all_start_ts)
     
@@ -110,8 +119,33 @@ def main():
     parser.add_argument("-fb", "--fresh-build", action="store_true", help="Rebuild docker images and restart containers.")
     parser.add_argument("-q", "--question-indices", action="store_true", help="Use 5 questions with solutions to then be able to compare RAG output to solutions.")
     parser.add_argument("-a", "--all", action="store_true", help="Ingest all documents in base.jsonl.")
+    parser.add_argument(
+        "-r",
+        "--reuse-extractions",
+        action="store_true",
+        help="Replay cached LLM extractions for unchanged chunks/prompts instead of calling the LLM.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip sources the ingest journal marks finished and replay journaled extractions for pending chunks.",
+    )
+    parser.add_argument(
+        "--retry-dead-letter",
+        action="store_true",
+        help="Re-ingest only the documents with chunks in the dead-letter file.",
+    )
     args = parser.parse_args()
 
+    if args.resume and (args.fresh or args.fresh_build):
+        parser.error("--resume cannot be combined with --fresh/--fresh-build")
+    if args.resume and not journal_enabled():
+        parser.error("--resume needs the ingest journal; unset INGEST_JOURNAL=false")
+    if args.reuse_extractions:
+        os.environ["INGEST_REUSE_EXTRACTIONS"] = "true"
+    if args.resume:
+        os.environ["INGEST_RESUME"] = "true"
+
     build = ""
     if args.fresh or args.fresh_build:
         if args.fresh_build:
@@ -127,11 +161,15 @@ def main():
             logger.error("Docker setup failed: %s", e)
             exit(1)
         logger.info("Docker containers are up and running.")
+        # The journal describes the graph that was just dropped.
+        reset_ingest_journal()
 
     with open("ect-qa/extracted/corpus/base.jsonl", "r") as f:
         base_data = f.readlines()
 
-        if args.question_indices:
+        if args.retry_dead_letter:
+            insert_dead_letters(base_data)
+        elif args.question_indices:
             insert_wrt_q_indices(base_data)
         elif args.all:
             insert_all(base_data)
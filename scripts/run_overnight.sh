@@ -3,4 +3,4 @@
 PROJECT_DIR="$HOME/Documents/uni_stuff/nlp_uni/tkg"
 
 systemd-inhibit --why="overnight tk rag insert" --mode=block bash -lc \
-"source $PROJECT_DIR/.venv/bin/activate && python $PROJECT_DIR/scripts/ingest_test.py -f -q" # -a for all
\ No newline at end of file
+"source $PROJECT_DIR/.venv/bin/activate && python $PROJECT_DIR/scripts/ingest_test.py -f -q" # -a for all, --resume instead of -f to continue a crashed run
\ No newline at end of file
@@ -0,0 +1,97 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tkg_rag import bulk_import as bulk_import_module
+from tkg_rag.bulk_import import BulkGraphBuilder, build_import_files, neo4j_admin_import_args
+from tkg_rag.graph_writer import ChunkPayload
+from tkg_rag.ingest import CorpusDocument
+from tkg_rag.models import ExtractedEntity, ExtractedRelation, TimestampRange
+
+
+def _payload(chunk_id, relation_embedding):
+    return ChunkPayload(
+        text=f"text of {chunk_id}",
+        embedding=[0.5, 0.25],
+        entities=[ExtractedEntity("Acme Corp", "company"), ExtractedEntity("Jane Doe", "person")],
+        relations=[ExtractedRelation("2020", "Jane Doe", "Acme Corp", "Jane Doe leads Acme Corp")],
+        relation_embeddings=[relation_embedding],
+        timestamp_ranges={"2020": TimestampRange("2020-01-01", "2020-12-31")},
+        source_id="s1",
+        chunk_id=chunk_id,
+    )
+
+
+def _rows(directory, filename):
+    with open(os.path.join(directory, filename), encoding="utf-8", newline="") as handle:
+        return list(csv.reader(handle))
+
+
+class TestBulkGraphBuilder(unittest.TestCase):
+    def test_resolves_and_dedups_across_batches(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            builder = BulkGraphBuilder(directory)
+            builder.add_source("s1", "ACME/2020/Q1", 1_600_000_000, None)
+            builder.add_batch([_payload("c1", [1.0, 0.0])])
+            builder.add_batch([_payload("c2", [1.0, 0.0]), _payload("c3", [0.0, 1.0])])
+            builder.add_source("s1", "ACME/2020/Q1", 1_600_000_000, "hash")
+            counts = builder.close()
+
+            self.assertEqual({"chunks": 3, "sources": 1, "entities": 2, "relations": 2, "relations_merged": 1}, counts)
+            self.assertEqual(["chunk_id:ID(Chunk)", "text", "embedding:float[]"], _rows(directory, "chunks.csv")[0])
+            self.assertEqual(["c1", "text of c1", "0.5|0.25"], _rows(directory, "chunks.csv")[1])
+            self.assertEqual(3, len(_rows(directory, "from_source.csv")) - 1)
+            self.assertEqual(6, len(_rows(directory, "mentions.csv")) - 1)
+
+            entity_ids = {row[1]: row[0] for row in _rows(directory, "entities.csv")[1:]}
+            edges = _rows(directory, "related_to.csv")[1:]
+            self.assertEqual({(entity_ids["Jane Doe"], entity_ids["Acme Corp"])}, {(e[0], e[1]) for e in edges})
+            self.assertEqual(["c1|c2", "c3"], sorted(e[6] for e in edges))
+            self.assertEqual({("2020-01-01", "2020-12-31")}, {(e[4], e[5]) for e in edges})
+
+            source = _rows(directory, "sources.csv")[1]
+            self.assertEqual(["s1", "ACME/2020/Q1", "2020-09-13T12:26:40+00:00", "hash"], source)
+
+    def test_import_args_cover_every_file(self) -> None:
+        args = neo4j_admin_import_args("/import")
+
+        self.assertEqual(["database", "import", "full", "neo4j"], args[:4])
+        self.assertIn("--nodes=Entity=/import/entities.csv", args)
+        self.assertIn("--relationships=RELATED_TO=/import/related_to.csv", args)
+        self.assertIn("--array-delimiter=|", args)
+
+
+def _extractions(items, on_error=None, **_):
+    # Fails the second chunk of the first document, extracts nothing for the rest.
+    for key, _chunk in items:
+        if key == (0, 1):
+            on_error(key, RuntimeError("llm down"))
+        else:
+            yield key, [], []
+
+
+class TestBuildImportFiles(unittest.TestCase):
+    def test_reports_documents_and_fingerprints_only_complete_sources(self) -> None:
+        documents = [CorpusDocument("first", source_id="s1"), CorpusDocument("second", source_id="s2")]
+        chunks = lambda document, _options: (document.source_id, ["a", "b"], [f"{document.source_id}-a", f"{document.source_id}-b"])
+        reported = []
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, {"INGEST_DEAD_LETTER_PATH": os.path.join(directory, "dead.jsonl")}), \
+                mock.patch.object(bulk_import_module, "chunk_deduper", lambda: None), \
+                mock.patch.object(bulk_import_module, "document_chunks", chunks), \
+                mock.patch.object(bulk_import_module, "embed_chunks", lambda texts, max_retries: ([[1.0]] * len(texts), [None] * len(texts))), \
+                mock.patch.object(bulk_import_module, "iter_keyed_extractions", _extractions), \
+                mock.patch.object(bulk_import_module, "iter_embedded_payloads", lambda payloads, *args: payloads):
+            counts = build_import_files(documents, directory, on_document=lambda i, _d, c: reported.append((i, c)))
+            sources = {row[0]: row[3] for row in _rows(directory, "sources.csv")[1:]}
+
+        self.assertEqual(
+            [(0, {"chunks": 1, "failed": 1}), (1, {"chunks": 2, "failed": 0})],
+            sorted(reported, key=lambda r: r[0]),
+        )
+        self.assertEqual(1, counts["failed_chunks"])
+        self.assertEqual("", sources["s1"])
+        self.assertNotEqual("", sources["s2"])
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tkg_rag import ingest as ingest_module
+from tkg_rag.chunk_dedup import BOILERPLATE, EXACT, ChunkDedupIndex, ChunkDeduper, MinHasher, chunk_dedup_index
+from tkg_rag.extraction_cache import ExtractionCache, extraction_key, prompt_hash
+from tkg_rag.models import ExtractedEntity, ExtractedRelation
+
+SAFE_HARBOR = (
+    "Today's call contains forward-looking statements within the meaning of the Private Securities "
+    "Litigation Reform Act. Actual results may differ materially from those projected. Please refer "
+    "to our filings with the SEC for a discussion of the risk factors that could affect results. "
+    "We undertake no obligation to update any forward-looking statement."
+)
+
+
+class TestMinHash(unittest.TestCase):
+    def test_signature_similarity_tracks_overlap(self) -> None:
+        hasher = MinHasher(128)
+        base = hasher.signature(SAFE_HARBOR)
+        near = hasher.signature(SAFE_HARBOR.replace("Today's call", "This call"))
+        other = hasher.signature("Revenue grew twelve percent on strong demand for our cloud products in Europe.")
+
+        self.assertGreater((base == near).mean(), 0.7)
+        self.assertLess((base == other).mean(), 0.1)
+
+
+class TestChunkDedupIndex(unittest.TestCase):
+    def test_clusters_near_duplicates_and_counts_distinct_chunk_ids(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = ChunkDedupIndex(os.path.join(tmp, "dedup.sqlite3"))
+            first = index.add(SAFE_HARBOR, "a1")
+            near = index.add(SAFE_HARBOR.replace("Today's call", "This call"), "b1")
+            again = index.add(SAFE_HARBOR, "a1")
+            exact = index.add(SAFE_HARBOR, "c1")
+
+            self.assertFalse(first.exact)
+            self.assertEqual(first.cluster_id, near.cluster_id)
+            self.assertEqual(2, again.cluster_size)
+            self.assertTrue(exact.exact)
+            self.assertEqual(3, exact.cluster_size)
+
+            reopened = ChunkDedupIndex(os.path.join(tmp, "dedup.sqlite3"))
+            self.assertEqual(4, reopened.add(SAFE_HARBOR, "d1").cluster_size)
+
+
+class TestChunkDeduper(unittest.TestCase):
+    def test_reuses_exact_extractions_and_skips_boilerplate(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {"INGEST_BOILERPLATE_MIN_COPIES": "3"}):
+            extracted = {}
+            deduper = ChunkDeduper(ChunkDedupIndex(os.path.join(tmp, "dedup.sqlite3")), extracted.get, 100)
+            chunks = [SAFE_HARBOR, "Acme hired Jane Doe as chief executive in 2020.", SAFE_HARBOR]
+            decisions = deduper.classify(chunks[:2], ["a1", "a2"])
+            entities = [ExtractedEntity("Acme", "company")]
+            relations = [ExtractedRelation("2020", "Acme", "Jane Doe", "Acme hired Jane Doe")]
+            # The first copy went to the LLM, which filled the extraction cache.
+            extracted[chunks[1]] = (entities, relations)
+
+            self.assertEqual([None, None], decisions)
+            self.assertEqual([EXACT], deduper.classify([chunks[1]], ["b2"]))
+            self.assertEqual((entities, relations), deduper.replay(chunks[1], EXACT))
+            self.assertEqual([EXACT, BOILERPLATE], deduper.classify([chunks[2], chunks[2]], ["b1", "c1"]))
+            self.assertEqual(([], []), deduper.replay(SAFE_HARBOR, BOILERPLATE))
+            self.assertIsNone(deduper.replay(SAFE_HARBOR, EXACT))
+            stats = deduper.stats()
+            self.assertEqual(2, stats["llm_calls_avoided"])
+            self.assertEqual(1, stats["boilerplate_skipped"])
+            self.assertGreater(stats["prompt_tokens_avoided"], 200)
+
+    def test_boilerplate_skip_is_off_by_default(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ):
+            os.environ.pop("INGEST_BOILERPLATE_MIN_COPIES", None)
+            deduper = ChunkDeduper(ChunkDedupIndex(os.path.join(tmp, "dedup.sqlite3")), lambda chunk: None, 100)
+
+            self.assertEqual([None] + [EXACT] * 5, deduper.classify([SAFE_HARBOR] * 6, [f"a{i}" for i in range(6)]))
+
+    def test_copies_with_different_dates_or_figures_are_still_extracted(self) -> None:
+        template = (
+            SAFE_HARBOR
+            + " Joining me on the call are our chief executive officer and our chief financial officer, who will"
+            " review the results and then take your questions. A replay of this call will be available on our"
+            " investor relations website. Revenue for the quarter ended {date} was {amount} million."
+        )
+        dated = [
+            template.format(date="March 31, 2020", amount="312"),
+            template.format(date="June 30, 2020", amount="298"),
+            template.format(date="March 31, 2021", amount="312"),
+            template.format(date="March 31, 2020", amount="313"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {"INGEST_BOILERPLATE_MIN_COPIES": "2"}):
+            index = ChunkDedupIndex(os.path.join(tmp, "dedup.sqlite3"))
+            deduper = ChunkDeduper(index, lambda chunk: None, 100)
+
+            decisions = deduper.classify(dated, [f"q{i}" for i in range(4)])
+            repeat = deduper.classify([dated[0]], ["q5"])
+
+            self.assertEqual(1, index.stats()["clusters"])
+        self.assertEqual([None, None, None, None], decisions)
+        self.assertEqual([BOILERPLATE], repeat)
+
+class TestExactRepeatReplay(unittest.TestCase):
+    def test_dedup_is_off_by_default(self) -> None:
+        with mock.patch.dict(os.environ):
+            os.environ.pop("INGEST_CHUNK_DEDUP", None)
+            self.assertIsNone(chunk_dedup_index())
+
+    def test_exact_repeats_replay_from_the_extraction_cache(self) -> None:
+        raw = '("entity"|"Acme Corp"|"company");;("entity"|"Beta LLC"|"company")'
+        chunk = "Acme Corp bought Beta LLC."
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ExtractionCache(os.path.join(tmp, "extractions.sqlite3"))
+            with mock.patch.object(ingest_module, "LLM_MODEL", "m"), \
+                    mock.patch.object(ingest_module, "extraction_cache", lambda: cache), \
+                    mock.patch.dict(os.environ, {"INGEST_LLM_PACK_TOKENS": "0"}):
+                self.assertIsNone(ingest_module.cached_extraction(chunk))
+                system_prompt, user_prompt_template, _ = ingest_module._build_extraction_prompts()
+                cache.put(
+                    extraction_key("m", prompt_hash(system_prompt, user_prompt_template), chunk),
+                    "m",
+                    "p",
+                    raw,
+                )
+                entities, relations = ingest_module.cached_extraction(chunk)
+
+        self.assertEqual(["Acme Corp", "Beta LLC"], [e.name for e in entities])
+        self.assertEqual([], relations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from tkg_rag.chunking import chunk_spans
+from tkg_rag.ingest import chunk_text
+
+
+class TestChunkSpans(unittest.TestCase):
+    def test_normalizes_separators_like_chunk_text(self) -> None:
+        text = "  First one.   Second one!\n \n-- \nNew para?  Yes.\n\n\nLast.  "
+
+        spans = chunk_spans(text, max_size=1000, overlap=0)
+
+        self.assertEqual(1, len(spans))
+        self.assertEqual("First one. Second one!\n\nNew para? Yes.\n\nLast.", spans[0].text)
+        self.assertEqual(2, spans[0].start)
+        self.assertEqual(text.rindex("Last.") + len("Last."), spans[0].end)
+
+    def test_overlap_repeats_trailing_units(self) -> None:
+        text = "Aaaa aaaa. Bbbb bbbb. Cccc cccc. Dddd dddd."
+
+        self.assertEqual(
+            ["Aaaa aaaa. Bbbb bbbb.", "Bbbb bbbb. Cccc cccc.", "Cccc cccc. Dddd dddd."],
+            chunk_text(text, max_chars=21, overlap=5),
+        )
+        self.assertEqual(
+            ["Aaaa aaaa. Bbbb bbbb.", "Cccc cccc. Dddd dddd."],
+            chunk_text(text, max_chars=21, overlap=0),
+        )
+
+    def test_oversized_unit_becomes_its_own_chunk(self) -> None:
+        text = "Short. " + "x" * 50 + ". Tail."
+
+        chunks = chunk_text(text, max_chars=20, overlap=0)
+
+        self.assertEqual(["Short.", "x" * 50 + ".", "Tail."], chunks)
+
+    def test_token_budget_uses_length_fn(self) -> None:
+        words = lambda s: len(s.split())
+        text = "one two three. four five six. seven eight nine."
+
+        spans = chunk_spans(text, max_size=6, overlap=0, length_fn=words)
+
+        self.assertEqual(["one two three. four five six.", "seven eight nine."], [s.text for s in spans])
+        self.assertEqual([6, 3], [s.size for s in spans])
+
+    def test_verbatim_span_is_a_slice_of_the_document(self) -> None:
+        text = "One. Two.\n\nThree."
+
+        span = chunk_spans(text, max_size=100, overlap=0)[0]
+
+        self.assertEqual(text[span.start:span.end], span.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from tkg_rag.embedding_cache import EmbeddingCache, text_key
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_round_trip_and_counters(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(tmp, "test-model", 3, max_entries=10)
+            cache.put_many(["a"], [[1.0, 2.0, 3.0]])
+
+            self.assertEqual([[1.0, 2.0, 3.0], None], cache.get_many(["a", "b"]))
+            self.assertEqual(1, cache.hits)
+            self.assertEqual(1, cache.misses)
+
+    def test_evicts_least_recently_used(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(tmp, "test-model", 2, max_entries=2)
+            cache.put_many(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+            cache.get_many(["a"])
+            cache.put_many(["c"], [[1.0, 1.0]])
+
+            self.assertEqual([[1.0, 0.0], None, [1.0, 1.0]], cache.get_many(["a", "b", "c"]))
+            self.assertEqual(1, cache.evictions)
+
+    def test_persists_across_instances(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(tmp, "test-model", 2, max_entries=4)
+            cache.put_many(["a"], [[0.5, 0.25]])
+            cache.flush()
+
+            reopened = EmbeddingCache(tmp, "test-model", 2, max_entries=4)
+
+            self.assertEqual([[0.5, 0.25]], reopened.get_many(["a"]))
+            self.assertEqual([None], EmbeddingCache(tmp, "other-model", 2, 4).get_many(["a"]))
+
+    def test_row_rewritten_without_index_update_reads_as_miss(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = EmbeddingCache(tmp, "test-model", 2, max_entries=4)
+            cache.put_many(["a"], [[1.0, 0.0]])
+            # A writer killed after reusing a's row for "b" but before committing the index.
+            (row,) = cache._conn.execute("SELECT row FROM rows WHERE key = ?", (text_key("a"),)).fetchone()
+            cache._vectors[row] = [9.0, 9.0]
+            cache._keys[row] = np.frombuffer(bytes.fromhex(text_key("b")), dtype=np.uint8)
+
+            self.assertEqual([None], cache.get_many(["a"]))
+
+    def test_instances_sharing_a_directory_use_distinct_rows(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            first = EmbeddingCache(tmp, "test-model", 2, max_entries=4)
+            second = EmbeddingCache(tmp, "test-model", 2, max_entries=4)
+            first.put_many(["a"], [[1.0, 0.0]])
+            second.put_many(["b"], [[0.0, 1.0]])
+            first.put_many(["c"], [[1.0, 1.0]])
+
+            self.assertEqual([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], second.get_many(["a", "b", "c"]))
+            self.assertEqual([[0.0, 1.0]], first.get_many(["b"]))
+
+    def test_row_rewritten_while_being_read_reads_as_miss(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            reader = EmbeddingCache(tmp, "test-model", 2, max_entries=1)
+            writer = EmbeddingCache(tmp, "test-model", 2, max_entries=1)
+            reader.put_many(["a"], [[1.0, 0.0]])
+            self.assertEqual([[1.0, 0.0]], reader.get_many(["a"]))
+            vectors = reader._vectors
+
+            class _RewrittenOnRead:
+                # The writer evicts "a" for "b" in its only row between the reader's key
+                # check and its copy of the vector.
+                def __getitem__(self, row):
+                    writer.put_many(["b"], [[0.0, 1.0]])
+                    return vectors[row]
+
+            reader._vectors = _RewrittenOnRead()
+            self.assertEqual([None], reader.get_many(["a"]))
+            reader._vectors = vectors
+            self.assertEqual([[0.0, 1.0]], reader.get_many(["b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from tkg_rag.embedding_stage import iter_embedded_payloads
+from tkg_rag.graph_writer import ChunkPayload
+from tkg_rag.models import ExtractedRelation
+
+
+def _payload(text: str, descriptions) -> ChunkPayload:
+    relations = [ExtractedRelation("2021", "A", "B", d) for d in descriptions]
+    return ChunkPayload(text, [0.0], [], relations, [], {})
+
+
+class TestIterEmbeddedPayloads(unittest.TestCase):
+    def test_batches_relation_texts_across_chunks(self) -> None:
+        calls = []
+
+        def fake_embed(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        payloads = [_payload("c1", ["aaaa", "bb"]), _payload("c2", []), _payload("c3", ["cccccc"])]
+
+        out = list(iter_embedded_payloads(payloads, fake_embed, max_batch_tokens=1000, max_inflight=2))
+
+        self.assertEqual([["aaaa", "bb", "cccccc"]], calls)
+        by_text = {p.text: p.relation_embeddings for p in out}
+        self.assertEqual([[4.0], [2.0]], by_text["c1"])
+        self.assertEqual([], by_text["c2"])
+        self.assertEqual([[6.0]], by_text["c3"])
+
+    def test_splits_batches_on_token_budget(self) -> None:
+        calls = []
+
+        def fake_embed(texts):
+            calls.append(list(texts))
+            return [[0.0] for _ in texts]
+
+        payloads = [_payload(f"c{i}", ["x" * 40]) for i in range(3)]
+
+        out = list(iter_embedded_payloads(payloads, fake_embed, max_batch_tokens=15, max_inflight=1))
+
+        self.assertEqual(3, len(out))
+        self.assertEqual([1, 1, 1], [len(c) for c in calls])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from tkg_rag.embedding_storage import int8_cosine, quantize_int8, stored_vectors, truncate_embeddings
+
+
+class TestEmbeddingStorage(unittest.TestCase):
+    def test_float32_storage_is_default(self) -> None:
+        with mock.patch.dict(os.environ, {}, clear=True):
+            vectors = stored_vectors([[1.0, 2.0], [3.0, 4.0]])
+
+        self.assertEqual(np.float32, vectors[0].dtype)
+        self.assertEqual([3.0, 4.0], vectors[1].tolist())
+
+    def test_float64_storage_keeps_lists(self) -> None:
+        with mock.patch.dict(os.environ, {"EMBEDDING_STORAGE": "float64"}):
+            self.assertEqual([[0.6, 0.8]], stored_vectors([[3.0, 4.0, 12.0]], 2))
+
+    def test_truncation_renormalizes(self) -> None:
+        truncated = truncate_embeddings([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]], 2)
+
+        np.testing.assert_allclose([[0.6, 0.8], [0.0, 0.0]], truncated)
+
+    def test_int8_cosine_tracks_float_cosine(self) -> None:
+        rng = np.random.default_rng(7)
+        vectors = rng.normal(size=(5, 64))
+        query = rng.normal(size=64)
+        exact = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+
+        scores = int8_cosine(query, [quantize_int8(v) for v in vectors] + [None, b"\x01"])
+
+        np.testing.assert_allclose(exact, scores[:5], atol=0.02)
+        self.assertEqual([0.0, 0.0], scores[5:].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
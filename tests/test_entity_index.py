@@ -0,0 +1,84 @@
+import os
+import unittest
+from unittest import mock
+
+from tkg_rag import entity_index as entity_index_module
+from tkg_rag.entity_index import EntityIndex
+
+
+class TestEntityIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = EntityIndex.from_rows([
+            {"entity_id": "e1", "name": "Crocs Inc", "entity_type": "company", "aliases": ["Crocs Inc", "Crocs"]},
+            {"entity_id": "e2", "name": "Crocs Clog", "entity_type": "product", "aliases": ["Crocs Clog"]},
+        ])
+
+    def test_best_iou_respects_type_strict(self) -> None:
+        with mock.patch.dict(os.environ, {"ENTITY_DEDUP_TYPE_STRICT": "true"}):
+            best, score = self.index.best_match("Crocs Inc.", "company")
+        self.assertEqual("e1", best.entity_id)
+        self.assertEqual(1.0, score)
+
+    def test_type_relaxed_considers_other_types(self) -> None:
+        with mock.patch.dict(os.environ, {"ENTITY_DEDUP_TYPE_STRICT": "false"}):
+            best, score = self.index.best_match("Crocs Clog", "company")
+        self.assertEqual("e2", best.entity_id)
+        self.assertEqual(1.0, score)
+
+    def test_single_token_alias_ignored_when_entity_has_several(self) -> None:
+        best, score = self.index.best_match("Crocs", "company")
+        self.assertEqual(0.5, score)
+        self.assertEqual("e1", best.entity_id)
+
+    def test_iou_ties_go_to_the_candidate_sharing_more_tokens(self) -> None:
+        # As under the fulltext resolver, where the BM25 order decided ties: both score
+        # 0.25, but the later entity matches two query terms.
+        index = EntityIndex()
+        index.put("a", "Acme Gamma", "company", ["Acme Gamma"])
+        index.put("b", "Acme Beta C D E F G", "company", ["Acme Beta C D E F G"])
+
+        best, score = index.best_match("Acme Beta Holdings", "company")
+
+        self.assertEqual(("b", 0.25), (best.entity_id, score))
+
+    def test_equal_overlap_ties_go_to_the_earlier_entity(self) -> None:
+        index = EntityIndex()
+        index.put("a", "Acme Gamma", "company", ["Acme Gamma"])
+        index.put("b", "Beta Delta", "company", ["Beta Delta"])
+
+        self.assertEqual("a", index.best_match("Acme Beta", "company")[0].entity_id)
+
+    def test_only_top_k_candidates_by_overlap_are_scored(self) -> None:
+        index = EntityIndex()
+        index.put("a", "Acme Corp A B C D E", "company", ["Acme Corp A B C D E"])
+        index.put("b", "Acme", "company", ["Acme"])
+
+        with mock.patch.object(entity_index_module, "ENTITY_BM25_K", 1):
+            capped = index.best_match("Acme Corp International", "company")
+        best = index.best_match("Acme Corp International", "company")
+
+        self.assertEqual(("a", 0.25), (capped[0].entity_id, capped[1]))
+        self.assertEqual("b", best[0].entity_id)
+
+    def test_staged_changes_apply_only_on_commit(self) -> None:
+        staged = self.index.stage()
+        staged.create("e3", "Deckers Brands", "company")
+        staged.add_alias("e1", "Crocs Incorporated")
+
+        self.assertEqual("e3", staged.best_match("Deckers Brands", "company")[0].entity_id)
+        self.assertIsNone(self.index.best_match("Deckers Brands", "company")[0])
+
+        staged.commit()
+
+        self.assertEqual("e3", self.index.best_match("Deckers Brands", "company")[0].entity_id)
+        self.assertIn("Crocs Incorporated", self.index.get("e1").aliases)
+
+    def test_remove_drops_entity_from_postings(self) -> None:
+        self.index.remove("e2")
+
+        self.assertIsNone(self.index.get("e2"))
+        self.assertEqual({"e1"}, self.index.candidate_ids({"crocs", "clog"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
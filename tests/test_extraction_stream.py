@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from tkg_rag import ingest as ingest_module
+from tkg_rag import prompts
+from tkg_rag.embedding_stage import RelationEmbeddingPrefetcher
+from tkg_rag.extraction_stream import (
+    ExtractionStreamParser,
+    pack_chunks,
+    parse_extraction_output,
+    split_packed_output,
+)
+from tkg_rag.extraction_cache import ExtractionCache, extraction_key, prompt_hash
+from tkg_rag.models import ExtractedEntity, ExtractedRelation
+
+RAW = (
+    '("entity"|"2021-01-01 to 2021-03-31"|"quarter");;'
+    '("entity"|"Acme Corp"|"company");;'
+    '("relationship"|"2021-01-01 to 2021-03-31"|"Acme Corp"|"Beta LLC"|"Acme acquired Beta.");;'
+    '("entity"|"Beta LLC"|"company")'
+)
+
+
+class TestExtractionStreamParser(unittest.TestCase):
+    def test_streamed_records_match_one_shot_parse(self) -> None:
+        parser = ExtractionStreamParser("|", ";;")
+        seen = []
+        for i in range(0, len(RAW), 3):
+            seen.extend(parser.feed(RAW[i:i + 3]))
+        seen.extend(parser.close())
+
+        entities, relations = parse_extraction_output(RAW, "|", ";;")
+        self.assertEqual((entities, relations), (parser.entities, parser.relations))
+        self.assertEqual(RAW, parser.raw)
+        self.assertEqual(4, len(seen))
+
+    def test_record_is_emitted_once_its_delimiter_arrives(self) -> None:
+        parser = ExtractionStreamParser("|", ";;")
+
+        self.assertEqual([], parser.feed('("entity"|"Acme Corp"|"company");'))
+        self.assertEqual([ExtractedEntity("Acme Corp", "company")], parser.feed(';("relationship"|"2021"'))
+        self.assertEqual(
+            [ExtractedRelation("2021", "Acme Corp", "Beta LLC", "Deal.")],
+            parser.feed('|"Acme Corp"|"Beta LLC"|"Deal.")') + parser.close(),
+        )
+
+
+class TestPackedOutput(unittest.TestCase):
+    def test_sections_split_by_marker(self) -> None:
+        raw = (
+            "### CHUNK 1\n" + RAW + "\n"
+            "### CHUNK 2\n\n"
+            "**### Chunk 3**\n" + '("entity"|"Gamma"|"company")'
+        )
+        sections = split_packed_output(raw, 3)
+
+        self.assertEqual([0, 1, 2], sorted(sections))
+        self.assertEqual(parse_extraction_output(RAW, "|", ";;"), parse_extraction_output(sections[0], "|", ";;"))
+        self.assertEqual("", sections[1])
+        self.assertEqual([ExtractedEntity("Gamma", "company")], parse_extraction_output(sections[2], "|", ";;")[0])
+
+    def test_missing_repeated_and_unknown_markers_are_left_out(self) -> None:
+        raw = "### CHUNK 1\nA\n### CHUNK 1\nB\n### CHUNK 3\nC\n### CHUNK 7\nD"
+        self.assertEqual({2: "C"}, split_packed_output(raw, 3))
+        self.assertEqual({}, split_packed_output(RAW, 2))
+
+    def test_pack_chunks_round_trips(self) -> None:
+        packed = pack_chunks(["first text", "second text"])
+        self.assertEqual({0: "first text", 1: "second text"}, split_packed_output(packed, 2))
+
+    def test_packed_sections_are_cached_under_the_packed_prompt(self) -> None:
+        calls = []
+
+        async def create(**kwargs):
+            calls.append(kwargs)
+            content = "### CHUNK 1\n" + RAW + "\n### CHUNK 2\n" + '("entity"|"Gamma"|"company")'
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        chunks = ["Acme acquired Beta.", "Gamma grew."]
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ExtractionCache(os.path.join(tmp, "extractions.sqlite3"))
+            with mock.patch.object(ingest_module, "LLM_MODEL", "m"), \
+                    mock.patch.object(ingest_module, "extraction_cache", lambda: cache), \
+                    mock.patch.object(ingest_module, "async_openai_client", lambda: client), \
+                    mock.patch.dict(os.environ, {"INGEST_REUSE_EXTRACTIONS": "true"}):
+                first = asyncio.run(ingest_module._async_extract_packed(chunks))
+                again = asyncio.run(ingest_module._async_extract_packed(chunks))
+                with mock.patch.object(prompts, "TEMPORAL_ENTITY_EXTRACTION_PACKED_PROMPT", "{input_chunks}"):
+                    asyncio.run(ingest_module._async_extract_packed(chunks))
+                system_prompt, user_prompt_template, _ = ingest_module._build_extraction_prompts()
+                single_key = extraction_key("m", prompt_hash(system_prompt, user_prompt_template), chunks[0])
+
+            self.assertEqual(first, again)
+            self.assertIsNone(cache.get(single_key))
+        # The second call was served from the cache; the edited prompt missed it.
+        self.assertEqual(2, len(calls))
+
+
+class TestRelationEmbeddingPrefetcher(unittest.TestCase):
+    def test_prefetched_texts_are_not_embedded_again(self) -> None:
+        calls = []
+
+        def embed(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        prefetcher = RelationEmbeddingPrefetcher(embed, batch_size=2, max_inflight=1)
+        prefetcher.add("ab")
+        prefetcher.add("abc")
+        prefetcher.add("abcd")
+
+        vectors = prefetcher.embed(["abc", "abcd", "ab", "x"])
+        prefetcher.close()
+
+        self.assertEqual([[3.0], [4.0], [2.0], [1.0]], vectors)
+        self.assertEqual([["ab", "abc"], ["abcd", "x"]], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
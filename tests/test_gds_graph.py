@@ -0,0 +1,93 @@
+import os
+import unittest
+from unittest import mock
+
+from tkg_rag import retrieve as retrieve_module
+from tkg_rag.gds_graph import ensure_entity_graph, run_ppr_projected
+
+
+class _Result(list):
+    def consume(self) -> None:
+        pass
+
+    def single(self):
+        return self[0] if self else None
+
+
+class _Session:
+    # GDS catalog as graph name -> age in seconds.
+    def __init__(self, version: int, graphs) -> None:
+        self.version = version
+        self.graphs = dict(graphs)
+        self.queries = []
+
+    def run(self, query, **params):
+        self.queries.append((query, params))
+        if "gds.graph.list" in query:
+            return _Result({"graphName": name, "age_s": age} for name, age in self.graphs.items())
+        if "m.version" in query:
+            return _Result([{"version": self.version}])
+        if "gds.graph.project" in query:
+            self.graphs[params["name"]] = 0.0
+            return _Result([{"nodes": 2, "relationships": 1}])
+        if "gds.graph.drop" in query:
+            del self.graphs[params["name"]]
+        if "gds.pageRank.stream" in query:
+            if params["name"] not in self.graphs:
+                raise RuntimeError(f"graph {params['name']} does not exist")
+            return _Result([{"entity_id": "acme", "score": 0.15}])
+        return _Result()
+
+    def execute_read(self, work, *args):
+        return work(self, *args)
+
+    execute_write = execute_read
+
+
+class TestPersistentProjection(unittest.TestCase):
+    def setUp(self) -> None:
+        patch = mock.patch.dict(os.environ, {"GDS_GRAPH_NAME": "tkg_entities", "GDS_REPROJECT_INTERVAL_S": "300"})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_projects_the_current_version_and_drops_old_ones(self) -> None:
+        session = _Session(5, {"tkg_entities_v3": 900.0, "tkg_entities_v4": 600.0, "other": 10.0})
+
+        self.assertEqual("tkg_entities_v5", ensure_entity_graph(session))
+        self.assertEqual({"tkg_entities_v4", "tkg_entities_v5", "other"}, set(session.graphs))
+        ensure_entity_graph(session)
+        self.assertEqual(1, sum("gds.graph.project" in q for q, _ in session.queries))
+
+    def test_recent_projection_is_reused_while_versions_move(self) -> None:
+        session = _Session(9, {"tkg_entities_v6": 900.0, "tkg_entities_v7": 60.0})
+
+        self.assertEqual("tkg_entities_v7", ensure_entity_graph(session))
+        self.assertFalse(any("gds.graph.project" in q for q, _ in session.queries))
+        self.assertEqual({"tkg_entities_v6", "tkg_entities_v7"}, set(session.graphs))
+
+    def test_ppr_reads_the_projection_without_catalog_changes(self) -> None:
+        session = _Session(1, {"tkg_entities_v1": 0.0})
+
+        scores = run_ppr_projected(session, "tkg_entities_v1", [1, 2], [1, 2], 0.85, 20, 1e-7)
+
+        self.assertEqual({"acme": 0.15}, scores)
+        self.assertEqual([1, 2], session.queries[0][1]["node_ids"])
+        self.assertEqual({"tkg_entities_v1": 0.0}, session.graphs)
+
+    def test_rank_edges_falls_back_to_numpy_when_the_projection_is_gone(self) -> None:
+        candidates = [
+            {"rel_id": 10, "source_node_id": 1, "target_node_id": 2, "source_entity_id": "acme", "target_entity_id": "beta"},
+        ]
+        session = _Session(1, {"tkg_entities_v1": 0.0})
+        ensure = lambda session: "tkg_entities_v0"
+
+        with mock.patch.dict(os.environ, {"PPR_ENGINE": "gds_graph"}), \
+                mock.patch.object(retrieve_module, "ensure_entity_graph", ensure):
+            edges = retrieve_module.rank_edges(session, candidates, 10)
+
+        expected = retrieve_module.run_ppr_local(candidates)
+        self.assertAlmostEqual(expected["acme"] + expected["beta"], edges[0]["edge_score"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from tkg_rag.entity_index import EntityIndex
+from tkg_rag.graph_writer import WriteStats, resolve_entities
+from tkg_rag.models import ExtractedEntity
+
+
+class TestResolveEntities(unittest.TestCase):
+    def test_merges_into_fulltext_candidate_and_adds_alias(self) -> None:
+        index = EntityIndex()
+        index.put("e1", "Acme Corp", "company", ["Acme Corp"])
+        staged = index.stage()
+        stats = WriteStats()
+
+        resolved = resolve_entities([[ExtractedEntity("Acme Corp Inc", "company")]], staged, stats)
+
+        self.assertEqual([{"Acme Corp Inc": "e1"}], resolved)
+        self.assertEqual(["Acme Corp", "Acme Corp Inc"], [e.aliases for e in staged.renamed()][0])
+        self.assertEqual(["Acme Corp"], index.get("e1").aliases)
+        self.assertEqual(2, stats.legacy_queries)
+
+    def test_later_chunks_see_entities_created_earlier_in_batch(self) -> None:
+        staged = EntityIndex().stage()
+        stats = WriteStats()
+
+        resolved = resolve_entities(
+            [
+                [ExtractedEntity("Beta LLC", "company"), ExtractedEntity("Beta", "product")],
+                [ExtractedEntity("Beta LLC", "company")],
+            ],
+            staged,
+            stats,
+        )
+
+        self.assertEqual(resolved[0]["Beta LLC"], resolved[1]["Beta LLC"])
+        self.assertNotEqual(resolved[0]["Beta LLC"], resolved[0]["Beta"])
+        self.assertEqual(2, stats.entities_created)
+        self.assertEqual(1, stats.entities_merged)
+
+    def test_skips_single_token_alias_when_entity_has_several(self) -> None:
+        index = EntityIndex()
+        index.put("e1", "EOG Resources Inc", "company", ["EOG", "EOG Resources Inc"])
+        stats = WriteStats()
+
+        resolved = resolve_entities([[ExtractedEntity("EOG Burgers", "company")]], index.stage(), stats)
+
+        self.assertNotEqual("e1", resolved[0]["EOG Burgers"])
+        self.assertEqual(1, stats.entities_created)
+
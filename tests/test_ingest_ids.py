@@ -0,0 +1,23 @@
+import unittest
+
+from tkg_rag.ingest import chunk_id_for, source_fingerprint, source_id_for_uri
+
+
+class TestIngestIds(unittest.TestCase):
+    def test_source_id_is_stable_for_uri(self) -> None:
+        self.assertEqual(source_id_for_uri("data/q1.txt"), source_id_for_uri("data/q1.txt"))
+        self.assertNotEqual(source_id_for_uri("data/q1.txt"), source_id_for_uri("data/q2.txt"))
+        self.assertNotEqual(source_id_for_uri(None), source_id_for_uri(None))
+
+    def test_chunk_id_depends_on_source_and_text(self) -> None:
+        self.assertEqual(chunk_id_for("s1", "Revenue grew."), chunk_id_for("s1", "Revenue grew."))
+        self.assertNotEqual(chunk_id_for("s1", "Revenue grew."), chunk_id_for("s2", "Revenue grew."))
+        self.assertNotEqual(chunk_id_for("s1", "Revenue grew."), chunk_id_for("s1", "Revenue fell."))
+
+    def test_fingerprint_is_order_sensitive(self) -> None:
+        self.assertNotEqual(source_fingerprint(["a", "b"]), source_fingerprint(["b", "a"]))
+        self.assertEqual(source_fingerprint(["a", "b"]), source_fingerprint(["a", "b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
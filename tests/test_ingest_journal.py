@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from tkg_rag.ingest_journal import DeadLetterFile, IngestJournal, finish_dead_letters, take_dead_letters
+from tkg_rag.models import ExtractedEntity, ExtractedRelation
+
+
+class TestIngestJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = IngestJournal(os.path.join(self.tmp.name, "journal.sqlite3"))
+
+    def tearDown(self) -> None:
+        self.journal._conn.close()
+        self.tmp.cleanup()
+
+    def test_extraction_round_trip(self) -> None:
+        entities = [ExtractedEntity("Acme Corp", "company")]
+        relations = [ExtractedRelation("2021-Q1", "Acme Corp", "Beta LLC", "Acme acquired Beta.")]
+        self.journal.record_extraction("s1", "c1", entities, relations)
+
+        self.assertEqual((entities, relations), self.journal.extraction("c1"))
+        self.assertIsNone(self.journal.extraction("c2"))
+
+        self.journal.mark_written(["c1"])
+        self.assertEqual({"chunks": 1, "written": 1, "sources": 0, "replayed": 1}, self.journal.stats())
+
+    def test_source_done_requires_matching_fingerprint(self) -> None:
+        self.journal.mark_source_done("s1", "CROCS/2020/Q1", "abc")
+
+        self.assertTrue(self.journal.source_done("s1", "abc"))
+        self.assertFalse(self.journal.source_done("s1", "def"))
+        self.assertFalse(self.journal.source_done("s2", "abc"))
+
+    def test_dead_letters_survive_an_unfinished_retry(self) -> None:
+        path = os.path.join(self.tmp.name, "dead", "letters.jsonl")
+        dead_letters = DeadLetterFile(path)
+        dead_letters.append({"source_uri": "CROCS/2020/Q1", "chunk_id": "c1"})
+        dead_letters.append({"source_uri": "CROCS/2020/Q2", "chunk_id": "c2"})
+
+        entries = take_dead_letters(path)
+        self.assertEqual(["c1", "c2"], [e["chunk_id"] for e in entries])
+        self.assertFalse(os.path.exists(path))
+
+        # The retry crashed after c3 failed elsewhere; nothing is lost.
+        dead_letters.append({"source_uri": "CROCS/2020/Q3", "chunk_id": "c3"})
+        self.assertEqual(["c1", "c2", "c3"], [e["chunk_id"] for e in take_dead_letters(path)])
+
+        finish_dead_letters(path)
+        self.assertEqual([], take_dead_letters(path))
+
+if __name__ == "__main__":
+    unittest.main()
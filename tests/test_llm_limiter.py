@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+
+from tkg_rag.llm_limiter import AdaptiveLimiter, error_kind, retry_after_s
+
+
+class _Response:
+    def __init__(self, headers) -> None:
+        self.headers = headers
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, headers) -> None:
+        super().__init__("rate limited")
+        self.response = _Response(headers)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def test_window_grows_after_healthy_window(self) -> None:
+        limiter = AdaptiveLimiter(2, max_limit=4)
+        limiter.record_success(1.0)
+        limiter.record_success(1.0)
+        self.assertEqual(3, limiter.stats()["limit"])
+
+    def test_window_respects_bounds(self) -> None:
+        limiter = AdaptiveLimiter(4, min_limit=2, max_limit=4)
+        for _ in range(10):
+            limiter.record_success(1.0)
+        self.assertEqual(4, limiter.stats()["limit"])
+        limiter.record_failure(asyncio.TimeoutError())
+        self.assertEqual(2, limiter.stats()["limit"])
+        self.assertEqual(1, limiter.stats()["timeouts"])
+
+    def test_rate_limit_backs_off_and_honors_retry_after(self) -> None:
+        limiter = AdaptiveLimiter(10, max_limit=10)
+        retry_after = limiter.record_failure(_RateLimitError({"retry-after": "3"}))
+        self.assertEqual(3.0, retry_after)
+        self.assertEqual(7, limiter.stats()["limit"])
+        self.assertEqual(1, limiter.stats()["rate_limited"])
+        self.assertGreater(limiter._paused_until, 0.0)
+
+    def test_other_errors_do_not_shrink_window(self) -> None:
+        limiter = AdaptiveLimiter(5)
+        limiter.record_failure(ValueError("bad output"))
+        self.assertEqual(5, limiter.stats()["limit"])
+        self.assertEqual("other_errors", error_kind(ValueError("x")))
+
+    def test_retry_after_ms_takes_precedence(self) -> None:
+        exc = _RateLimitError({"retry-after-ms": "1500", "retry-after": "3"})
+        self.assertEqual(1.5, retry_after_s(exc))
+        self.assertIsNone(retry_after_s(ValueError("x")))
+
+    def test_acquire_caps_inflight_at_limit(self) -> None:
+        limiter = AdaptiveLimiter(2)
+        peak = 0
+
+        async def call() -> None:
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.inflight)
+                await asyncio.sleep(0.01)
+
+        async def run() -> None:
+            await asyncio.gather(*(call() for _ in range(6)))
+
+        asyncio.run(run())
+        self.assertEqual(2, peak)
+        self.assertEqual(0, limiter.inflight)
+
+
+if __name__ == "__main__":
+    unittest.main()
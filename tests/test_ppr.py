@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+from tkg_rag.ppr import CsrGraph, personalized_pagerank, ppr_scores
+
+
+class TestPersonalizedPageRank(unittest.TestCase):
+    def test_converges_to_the_linear_system(self) -> None:
+        # 0 -> 1, 0 -> 2, 1 -> 2, 2 -> 0, 2 -> 3 (twice); 3 is dangling.
+        sources, targets = [0, 0, 1, 2, 2, 2], [1, 2, 2, 0, 3, 3]
+        graph = CsrGraph.from_edges(sources, targets, 4)
+        scores = personalized_pagerank(graph, [0, 3], damping=0.85, max_iter=500, tolerance=0.0)
+
+        transition = np.zeros((4, 4))
+        for s, t in zip(sources, targets):
+            transition[t, s] += 1.0 / sources.count(s)
+        seeds = np.array([1.0, 0.0, 0.0, 1.0])
+        expected = np.linalg.solve(np.eye(4) - 0.85 * transition, 0.15 * seeds)
+        np.testing.assert_allclose(expected, scores, rtol=1e-9)
+
+    def test_iterations_accumulate_deltas_like_gds(self) -> None:
+        graph = CsrGraph.from_edges([0, 0], [1, 2], 3)
+        np.testing.assert_allclose([0.15, 0.0, 0.0], personalized_pagerank(graph, [0], 0.85, 1))
+        np.testing.assert_allclose(
+            [0.15, 0.85 * 0.075, 0.85 * 0.075], personalized_pagerank(graph, [0], 0.85, 20)
+        )
+
+    def test_scores_by_node_key(self) -> None:
+        scores = ppr_scores([("acme", "beta"), ("beta", "acme")], ["acme"], 0.5, 200, 0.0)
+        # acme = 0.5 + 0.5 * beta, beta = 0.5 * acme
+        self.assertAlmostEqual(2.0 / 3.0, scores["acme"])
+        self.assertAlmostEqual(1.0 / 3.0, scores["beta"])
+        self.assertEqual({}, ppr_scores([("a", "b")], ["missing"]))
+
+    def test_seed_weights_scale_the_restart_mass(self) -> None:
+        edges = [("acme", "beta"), ("beta", "acme")]
+        plain = ppr_scores(edges, ["acme", "beta"], 0.5, 200, 0.0)
+        weighted = ppr_scores(edges, ["acme", "beta"], 0.5, 200, 0.0, {"acme": 2.0})
+
+        self.assertAlmostEqual(plain["acme"], plain["beta"])
+        # acme = 1 + 0.5 * beta, beta = 0.5 + 0.5 * acme
+        self.assertAlmostEqual(10.0 / 6.0, weighted["acme"])
+        self.assertAlmostEqual(8.0 / 6.0, weighted["beta"])
+
+
+if __name__ == "__main__":
+    unittest.main()
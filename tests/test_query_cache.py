@@ -0,0 +1,121 @@
+import os
+import unittest
+from unittest import mock
+
+from tkg_rag import query_cache as query_cache_module
+from tkg_rag import retrieve as retrieve_module
+from tkg_rag.models import TimestampRange
+from tkg_rag.query_cache import QueryCache
+
+_ANY_TIME = TimestampRange(None, None)
+_PARAMS = (50, 12, False)
+
+
+class TestQueryCache(unittest.TestCase):
+    def test_exact_tier_normalizes_the_question(self) -> None:
+        cache = QueryCache()
+        cache.put("What did Acme do?", _PARAMS, {"context": "c1"}, [1.0, 0.0], _ANY_TIME, 2.0)
+
+        hit = cache.lookup("  what did ACME do ", _PARAMS)
+
+        self.assertEqual("c1", hit["context"])
+        self.assertEqual("exact", hit["cache"])
+        self.assertEqual("  what did ACME do ", hit["question"])
+        self.assertIsNone(cache.lookup("What did Acme do?", (10, 12, False)))
+        stats = cache.stats()
+        self.assertEqual((1, 1, 0.5, 2.0), (stats["exact_hits"], stats["misses"], stats["hit_rate"], stats["saved_s"]))
+
+    def test_semantic_tier_needs_close_embedding_and_same_time_range(self) -> None:
+        cache = QueryCache(threshold=0.95)
+        year = TimestampRange("2021-01-01", "2021-12-31")
+        cache.put("What did Acme do in 2021?", _PARAMS, {"context": "c1"}, [1.0, 0.1], year, 2.0)
+
+        self.assertTrue(cache.has_similar([1.0, 0.12], _PARAMS))
+        self.assertIsNone(cache.lookup_similar("q", [1.0, 0.12], _ANY_TIME, _PARAMS))
+        self.assertIsNone(cache.lookup_similar("q", [0.0, 1.0], year, _PARAMS))
+        hit = cache.lookup_similar("What was Acme up to in 2021?", [1.0, 0.12], year, _PARAMS, spent_s=0.5)
+
+        self.assertEqual("semantic", hit["cache"])
+        self.assertEqual(1.5, cache.stats()["saved_s"])
+
+    def test_lru_eviction_and_ttl(self) -> None:
+        cache = QueryCache(max_entries=2)
+        for question in ("a", "b"):
+            cache.put(question, _PARAMS, {"context": question}, None, _ANY_TIME, 1.0)
+        cache.lookup("a", _PARAMS)
+        cache.put("c", _PARAMS, {"context": "c"}, None, _ANY_TIME, 1.0)
+
+        self.assertIsNone(cache.lookup("b", _PARAMS))
+        self.assertEqual(1, cache.stats()["evictions"])
+
+        expired = QueryCache(ttl_s=-1.0)
+        expired.put("a", _PARAMS, {"context": "a"}, [1.0], _ANY_TIME, 1.0)
+        self.assertIsNone(expired.lookup("a", _PARAMS))
+        self.assertFalse(expired.has_similar([1.0], _PARAMS))
+
+    def test_graph_version_change_clears_the_cache(self) -> None:
+        cache = QueryCache()
+        versions = iter([3, 3, 4])
+        cache.validate(lambda: next(versions), check_s=0.0)
+        cache.put("a", _PARAMS, {"context": "a"}, [1.0], _ANY_TIME, 1.0)
+
+        cache.validate(lambda: next(versions), check_s=0.0)
+        self.assertIsNotNone(cache.lookup("a", _PARAMS))
+        cache.validate(lambda: next(versions), check_s=0.0)
+        self.assertIsNone(cache.lookup("a", _PARAMS))
+        self.assertEqual(1, cache.stats()["invalidations"])
+
+    def test_version_is_read_at_most_once_per_interval(self) -> None:
+        cache = QueryCache()
+        reads = []
+        for _ in range(3):
+            cache.validate(lambda: reads.append(1) or 1, check_s=60.0)
+
+        self.assertEqual(1, len(reads))
+
+
+class TestRetrieveWithCache(unittest.TestCase):
+    def test_repeated_and_near_duplicate_questions_skip_the_search(self) -> None:
+        searches = []
+
+        def vector_search(session, query_embedding, max_chunks, rescore_embedding=None):
+            searches.append(query_embedding)
+            return [{"chunk_id": "c1", "text": "Acme grew.", "score": 0.9}]
+
+        def embed_question(question, client=None):
+            return ([1.0, 0.0] if "Acme" in question else [0.0, 1.0]), None
+
+        class _Session:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info) -> None:
+                pass
+
+        class _Driver:
+            def session(self):
+                return _Session()
+
+        with mock.patch.dict(os.environ, {"QUERY_CACHE": "true"}), \
+                mock.patch.object(query_cache_module, "_CACHE", None), \
+                mock.patch.object(retrieve_module, "_read", lambda driver, work, *args: 1), \
+                mock.patch.object(retrieve_module, "extract_query_entities_and_time", lambda q, c=None, m=None: ([], _ANY_TIME)), \
+                mock.patch.object(retrieve_module, "embed_question", embed_question), \
+                mock.patch.object(retrieve_module, "vector_search", vector_search):
+            first = retrieve_module.retrieve("What did Acme do?", driver=_Driver())
+            again = retrieve_module.retrieve("what did acme do", driver=_Driver())
+            paraphrase = retrieve_module.retrieve("What has Acme done?", driver=_Driver())
+            other = retrieve_module.retrieve("Who is Beta?", driver=_Driver())
+            stats = query_cache_module.query_cache().stats()
+
+        self.assertNotIn("cache", first)
+        self.assertEqual("exact", again["cache"])
+        self.assertEqual("semantic", paraphrase["cache"])
+        self.assertEqual(first["context"], paraphrase["context"])
+        self.assertNotIn("cache", other)
+        self.assertEqual(2, len(searches))
+        self.assertEqual((4, 1, 1, 0.5), (stats["lookups"], stats["exact_hits"], stats["semantic_hits"], stats["hit_rate"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
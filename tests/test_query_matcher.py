@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from tkg_rag import retrieve as retrieve_module
+from tkg_rag.entity_index import EntityIndex
+from tkg_rag.query_extraction import QueryEntity
+from tkg_rag.query_matcher import AhoCorasick, QueryMatcher
+
+
+def _matcher() -> QueryMatcher:
+    index = EntityIndex()
+    index.put("e1", "Crocs Inc", "company", ["Crocs Inc", "Crocs"])
+    index.put("e2", "EOG Resources", "company", ["EOG Resources", "EOG"])
+    index.put("e3", "EOG Burgers", "company", ["EOG Burgers", "EOG"])
+    index.put("e4", "gross margin", "financial concept", ["gross margin"])
+    return QueryMatcher.from_index(index)
+
+
+class TestAhoCorasick(unittest.TestCase):
+    def test_finds_overlapping_patterns(self) -> None:
+        automaton = AhoCorasick()
+        for pattern in ("he", "she", "his", "hers"):
+            automaton.add(tuple(pattern), pattern)
+        automaton.build()
+
+        found = sorted((start, end, next(iter(values))) for start, end, values in automaton.find(list("ushers")))
+
+        self.assertEqual([(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")], found)
+
+
+class TestQueryMatcher(unittest.TestCase):
+    def test_known_entity_and_quarter_answer_locally(self) -> None:
+        entities = _matcher().extract("What happened in 2020 Q1 related to Crocs?")
+
+        self.assertEqual(
+            [QueryEntity("2020-Q1", "quarter"), QueryEntity("Crocs Inc", "company")],
+            entities,
+        )
+
+    def test_longest_match_wins(self) -> None:
+        entities = _matcher().extract("What was the gross margin of Crocs Inc in the first quarter of 2021?")
+
+        self.assertEqual(
+            ["2021-Q1", "gross margin", "Crocs Inc"],
+            [entity.name for entity in entities],
+        )
+
+    def test_unknown_names_ambiguous_aliases_and_relative_times_fall_back(self) -> None:
+        matcher = _matcher()
+
+        self.assertIsNone(matcher.extract("What did Acme say about Crocs in 2020?"))
+        self.assertIsNone(matcher.extract("How did EOG do in 2021?"))
+        self.assertIsNone(matcher.extract("How did Crocs do before 2020?"))
+        self.assertIsNone(matcher.extract("What is the outlook?"))
+
+    def test_llm_latency_estimates_savings(self) -> None:
+        matcher = _matcher()
+        matcher.record_llm(2.0)
+        matcher.extract("How did Crocs do in 2021?")
+
+        stats = matcher.stats()
+        self.assertEqual((1, 1), (stats["local"], stats["llm"]))
+        self.assertGreater(stats["saved_s"], 1.9)
+
+    def test_extraction_skips_the_llm_only_on_a_local_answer(self) -> None:
+        calls = []
+
+        async def llm(question, client=None):
+            calls.append(question)
+            return [QueryEntity("Acme", "company")]
+
+        with mock.patch.object(retrieve_module, "async_extract_query_entities", llm):
+            local = asyncio.run(retrieve_module.async_extract_query_entities_and_time("Crocs in 2021?", None, _matcher()))
+            remote = asyncio.run(retrieve_module.async_extract_query_entities_and_time("Acme in 2021?", None, _matcher()))
+
+        self.assertEqual(([QueryEntity("Crocs Inc", "company")], "2021-01-01"), (local[0], local[1].start_date))
+        self.assertEqual([QueryEntity("Acme", "company")], remote[0])
+        self.assertEqual(["Acme in 2021?"], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
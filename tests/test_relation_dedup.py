@@ -0,0 +1,52 @@
+import unittest
+
+from tkg_rag.relation_dedup import RelationDedup, _EdgeState
+
+KEY = ("a", "b", None, None)
+
+
+class TestRelationDedup(unittest.TestCase):
+    def test_running_mean_counts_each_chunk_once(self) -> None:
+        edge = _EdgeState("r1", "a", "b", None, None, "text", [1.0, 0.0], ["c1"])
+        dedup = RelationDedup(threshold=0.5)
+        dedup.add_candidates(KEY, [edge])
+
+        dedup.merge(edge, [0.0, 1.0], "c2")
+        dedup.merge(edge, [0.0, 1.0], "c2")
+        dedup.finish()
+
+        self.assertEqual(["c1", "c2"], edge.chunk_ids)
+        self.assertEqual([0.5, 0.5], list(edge.embedding))
+        self.assertTrue(edge.dirty)
+
+    def test_existing_chunk_count_weights_the_mean(self) -> None:
+        edge = _EdgeState("r1", "a", "b", None, None, "text", [1.0, 0.0], ["c1", "c2", "c3"])
+        dedup = RelationDedup(threshold=0.5)
+        dedup.add_candidates(KEY, [edge])
+
+        dedup.merge(edge, [0.0, 1.0], "c4")
+        dedup.finish()
+
+        self.assertEqual([0.75, 0.25], list(edge.embedding))
+
+    def test_matches_most_similar_candidate_above_threshold(self) -> None:
+        near = _EdgeState("r1", "a", "b", None, None, "x", [1.0, 0.1], ["c1"])
+        far = _EdgeState("r2", "a", "b", None, None, "y", [0.0, 1.0], ["c2"])
+        unembedded = _EdgeState("r3", "a", "b", None, None, "z", None, ["c3"])
+        dedup = RelationDedup(threshold=0.9)
+        dedup.add_candidates(KEY, [far, unembedded, near])
+
+        self.assertIs(near, dedup.match(KEY, [1.0, 0.0])[0])
+        self.assertIsNone(dedup.match(KEY, [1.0, 1.0])[0])
+        self.assertIsNone(dedup.match(("a", "b", "2020-01-01", None), [1.0, 0.0])[0])
+        self.assertIsNone(dedup.match(KEY, [1.0, 0.0, 0.0])[0])
+
+    def test_added_edges_are_candidates_for_later_relations(self) -> None:
+        dedup = RelationDedup(threshold=0.9)
+        edge = _EdgeState("r1", "a", "b", None, None, "x", [0.0, 2.0], ["c1"], is_new=True)
+        dedup.add(KEY, edge)
+
+        match, sim = dedup.match(KEY, [0.0, 1.0])
+
+        self.assertIs(edge, match)
+        self.assertAlmostEqual(1.0, sim)
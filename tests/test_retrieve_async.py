@@ -0,0 +1,241 @@
+import asyncio
+import os
+import time
+import unittest
+from unittest import mock
+
+from tkg_rag import retrieve as retrieve_module
+from tkg_rag.models import TimestampRange
+from tkg_rag.query_extraction import QueryEntity
+
+
+class _Driver:
+    def close(self) -> None:
+        pass
+
+
+def _embed_question(question, client=None):
+    time.sleep(0.2)
+    return [1.0, 0.0], None
+
+
+def _vector_search(session, query_embedding, max_chunks, rescore_embedding=None):
+    time.sleep(0.2)
+    return [{"chunk_id": "c1", "text": "Acme grew.", "score": 0.9}]
+
+
+class TestRetrieveAsync(unittest.TestCase):
+    def _run(self, extract, **env):
+        patches = [
+            mock.patch.object(retrieve_module, "_neo4j_driver", return_value=_Driver()),
+            mock.patch.object(retrieve_module, "_with_session", lambda driver, work, *args: work(None, *args)),
+            mock.patch.object(retrieve_module, "embed_question", _embed_question),
+            mock.patch.object(retrieve_module, "vector_search", _vector_search),
+            mock.patch.object(retrieve_module, "async_extract_query_entities_and_time", extract),
+            mock.patch.dict(os.environ, env),
+        ]
+        for patch in patches:
+            patch.start()
+        try:
+            return asyncio.run(retrieve_module.retrieve_async("What did Acme do in 2021?"))
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+    def test_entity_extraction_overlaps_the_chunk_path(self) -> None:
+        async def extract(question, client=None, matcher=None):
+            await asyncio.sleep(0.3)
+            return [QueryEntity("Acme", "company")], TimestampRange("2021-01-01", "2021-12-31")
+
+        result = self._run(extract)
+
+        self.assertEqual(["c1"], [c["chunk_id"] for c in result["chunks"]])
+        self.assertEqual("2021-01-01", result["time_range"].start_date)
+        # Stages take 0.3s and 0.2s + 0.2s; run one after another they would take 0.7s.
+        self.assertLess(result["timings"]["total"], 0.6)
+
+    def test_slow_entity_extraction_times_out_without_losing_chunks(self) -> None:
+        async def extract(question, client=None, matcher=None):
+            await asyncio.sleep(5)
+
+        result = self._run(extract, RETRIEVE_EXTRACT_TIMEOUT_S="0.1")
+
+        self.assertEqual(["c1"], [c["chunk_id"] for c in result["chunks"]])
+        self.assertIsNone(result["time_range"].start_date)
+        self.assertLess(result["timings"]["total"], 1.0)
+
+
+
+class _Record:
+    def __init__(self, row) -> None:
+        self.row = row
+
+    def data(self):
+        return dict(self.row)
+
+    def __getitem__(self, key):
+        return self.row[key]
+
+
+class _Tx:
+    def __init__(self, rows) -> None:
+        self.rows = rows
+        self.calls = []
+
+    def run(self, query, **params):
+        self.calls.append(params)
+        return [_Record(row) for row in self.rows]
+
+
+class TestEntityLinking(unittest.TestCase):
+    def test_links_all_entities_in_one_query_ranked_by_iou(self) -> None:
+        tx = _Tx([
+            {"i": 0, "entity_id": "acme", "aliases": ["Acme Corp", "Acme"], "score": 3.0},
+            {"i": 0, "entity_id": "acme-labs", "aliases": ["Acme Labs Inc"], "score": 2.0},
+            {"i": 1, "entity_id": "beta", "aliases": ["Beta LLC"], "score": 1.0},
+            {"i": 1, "entity_id": "acme", "aliases": ["Acme Corp", "Acme"], "score": 0.5},
+        ])
+        links = retrieve_module.link_entities(
+            tx, [QueryEntity("Acme Corp", "company"), QueryEntity("Beta LLC", "company"), QueryEntity(" ", "company")]
+        )
+
+        self.assertEqual(1, len(tx.calls))
+        self.assertEqual(["Acme Corp", "Beta LLC"], [q["query_text"] for q in tx.calls[0]["queries"]])
+        self.assertEqual([("acme", 1.0), ("beta", 1.0)], links)
+        self.assertEqual(
+            ["acme", "beta"],
+            retrieve_module.link_entities_bm25(tx, [QueryEntity("Acme Corp", "company"), QueryEntity("Beta LLC", "company")]),
+        )
+
+    def test_link_scores_weight_the_ppr_seeds(self) -> None:
+        hits = [
+            {"rel_id": 1, "source_node_id": 10, "target_node_id": 11, "source_entity_id": "acme", "target_entity_id": "beta"},
+            {"rel_id": 2, "source_node_id": 11, "target_node_id": 10, "source_entity_id": "beta", "target_entity_id": "acme"},
+        ]
+        plain = retrieve_module.run_ppr_local(hits)
+        weighted = retrieve_module.run_ppr_local(hits, {"acme": 1.0})
+
+        self.assertAlmostEqual(plain["acme"], plain["beta"])
+        self.assertGreater(weighted["acme"], weighted["beta"])
+
+
+class TestRetrieveMany(unittest.TestCase):
+    def test_batched_chunk_hits_are_grouped_per_query(self) -> None:
+        tx = _Tx([
+            {"i": 0, "chunk_id": "a", "text": "A", "score": 0.9},
+            {"i": 2, "chunk_id": "b", "text": "B", "score": 0.8},
+            {"i": 2, "chunk_id": "c", "text": "C", "score": 0.7},
+        ])
+        hits = retrieve_module.search_chunks_many(tx, [[1.0], [0.0], [0.5]], 4, 0.1)
+
+        self.assertEqual(1, len(tx.calls))
+        self.assertEqual([["a"], [], ["b", "c"]], [[h["chunk_id"] for h in q] for q in hits])
+        self.assertNotIn("i", hits[0][0])
+
+    def test_questions_are_batched_and_returned_in_order(self) -> None:
+        questions = [f"q{i}" for i in range(5)]
+        batches = []
+
+        def embed_questions(batch, client=None):
+            batches.append(list(batch))
+            return [[float(q[1:])] for q in batch], None
+
+        def vector_search_many(session, query_embeddings, max_chunks, rescore_embeddings=None):
+            return [[{"chunk_id": f"c{int(e[0])}", "text": "t", "score": 1.0}] for e in query_embeddings]
+
+        async def extract(question, client=None, matcher=None):
+            # Later questions finish first.
+            await asyncio.sleep(0.05 * (5 - int(question[1:])))
+            return [], TimestampRange(question, None)
+
+        patches = [
+            mock.patch.object(retrieve_module, "_neo4j_driver", return_value=_Driver()),
+            mock.patch.object(retrieve_module, "_with_session", lambda driver, work, *args: work(None, *args)),
+            mock.patch.object(retrieve_module, "embed_questions", embed_questions),
+            mock.patch.object(retrieve_module, "vector_search_many", vector_search_many),
+            mock.patch.object(retrieve_module, "async_extract_query_entities_and_time", extract),
+            mock.patch.dict(os.environ, {"RETRIEVE_MANY_BATCH": "2"}),
+        ]
+        for patch in patches:
+            patch.start()
+        try:
+            results = retrieve_module.retrieve_many(questions)
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+        self.assertEqual([["q0", "q1"], ["q2", "q3"], ["q4"]], batches)
+        self.assertEqual(questions, [r["question"] for r in results])
+        self.assertEqual(questions, [r["time_range"].start_date for r in results])
+        self.assertEqual([f"c{i}" for i in range(5)], [r["chunks"][0]["chunk_id"] for r in results])
+
+
+def _relation(rel_id, source, target):
+    return {
+        "rel_id": rel_id,
+        "similarity": 0.9,
+        "relation_text": f"{source} works with {target}.",
+        "start_date": "2021-03-01",
+        "end_date": "2021-03-01",
+        "chunk_ids": ["c1"],
+        "source_node_id": hash(source) % 1000,
+        "target_node_id": hash(target) % 1000,
+        "source_entity_id": source,
+        "target_entity_id": target,
+    }
+
+
+class TestEdgePath(unittest.TestCase):
+    # Everything below rank_edges is faked; rank_edges itself runs the numpy engine.
+    def _patches(self):
+        async def extract(question, client=None, matcher=None):
+            return [QueryEntity("Acme", "company")], TimestampRange("2021-01-01", "2021-12-31")
+
+        return [
+            mock.patch.object(retrieve_module, "_neo4j_driver", return_value=_Driver()),
+            mock.patch.object(retrieve_module, "_with_session", lambda driver, work, *args: work(None, *args)),
+            mock.patch.object(retrieve_module, "_read", lambda driver, work, *args: work(None, *args)),
+            mock.patch.object(retrieve_module, "embed_question", lambda question, client=None: ([1.0, 0.0], None)),
+            mock.patch.object(
+                retrieve_module, "embed_questions", lambda batch, client=None: ([[1.0, 0.0] for _ in batch], None)
+            ),
+            mock.patch.object(retrieve_module, "vector_search", lambda *args: []),
+            mock.patch.object(retrieve_module, "vector_search_many", lambda session, embeddings, *args: [[] for _ in embeddings]),
+            mock.patch.object(retrieve_module, "search_relations", lambda tx, *args: [_relation(1, "acme", "beta")]),
+            mock.patch.object(
+                retrieve_module,
+                "search_relations_many",
+                lambda tx, embeddings, *args: [[_relation(1, "acme", "beta")] for _ in embeddings],
+            ),
+            mock.patch.object(retrieve_module, "link_entities", lambda tx, entities: [("acme", 1.0)]),
+            mock.patch.object(
+                retrieve_module, "edges_for_entities", lambda tx, ids, time_range: [_relation(2, "acme", "gamma")]
+            ),
+            mock.patch.object(retrieve_module, "async_extract_query_entities_and_time", extract),
+            mock.patch.dict(os.environ, {"RETRIEVE_EDGES": "true", "PPR_ENGINE": "numpy", "QUERY_CACHE": "false"}),
+        ]
+
+    def _with_patches(self, run):
+        patches = self._patches()
+        for patch in patches:
+            patch.start()
+        try:
+            return run()
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+    def test_retrieve_async_returns_ranked_edges(self) -> None:
+        result = self._with_patches(lambda: asyncio.run(retrieve_module.retrieve_async("What did Acme do in 2021?")))
+
+        self.assertEqual({1, 2}, {edge["rel_id"] for edge in result["edges"]})
+        self.assertIn("[edge:", result["context"])
+
+    def test_retrieve_many_returns_ranked_edges(self) -> None:
+        results = self._with_patches(lambda: retrieve_module.retrieve_many(["What did Acme do?", "And in 2021?"]))
+
+        self.assertEqual([{1, 2}, {1, 2}], [{edge["rel_id"] for edge in r["edges"]} for r in results])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+from unittest import mock
+
+from tkg_rag import service as service_module
+
+
+class TestRetrievalService(unittest.TestCase):
+    def setUp(self) -> None:
+        env = mock.patch.dict(os.environ, {"MODEL_API_KEY": "test-key"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_questions_share_one_driver_and_clients(self) -> None:
+        calls = []
+
+        def fake_retrieve(question, max_edges, max_chunks, driver=None, llm_client=None, embedding_client=None):
+            calls.append((driver, llm_client, embedding_client))
+            return {"question": question, "context": "ctx"}
+
+        with mock.patch.object(service_module, "retrieve", fake_retrieve), \
+                mock.patch.object(service_module, "generate_answer", lambda q, c, client: f"{c}:{id(client)}"):
+            with service_module.RetrievalService() as service:
+                service.retrieve("q1")
+                answer = service.answer("q2")
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(calls[0], calls[1])
+        self.assertIs(calls[0][0], service.driver)
+        self.assertEqual(f"ctx:{id(service.llm_client)}", answer)
+
+    def test_overlapping_service_runs_retrieve_async_on_its_own_loop(self) -> None:
+        loops = []
+
+        async def fake_retrieve_async(question, max_edges, max_chunks, driver=None, llm_client=None, embedding_client=None):
+            import asyncio
+            loops.append(asyncio.get_running_loop())
+            return {"question": question, "context": "ctx", "llm_client": llm_client}
+
+        with mock.patch.object(service_module, "retrieve_async", fake_retrieve_async):
+            with service_module.RetrievalService(overlap_stages=True) as service:
+                first = service.retrieve("q1")
+                service.retrieve("q2")
+                self.assertIs(service.async_llm_client, first["llm_client"])
+
+        self.assertIs(loops[0], loops[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from datetime import date
+
+from tkg_rag.models import TimestampRange, date_ordinal
+from tkg_rag.timestamps import find_timestamp_mentions, parse_timestamp_range, parse_timestamp_ranges
+
+
+class TestTimestampRanges(unittest.TestCase):
+    def test_parses_prompt_range_format(self) -> None:
+        self.assertEqual(
+            TimestampRange("2021-01-01", "2021-03-31"),
+            parse_timestamp_range("2021-01-01 to 2021-03-31"),
+        )
+
+    def test_parses_open_ended_ranges(self) -> None:
+        self.assertEqual(TimestampRange("2021-05-01", None), parse_timestamp_range("2021-05-01 to "))
+        self.assertEqual(TimestampRange(None, "2021-05-31"), parse_timestamp_range(" to 2021-05-31"))
+
+    def test_range_sides_may_be_coarser_periods(self) -> None:
+        self.assertEqual(
+            TimestampRange("2020-10-01", "2021-12-31"),
+            parse_timestamp_range("2020-Q4 to 2021"),
+        )
+        self.assertEqual(TimestampRange("2024-02-01", "2024-02-29"), parse_timestamp_range("2024-02"))
+
+    def test_rejects_ranges_with_unparseable_side(self) -> None:
+        self.assertEqual(TimestampRange(None, None), parse_timestamp_range("2021-01-01 to later"))
+        self.assertEqual(TimestampRange(None, None), parse_timestamp_range("to"))
+
+    def test_finds_time_expressions_in_questions(self) -> None:
+        self.assertEqual(
+            [("2020-Q1", "quarter"), ("2021-03", "date_range"), ("2022-05-01", "date"), ("2019", "year")],
+            [
+                (name, time_type)
+                for _, _, name, time_type in find_timestamp_mentions(
+                    "Crocs in 2020 Q1, March 2021 and on 2022-05-01 vs 2019?"
+                )
+            ],
+        )
+        self.assertEqual([], find_timestamp_mentions("FY2021 and 2020-13"))
+
+    def test_ordinals(self) -> None:
+        tr = parse_timestamp_range("Q1 2021")
+        self.assertEqual(date(2021, 1, 1).toordinal(), tr.start_ordinal)
+        self.assertEqual(date(2021, 3, 31).toordinal(), tr.end_ordinal)
+        self.assertIsNone(parse_timestamp_range("2021-13-01").start_ordinal)
+        self.assertEqual(date(2021, 3, 31).toordinal(), date_ordinal("2021-03-31T00:00:00Z"))
+
+    def test_batch_api(self) -> None:
+        ranges = parse_timestamp_ranges(["2021", "2021", "nonsense"])
+        self.assertEqual(
+            {"2021": TimestampRange("2021-01-01", "2021-12-31"), "nonsense": TimestampRange(None, None)},
+            ranges,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
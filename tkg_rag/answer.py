@@ -5,10 +5,10 @@ from . import prompts
 from .settings import LLM_MODEL
 
 
-def generate_answer(question: str, context: str) -> str:
+def generate_answer(question: str, context: str, client=None) -> str:
     if not LLM_MODEL:
         raise RuntimeError("LLM_MODEL is not set.")
-    client = openai_client()
+    client = client or openai_client()
     user_prompt = prompts.RAG_RESPOSE_USER_PROMPT.format(context=context, question=question)
     response = client.chat.completions.create(
         model=LLM_MODEL,
@@ -0,0 +1,361 @@
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .chunking import chunk_settings
+from .embedding_stage import iter_embedded_payloads
+from .embedding_storage import embedding_int8_sidecar
+from .entity_index import EntityIndex
+from .graph_writer import ChunkPayload, WriteStats, plan_chunk_batch
+from .ingest import (
+    CorpusDocument,
+    _DocumentState,
+    _is_time_entity,
+    chunk_deduper,
+    document_chunks,
+    embed_chunks,
+    embed_texts,
+    iter_keyed_extractions,
+    llm_extraction_options,
+    parse_timestamp_ranges,
+    source_fingerprint,
+)
+from .ingest_journal import DeadLetterFile, dead_letter_path
+from .models import date_ordinal
+from .relation_dedup import EdgeKey, _EdgeState
+
+logger = logging.getLogger(__name__)
+
+# Entity names and aliases never contain the extraction tuple delimiter, so it is
+# safe as the array delimiter for aliases:string[].
+ARRAY_DELIMITER = "|"
+
+NODE_FILES = {
+    "Source": "sources.csv",
+    "Chunk": "chunks.csv",
+    "Entity": "entities.csv",
+}
+RELATIONSHIP_FILES = {
+    "FROM_SOURCE": "from_source.csv",
+    "MENTIONS": "mentions.csv",
+    "RELATED_TO": "related_to.csv",
+}
+
+
+def _floats(vector: Optional[Sequence[float]]) -> str:
+    # float[] columns are float32; nine significant digits round-trip exactly.
+    if vector is None:
+        return ""
+    return ARRAY_DELIMITER.join(format(float(x), ".9g") for x in vector)
+
+
+def _bytes(code: Optional[bytes]) -> str:
+    if code is None:
+        return ""
+    return ARRAY_DELIMITER.join(str(b) for b in np.frombuffer(code, dtype=np.int8))
+
+
+def _date(value: Optional[str]) -> str:
+    # Empty fields import as missing properties; impossible dates would abort the import.
+    return value if value and date_ordinal(value) is not None else ""
+
+
+def _datetime(value: Optional[object]) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        seconds = value / 1000.0 if value > 1e12 else value
+        return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+
+class BulkGraphBuilder:
+    # Runs the same entity resolution and relation dedup as write_chunk_batch against
+    # in-memory state and writes neo4j-admin import CSVs. Chunks and their relationships
+    # are streamed to disk; entities, edges and sources are written by close().
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.entity_index = EntityIndex()
+        self.edges: Dict[EdgeKey, List[_EdgeState]] = {}
+        self.sources: Dict[str, Tuple[Optional[str], Optional[object], Optional[str]]] = {}
+        self.chunks = 0
+        self.relations_merged = 0
+        self._handles = {}
+        self._writers = {}
+        self.int8_sidecar = embedding_int8_sidecar()
+        chunk_header = ["chunk_id:ID(Chunk)", "text", "embedding:float[]"]
+        if self.int8_sidecar:
+            chunk_header.append("embedding_int8:byte[]")
+        self._open("Chunk", chunk_header)
+        self._open("FROM_SOURCE", [":START_ID(Chunk)", ":END_ID(Source)"])
+        self._open("MENTIONS", [":START_ID(Chunk)", ":END_ID(Entity)"])
+
+    def _open(self, name: str, header: List[str]) -> csv.writer:
+        filename = NODE_FILES.get(name) or RELATIONSHIP_FILES[name]
+        handle = open(os.path.join(self.directory, filename), "w", encoding="utf-8", newline="")
+        writer = csv.writer(handle)
+        writer.writerow(header)
+        self._handles[name] = handle
+        self._writers[name] = writer
+        return writer
+
+    def add_source(
+        self,
+        source_id: str,
+        uri: Optional[str],
+        last_modified: Optional[object],
+        content_hash: Optional[str],
+    ) -> None:
+        self.sources[source_id] = (uri, last_modified, content_hash)
+
+    def add_batch(self, payloads: List[ChunkPayload]) -> None:
+        if not payloads:
+            return
+        staged = self.entity_index.stage()
+        stats = WriteStats()
+        plan = plan_chunk_batch(
+            payloads,
+            staged,
+            lambda keys: {key: list(self.edges.get(key, [])) for key in keys},
+            stats,
+        )
+        staged.commit()
+        self.chunks += stats.chunks
+        self.relations_merged += stats.relations_merged
+        chunks = self._writers["Chunk"]
+        from_source = self._writers["FROM_SOURCE"]
+        for chunk_id, payload, source_id in zip(plan.chunk_ids, payloads, plan.source_ids):
+            row = [chunk_id, payload.text, _floats(payload.embedding)]
+            if self.int8_sidecar:
+                row.append(_bytes(payload.embedding_int8))
+            chunks.writerow(row)
+            if source_id in self.sources:
+                from_source.writerow([chunk_id, source_id])
+        mentions = self._writers["MENTIONS"]
+        for row in plan.mention_rows:
+            mentions.writerow([row["chunk_id"], row["entity_id"]])
+        for edge in plan.new_edges:
+            key = (edge.source_entity_id, edge.target_entity_id, edge.start_date, edge.end_date)
+            self.edges.setdefault(key, []).append(edge)
+
+    def close(self) -> Dict[str, int]:
+        for handle in self._handles.values():
+            handle.close()
+        counts = {"chunks": self.chunks, "sources": len(self.sources)}
+
+        path = os.path.join(self.directory, NODE_FILES["Source"])
+        with open(path, "w", encoding="utf-8", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["source_id:ID(Source)", "uri", "last_modified:datetime", "content_hash"])
+            for source_id, (uri, last_modified, content_hash) in self.sources.items():
+                writer.writerow([source_id, uri or "", _datetime(last_modified), content_hash or ""])
+
+        path = os.path.join(self.directory, NODE_FILES["Entity"])
+        with open(path, "w", encoding="utf-8", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["entity_id:ID(Entity)", "name", "entity_type", "aliases:string[]"])
+            for entity in self.entity_index:
+                writer.writerow([entity.entity_id, entity.name, entity.entity_type, ARRAY_DELIMITER.join(entity.aliases)])
+        counts["entities"] = len(self.entity_index)
+
+        path = os.path.join(self.directory, RELATIONSHIP_FILES["RELATED_TO"])
+        edges = 0
+        with open(path, "w", encoding="utf-8", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(
+                [
+                    ":START_ID(Entity)",
+                    ":END_ID(Entity)",
+                    "relation_id",
+                    "relation_text",
+                    "start_date:date",
+                    "end_date:date",
+                    "chunk_ids:string[]",
+                    "relation_embedding:float[]",
+                ]
+            )
+            for key_edges in self.edges.values():
+                for edge in key_edges:
+                    writer.writerow(
+                        [
+                            edge.source_entity_id,
+                            edge.target_entity_id,
+                            edge.relation_id,
+                            edge.relation_text,
+                            _date(edge.start_date),
+                            _date(edge.end_date),
+                            ARRAY_DELIMITER.join(edge.chunk_ids),
+                            _floats(edge.embedding),
+                        ]
+                    )
+                    edges += 1
+        counts["relations"] = edges
+        counts["relations_merged"] = self.relations_merged
+        return counts
+
+
+def neo4j_admin_import_args(import_dir: str = "/import", database: str = "neo4j") -> List[str]:
+    # Arguments for `neo4j-admin` inside the container; the database must be stopped.
+    args = ["database", "import", "full", database, "--overwrite-destination=true", "--multiline-fields=true"]
+    args.append(f"--array-delimiter={ARRAY_DELIMITER}")
+    for label, filename in NODE_FILES.items():
+        args.append(f"--nodes={label}={import_dir}/{filename}")
+    for rel_type, filename in RELATIONSHIP_FILES.items():
+        args.append(f"--relationships={rel_type}={import_dir}/{filename}")
+    return args
+
+
+def build_import_files(
+    documents: Iterable[CorpusDocument],
+    directory: str,
+    on_document: Optional[Callable[[int, CorpusDocument, Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    # Offline counterpart of ingest_corpus for an empty database: same chunking,
+    # extraction, embedding and resolution, but the output is import files.
+    max_embedding_retries = 3
+    extraction_options = llm_extraction_options()
+    chunk_options = chunk_settings()
+    batch_chunks = max(1, int(os.getenv("INGEST_WRITE_BATCH_CHUNKS", "8")))
+    embed_batch_tokens = int(os.getenv("INGEST_EMBED_BATCH_TOKENS", "16000"))
+    embed_concurrency = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+    dead_letters = DeadLetterFile(dead_letter_path())
+    builder = BulkGraphBuilder(directory)
+    started_at = time.time()
+
+    deduper = chunk_deduper()
+
+    states: Dict[int, _DocumentState] = {}
+    states_lock = threading.Lock()
+
+    def work_items():
+        for doc_idx, document in enumerate(documents):
+            started_at = time.time()
+            source_id, chunks, chunk_ids = document_chunks(document, chunk_options)
+            embedded = embed_chunks(chunks, max_retries=max_embedding_retries) if chunks else ([], [])
+            if embedded is None:
+                logger.warning("document %s: failed to embed texts after %s attempts.", doc_idx + 1, max_embedding_retries)
+                chunks, chunk_ids, embedded = [], [], ([], [])
+            embeddings, codes = embedded
+            decisions = deduper.classify(chunks, chunk_ids) if deduper is not None else [None] * len(chunks)
+            logger.info("document %s: got chunks: %s", doc_idx + 1, len(chunks))
+            with states_lock:
+                states[doc_idx] = _DocumentState(
+                    document,
+                    source_id,
+                    chunks,
+                    embeddings,
+                    started_at,
+                    chunk_ids=chunk_ids,
+                    embedding_codes=codes,
+                    dedup=decisions,
+                    fingerprint=source_fingerprint(chunk_ids),
+                )
+                if chunks:
+                    builder.add_source(source_id, document.source_uri, document.source_last_modified, None)
+            for chunk_idx, chunk in enumerate(chunks):
+                yield (doc_idx, chunk_idx), chunk
+
+    def dead_letter(key: Tuple[int, int], exc: Exception) -> None:
+        doc_idx, chunk_idx = key
+        with states_lock:
+            state = states[doc_idx]
+        dead_letters.append(
+            {
+                "source_id": state.source_id,
+                "source_uri": state.document.source_uri,
+                "chunk_id": state.chunk_ids[chunk_idx],
+                "chunk_idx": chunk_idx,
+                "error": repr(exc),
+            }
+        )
+        finish_chunk(doc_idx, failed=True)
+
+    def finish_chunk(doc_idx: int, failed: bool = False) -> None:
+        # Called from the extraction thread (dead letters) and the writer loop.
+        with states_lock:
+            state = states[doc_idx]
+            if failed:
+                state.failed += 1
+            else:
+                state.written += 1
+            if state.reported or state.written + state.failed < len(state.chunks):
+                return
+            state.reported = True
+            # Only complete sources get a fingerprint, so a later ingest_corpus run
+            # skips them but still fills in dead-lettered chunks.
+            if not state.failed:
+                builder.add_source(
+                    state.source_id, state.document.source_uri, state.document.source_last_modified, state.fingerprint
+                )
+            counts = {"chunks": state.written, "failed": state.failed}
+        if on_document is not None:
+            on_document(doc_idx, state.document, counts)
+
+    def replayed_extraction(key: Tuple[int, int]):
+        doc_idx, chunk_idx = key
+        with states_lock:
+            state = states[doc_idx]
+        return deduper.replay(state.chunks[chunk_idx], state.dedup[chunk_idx])
+
+    def payloads():
+        for key, extracted_entities, extracted_relations in iter_keyed_extractions(
+            work_items(),
+            replay=replayed_extraction if deduper is not None else None,
+            on_error=dead_letter,
+            **extraction_options,
+        ):
+            doc_idx, chunk_idx = key
+            with states_lock:
+                state = states[doc_idx]
+            yield ChunkPayload(
+                text=state.chunks[chunk_idx],
+                embedding=state.embeddings[chunk_idx],
+                embedding_int8=state.embedding_codes[chunk_idx],
+                entities=[e for e in extracted_entities if not _is_time_entity(e.entity_type)],
+                relations=extracted_relations,
+                relation_embeddings=[],
+                timestamp_ranges=parse_timestamp_ranges(
+                    e.name for e in extracted_entities if _is_time_entity(e.entity_type)
+                ),
+                source_id=state.source_id,
+                chunk_id=state.chunk_ids[chunk_idx],
+                key=key,
+            )
+
+    window: List[ChunkPayload] = []
+
+    def flush() -> None:
+        builder.add_batch(window)
+        for payload in window:
+            finish_chunk(payload.key[0])
+        window.clear()
+
+    for payload in iter_embedded_payloads(payloads(), embed_texts, embed_batch_tokens, embed_concurrency):
+        window.append(payload)
+        if len(window) >= batch_chunks:
+            flush()
+    flush()
+
+    counts = builder.close()
+    counts["failed_chunks"] = dead_letters.count
+    if deduper is not None:
+        counts.update({f"dedup_{name}": value for name, value in deduper.stats().items()})
+    logger.info(
+        "wrote import files for %s documents to %s in %.2f seconds: %s",
+        len(states),
+        directory,
+        time.time() - started_at,
+        counts,
+    )
+    return counts
@@ -0,0 +1,302 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .embedding_stage import approx_tokens
+from .models import ExtractedEntity, ExtractedRelation
+from .text_utils import TOKEN_RE
+
+logger = logging.getLogger(__name__)
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes; a * x stays below 2**63.
+_PRIME = (1 << 31) - 1
+_SEED = 1729
+
+
+def _dedup_enabled() -> bool:
+    return os.getenv("INGEST_CHUNK_DEDUP", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def _dedup_path() -> str:
+    return os.getenv("INGEST_CHUNK_DEDUP_PATH", ".cache/chunk_dedup.sqlite3")
+
+
+def _near_dup_threshold() -> float:
+    return float(os.getenv("INGEST_NEAR_DUP_THRESHOLD", "0.8"))
+
+
+def boilerplate_min_copies() -> int:
+    # Chunks whose near-duplicate cluster has at least this many copies are treated
+    # as boilerplate and not sent to the LLM; 0 (the default) disables skipping.
+    return int(os.getenv("INGEST_BOILERPLATE_MIN_COPIES", "0"))
+
+
+def boilerplate_min_similarity() -> float:
+    # Only copies this close to the cluster's first chunk are skipped, so a chunk that
+    # differs in a date or a figure still goes to the LLM.
+    return float(os.getenv("INGEST_BOILERPLATE_MIN_SIMILARITY", "0.98"))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, size: int = 5) -> List[str]:
+    words = TOKEN_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = _SEED) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in set(shingles(text))), dtype=np.uint64
+        )
+        if not hashes.size:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint32)
+        values = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _PRIME
+        return values.min(axis=0).astype(np.uint32)
+
+
+@dataclass
+class ChunkMatch:
+    text_hash: str
+    cluster_id: str
+    # Copies seen in the cluster so far, this one included.
+    cluster_size: int
+    # Similarity to the closest earlier chunk (1.0 for an exact repeat, 0.0 if none).
+    similarity: float
+    exact: bool
+    # Similarity to the cluster's first chunk (1.0 for that chunk itself).
+    anchor_similarity: float = 1.0
+
+
+class ChunkDedupIndex:
+    # MinHash signatures of every chunk seen, banded for LSH lookups, grouped into
+    # near-duplicate clusters. Persisted in SQLite; signatures and buckets are also
+    # held in memory for lookups.
+    def __init__(self, path: str, num_perm: int = 128, bands: int = 16, threshold: float = 0.8) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                text_hash TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                cluster_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS copies (
+                chunk_id TEXT PRIMARY KEY,
+                text_hash TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._clusters: Dict[str, str] = {}
+        self._cluster_sizes: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._chunk_ids: Set[str] = set()
+        for digest, blob, cluster_id in self._conn.execute("SELECT text_hash, signature, cluster_id FROM chunks"):
+            self._remember(digest, np.frombuffer(blob, dtype=np.uint32), cluster_id)
+        for chunk_id, digest in self._conn.execute("SELECT chunk_id, text_hash FROM copies"):
+            self._chunk_ids.add(chunk_id)
+            cluster_id = self._clusters.get(digest)
+            if cluster_id is not None:
+                self._cluster_sizes[cluster_id] += 1
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _remember(self, digest: str, signature: np.ndarray, cluster_id: str) -> None:
+        self._signatures[digest] = signature
+        self._clusters[digest] = cluster_id
+        self._cluster_sizes.setdefault(cluster_id, 0)
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(digest)
+
+    def _count_copy(self, chunk_id: str, digest: str, cluster_id: str) -> None:
+        # Copies are distinct chunk ids, so re-ingesting a document does not grow clusters.
+        if chunk_id in self._chunk_ids:
+            return
+        self._chunk_ids.add(chunk_id)
+        self._cluster_sizes[cluster_id] += 1
+        self._conn.execute("INSERT OR IGNORE INTO copies (chunk_id, text_hash) VALUES (?, ?)", (chunk_id, digest))
+
+    def _anchor_similarity(self, signature: np.ndarray, cluster_id: str) -> float:
+        # A cluster is named after the digest of its first chunk.
+        anchor = self._signatures.get(cluster_id)
+        return float(np.mean(anchor == signature)) if anchor is not None else 0.0
+
+    def add(self, text: str, chunk_id: str) -> ChunkMatch:
+        digest = text_hash(text)
+        with self._lock:
+            cluster_id = self._clusters.get(digest)
+            if cluster_id is not None:
+                self._count_copy(chunk_id, digest, cluster_id)
+                self._conn.commit()
+                return ChunkMatch(
+                    digest,
+                    cluster_id,
+                    self._cluster_sizes[cluster_id],
+                    1.0,
+                    True,
+                    self._anchor_similarity(self._signatures[digest], cluster_id),
+                )
+        signature = self.hasher.signature(text)
+        with self._lock:
+            candidates = {d for band_key in self._band_keys(signature) for d in self._buckets.get(band_key, ())}
+            best, best_sim = None, 0.0
+            for candidate in candidates:
+                sim = float(np.mean(self._signatures[candidate] == signature))
+                if sim > best_sim:
+                    best, best_sim = candidate, sim
+            cluster_id = self._clusters[best] if best is not None and best_sim >= self.threshold else digest
+            if digest not in self._clusters:
+                self._remember(digest, signature, cluster_id)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks (text_hash, signature, cluster_id, updated_at) VALUES (?, ?, ?, ?)",
+                    (digest, signature.tobytes(), cluster_id, time.time()),
+                )
+            cluster_id = self._clusters[digest]
+            self._count_copy(chunk_id, digest, cluster_id)
+            self._conn.commit()
+            return ChunkMatch(
+                digest,
+                cluster_id,
+                self._cluster_sizes[cluster_id],
+                best_sim,
+                False,
+                self._anchor_similarity(signature, cluster_id),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "texts": len(self._signatures),
+                "copies": len(self._chunk_ids),
+                "clusters": len(self._cluster_sizes),
+            }
+
+
+_INDEX: Optional[ChunkDedupIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def chunk_dedup_index() -> Optional[ChunkDedupIndex]:
+    global _INDEX
+    if not _dedup_enabled():
+        return None
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = ChunkDedupIndex(_dedup_path(), threshold=_near_dup_threshold())
+        return _INDEX
+
+
+EXACT = "exact"
+BOILERPLATE = "boilerplate"
+
+
+class ChunkDeduper:
+    # One ingest run's use of the index: classify() marks each new chunk as an exact
+    # repeat, boilerplate or neither; replay() returns the extraction to use instead
+    # of calling the LLM, and stats() counts the calls and prompt tokens saved. Exact
+    # repeats are replayed through cached_extraction (the extraction cache), which the
+    # first copy's LLM call filled.
+    def __init__(
+        self,
+        index: ChunkDedupIndex,
+        cached_extraction: Callable[[str], Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]],
+        prompt_tokens: int,
+    ) -> None:
+        self.index = index
+        self.cached_extraction = cached_extraction
+        self.prompt_tokens = prompt_tokens
+        self.min_copies = boilerplate_min_copies()
+        self.min_similarity = boilerplate_min_similarity()
+        self._lock = threading.Lock()
+        self._stats = {
+            "chunks": 0,
+            "exact_repeats": 0,
+            "near_duplicates": 0,
+            "exact_reused": 0,
+            "boilerplate_skipped": 0,
+            "llm_calls_avoided": 0,
+            "prompt_tokens_avoided": 0,
+        }
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def classify(self, chunks: List[str], chunk_ids: List[str]) -> List[Optional[str]]:
+        decisions: List[Optional[str]] = []
+        for chunk, chunk_id in zip(chunks, chunk_ids):
+            match = self.index.add(chunk, chunk_id)
+            self._count(
+                chunks=1,
+                exact_repeats=int(match.exact),
+                near_duplicates=int(not match.exact and match.similarity >= self.index.threshold),
+            )
+            if (
+                self.min_copies
+                and match.cluster_size >= self.min_copies
+                and match.anchor_similarity >= self.min_similarity
+            ):
+                decisions.append(BOILERPLATE)
+            elif match.exact:
+                decisions.append(EXACT)
+            else:
+                decisions.append(None)
+        return decisions
+
+    def replay(
+        self, chunk: str, decision: Optional[str]
+    ) -> Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]:
+        if decision == BOILERPLATE:
+            result: Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]] = ([], [])
+            self._count(boilerplate_skipped=1)
+        elif decision == EXACT:
+            # The first copy may still be in flight; then this one goes to the LLM too.
+            result = self.cached_extraction(chunk)
+            if result is None:
+                return None
+            self._count(exact_reused=1)
+        else:
+            return None
+        self._count(llm_calls_avoided=1, prompt_tokens_avoided=self.prompt_tokens + approx_tokens(chunk))
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,183 @@
+import logging
+import os
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPH_SEP_RE = re.compile(r"\n\s*--\s*\n|\n\s*\n")
+_SENTENCE_SEP_RE = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH_PREFIX = "\n\n"
+_SENTENCE_PREFIX = " "
+
+
+def _chunk_budget() -> str:
+    return os.getenv("INGEST_CHUNK_BUDGET", "chars").strip().lower()
+
+
+def chunk_settings() -> Dict[str, object]:
+    # (max_size, overlap, length_fn) for ingest; sizes are in the budget's unit.
+    if _chunk_budget() == "tokens":
+        return {
+            "max_size": int(os.getenv("INGEST_CHUNK_MAX", "400")),
+            "overlap": int(os.getenv("INGEST_CHUNK_OVERLAP", "50")),
+            "length_fn": token_counter(),
+        }
+    return {
+        "max_size": int(os.getenv("INGEST_CHUNK_MAX", "1600")),
+        "overlap": int(os.getenv("INGEST_CHUNK_OVERLAP", "200")),
+        "length_fn": None,
+    }
+
+
+@lru_cache(maxsize=None)
+def token_counter() -> Callable[[str], int]:
+    encoding_name = os.getenv("INGEST_CHUNK_TOKENIZER", "cl100k_base")
+    try:
+        import tiktoken
+    except ImportError:
+        from .embedding_stage import approx_tokens
+
+        logger.warning("tiktoken is not installed; budgeting chunks with ~4 chars per token.")
+        return approx_tokens
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode_ordinary(text))
+
+
+class _Units:
+    # Sentence units of one document as offsets into it. A unit is rendered as its
+    # prefix ("" for the first, "\n\n" after a paragraph break, " " after a sentence)
+    # followed by text[start:end].
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.prefixes: List[str] = []
+        # Units whose rendered prefix differs from the whitespace actually in front of
+        # them; everything between two breaks renders as one slice of text.
+        self.breaks: List[int] = []
+        stripped = text.lstrip()
+        lo = len(text) - len(stripped)
+        hi = lo + len(stripped.rstrip())
+        para_start = lo
+        for sep in _PARAGRAPH_SEP_RE.finditer(text, lo, hi):
+            self._add_paragraph(para_start, sep.start())
+            para_start = sep.end()
+        self._add_paragraph(para_start, hi)
+
+    def _add_paragraph(self, start: int, end: int) -> None:
+        paragraph = self.text[start:end]
+        stripped = paragraph.lstrip()
+        lo = len(paragraph) - len(stripped)
+        hi = lo + len(stripped.rstrip())
+        if lo >= hi:
+            return
+        starts, ends, prefixes = self.starts, self.ends, self.prefixes
+        # Sentence separators are maximal whitespace runs, so sentences need no stripping.
+        if starts:
+            if self.text[ends[-1]:start + lo] != _PARAGRAPH_PREFIX:
+                self.breaks.append(len(starts))
+            prefixes.append(_PARAGRAPH_PREFIX)
+        else:
+            prefixes.append("")
+        sent_start = lo
+        for sep in _SENTENCE_SEP_RE.finditer(paragraph, lo, hi):
+            starts.append(start + sent_start)
+            ends.append(start + sep.start())
+            if sep.end() - sep.start() != 1 or paragraph[sep.start()] != _SENTENCE_PREFIX:
+                self.breaks.append(len(starts))
+            prefixes.append(_SENTENCE_PREFIX)
+            sent_start = sep.end()
+        starts.append(start + sent_start)
+        ends.append(start + hi)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def render(self, first: int, last: int) -> str:
+        # Units first..last-1 with the first unit's prefix dropped.
+        text, starts, ends = self.text, self.starts, self.ends
+        parts: List[str] = []
+        seg = first
+        for b in self.breaks[bisect_right(self.breaks, first):bisect_left(self.breaks, last)]:
+            parts.append(text[starts[seg]:ends[b - 1]])
+            parts.append(self.prefixes[b])
+            seg = b
+        parts.append(text[starts[seg]:ends[last - 1]])
+        return "".join(parts)
+
+
+@dataclass
+class ChunkSpan:
+    # A chunk as a range of sentence units; start/end are character offsets of its
+    # first and last unit in the source document. text is built on access.
+    units: _Units
+    first_unit: int
+    last_unit: int
+    size: int
+
+    @property
+    def start(self) -> int:
+        return self.units.starts[self.first_unit]
+
+    @property
+    def end(self) -> int:
+        return self.units.ends[self.last_unit - 1]
+
+    @property
+    def text(self) -> str:
+        return self.units.render(self.first_unit, self.last_unit)
+
+    def __repr__(self) -> str:
+        return f"ChunkSpan(start={self.start}, end={self.end}, units={self.first_unit}:{self.last_unit}, size={self.size})"
+
+
+def chunk_spans(
+    text: str,
+    max_size: int = 1600,
+    overlap: int = 200,
+    length_fn: Optional[Callable[[str], int]] = None,
+) -> List[ChunkSpan]:
+    # Greedy sentence packing up to max_size with about overlap worth of trailing
+    # units repeated at the start of the next chunk. Sizes come from length_fn
+    # (default: characters, which reproduces the original chunk_text exactly).
+    if not text:
+        return []
+    units = _Units(text)
+    n = len(units)
+    if not n:
+        return []
+    if length_fn is None:
+        bare = [end - start for start, end in zip(units.starts, units.ends)]
+        full = [b + len(p) for b, p in zip(bare, units.prefixes)]
+    else:
+        prefix_cost = {p: length_fn(p) if p else 0 for p in set(units.prefixes)}
+        bare = [length_fn(text[start:end]) for start, end in zip(units.starts, units.ends)]
+        full = [b + prefix_cost[p] for b, p in zip(bare, units.prefixes)]
+    # totals[k] = rendered size of units 0..k-1, each with its prefix.
+    totals = [0] * (n + 1)
+    for i, cost in enumerate(full):
+        totals[i + 1] = totals[i] + cost
+
+    spans: List[ChunkSpan] = []
+    start_idx = 0
+    while start_idx < n:
+        # The first unit drops its prefix and is always taken, even when oversized.
+        budget = max_size - bare[start_idx] + totals[start_idx + 1]
+        end_idx = max(start_idx + 1, min(n, bisect_right(totals, budget, start_idx + 1) - 1))
+        size = bare[start_idx] + totals[end_idx] - totals[start_idx + 1]
+        spans.append(ChunkSpan(units, start_idx, end_idx, size))
+        if end_idx >= n:
+            break
+        if overlap <= 0:
+            next_start_idx = end_idx
+        else:
+            # Latest unit from which the tail of this chunk reaches the overlap.
+            next_start_idx = bisect_right(totals, totals[end_idx] - overlap, 0, end_idx) - 1
+        if next_start_idx <= start_idx:
+            next_start_idx = start_idx + 1
+        start_idx = next_start_idx
+    return spans
@@ -0,0 +1,236 @@
+import atexit
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_ROWS = 1024
+_KEY_BYTES = 32
+# SQLite's default limit on bound parameters is 999.
+_QUERY_BATCH = 500
+
+
+def _cache_enabled() -> bool:
+    return os.getenv("EMBEDDING_CACHE", "true").strip().lower() in {"1", "true", "yes"}
+
+
+def _cache_dir() -> str:
+    return os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+
+
+def _cache_max_entries() -> int:
+    return int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _grow_file(path: str, size: int) -> None:
+    with open(path, "ab") as handle:
+        if handle.tell() < size:
+            handle.truncate(size)
+
+
+class EmbeddingCache:
+    # One cache per (model, dim). Vectors live in a float32 memmap and the text key
+    # (sha256) of each row in a second memmap next to it. Every read checks that key
+    # before and after copying the vector, so a row whose vector was rewritten without
+    # its index update (crash, kill) or during the read is a miss rather than someone
+    # else's embedding. The key -> row index, LRU order and
+    # free rows live in SQLite (WAL). Each write allocates rows and writes vectors
+    # inside one IMMEDIATE transaction, so processes sharing the directory never
+    # hand out the same row.
+    def __init__(self, directory: str, model: str, dim: int, max_entries: int) -> None:
+        self.model = model
+        self.dim = dim
+        self.max_entries = max(1, max_entries)
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, f"{slug}-{dim}.f32")
+        self._keys_path = os.path.join(directory, f"{slug}-{dim}.keys")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, f"{slug}-{dim}.index.sqlite3"),
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                key TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                used INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS rows_used ON rows (used);
+            CREATE TABLE IF NOT EXISTS free (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._mapped = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _capacity(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'capacity'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _map(self, row: int) -> None:
+        # Another process may have grown the files since they were mapped here.
+        if row < self._mapped:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._keys.flush()
+        capacity = self._capacity()
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode="r+", shape=(capacity, _KEY_BYTES))
+        self._mapped = capacity
+
+    def _grow(self) -> None:
+        capacity = self._capacity()
+        grown = max(_INITIAL_ROWS, capacity * 2)
+        grown = max(capacity + 1, min(grown, self.max_entries))
+        _grow_file(self._vectors_path, grown * self.dim * 4)
+        _grow_file(self._keys_path, grown * _KEY_BYTES)
+        self._conn.executemany("INSERT OR IGNORE INTO free (row) VALUES (?)", ((row,) for row in range(capacity, grown)))
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('capacity', ?)", (grown,))
+
+    def _allocate(self) -> int:
+        (entries,) = self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()
+        if entries >= self.max_entries:
+            key, row = self._conn.execute("SELECT key, row FROM rows ORDER BY used LIMIT 1").fetchone()
+            self._conn.execute("DELETE FROM rows WHERE key = ?", (key,))
+            self.evictions += 1
+            return row
+        free = self._conn.execute("SELECT row FROM free ORDER BY row LIMIT 1").fetchone()
+        if free is None:
+            self._grow()
+            free = self._conn.execute("SELECT row FROM free ORDER BY row LIMIT 1").fetchone()
+        self._conn.execute("DELETE FROM free WHERE row = ?", (free[0],))
+        return free[0]
+
+    def _read_row(self, row: int, key: bytes) -> Optional[np.ndarray]:
+        # Seqlock-style read: the key is checked before and after copying the vector,
+        # so a row another process rewrote meanwhile (its writer clears the key first
+        # and sets the new one last) is a miss, not a mix of two embeddings.
+        if self._keys[row].tobytes() != key:
+            return None
+        vector = np.array(self._vectors[row])
+        if self._keys[row].tobytes() != key:
+            return None
+        return vector
+
+    def get_many(self, texts: Sequence[str], as_arrays: bool = False) -> List[Optional[List[float]]]:
+        # as_arrays returns float32 copies instead of lists.
+        keys = [text_key(text) for text in texts]
+        unique = list(dict.fromkeys(keys))
+        out: List[Optional[List[float]]] = []
+        with self._lock:
+            rows: Dict[str, int] = {}
+            for offset in range(0, len(unique), _QUERY_BATCH):
+                batch = unique[offset:offset + _QUERY_BATCH]
+                rows.update(self._conn.execute(
+                    f"SELECT key, row FROM rows WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+            if rows:
+                self._map(max(rows.values()))
+            used: Dict[str, int] = {}
+            for key in keys:
+                row = rows.get(key)
+                vector = self._read_row(row, bytes.fromhex(key)) if row is not None else None
+                if vector is None:
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self.hits += 1
+                used[key] = time.time_ns() + len(used)
+                out.append(vector if as_arrays else vector.tolist())
+            if used:
+                self._conn.executemany("UPDATE rows SET used = ? WHERE key = ?", ((u, k) for k, u in used.items()))
+        return out
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for text, vec in zip(texts, vectors):
+                    if len(vec) != self.dim:
+                        continue
+                    key = text_key(text)
+                    existing = self._conn.execute("SELECT row FROM rows WHERE key = ?", (key,)).fetchone()
+                    row = existing[0] if existing else self._allocate()
+                    self._map(row)
+                    # The key goes last: until it is written, the row reads as a miss.
+                    self._keys[row] = 0
+                    self._vectors[row] = np.asarray(vec, dtype=np.float32)
+                    self._keys[row] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO rows (key, row, used) VALUES (?, ?, ?)", (key, row, time.time_ns())
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._keys.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_CACHES: Dict[Tuple[str, int], EmbeddingCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def embedding_cache(model: str, dim: int) -> Optional[EmbeddingCache]:
+    if not _cache_enabled():
+        return None
+    key = (model, dim)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = EmbeddingCache(_cache_dir(), model, dim, _cache_max_entries())
+            _CACHES[key] = cache
+        return cache
+
+
+def embedding_cache_stats() -> Dict[str, Dict[str, int]]:
+    with _CACHES_LOCK:
+        caches = list(_CACHES.values())
+    return {f"{c.model}-{c.dim}": c.stats() for c in caches}
+
+
+@atexit.register
+def _flush_all() -> None:
+    with _CACHES_LOCK:
+        caches = list(_CACHES.values())
+    for cache in caches:
+        try:
+            cache.flush()
+        except OSError as exc:
+            logger.warning("Failed to flush embedding cache: %s", exc)
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Tuple
+
+from .graph_writer import ChunkPayload
+
+logger = logging.getLogger(__name__)
+
+# Max inputs per embeddings request accepted by OpenAI-compatible providers.
+MAX_BATCH_INPUTS = 2048
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English BPE vocabularies; good enough for batching.
+    return len(text) // 4 + 1
+
+
+def _embed_with_retries(
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    texts: List[str],
+    max_retries: int,
+) -> List[List[float]]:
+    attempt = 0
+    while True:
+        try:
+            return embed_fn(texts)
+        except Exception as exc:
+            attempt += 1
+            if attempt > max_retries:
+                raise RuntimeError(f"Relation embedding failed for batch of {len(texts)} texts: {exc}") from exc
+            logger.warning("Relation embedding failed (attempt %s), retrying: %s", attempt, exc)
+            time.sleep(2 ** (attempt - 1))
+
+
+def iter_embedded_payloads(
+    payloads: Iterable[ChunkPayload],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    max_batch_tokens: int,
+    max_inflight: int,
+    max_retries: int = 2,
+) -> Iterator[ChunkPayload]:
+    # Packs relation descriptions from consecutive chunks into requests of about
+    # max_batch_tokens, keeps up to max_inflight requests running and yields each
+    # payload once its relation_embeddings are filled in. Yield order follows
+    # completion, not input order.
+    max_batch_tokens = max(1, max_batch_tokens)
+    max_inflight = max(1, max_inflight)
+    batch: List[ChunkPayload] = []
+    batch_texts: List[str] = []
+    batch_tokens = 0
+    inflight: Deque[Tuple[Future, List[ChunkPayload]]] = deque()
+    requests = 0
+    texts_total = 0
+
+    def submit(executor: ThreadPoolExecutor) -> None:
+        nonlocal batch, batch_texts, batch_tokens, requests, texts_total
+        if not batch:
+            return
+        future = executor.submit(_embed_with_retries, embed_fn, batch_texts, max_retries)
+        inflight.append((future, batch))
+        requests += 1
+        texts_total += len(batch_texts)
+        batch, batch_texts, batch_tokens = [], [], 0
+
+    def collect(block: bool) -> Iterator[ChunkPayload]:
+        if not inflight:
+            return
+        if block:
+            wait([f for f, _ in inflight], return_when=FIRST_COMPLETED)
+        for _ in range(len(inflight)):
+            future, members = inflight.popleft()
+            if not future.done():
+                inflight.append((future, members))
+                continue
+            vectors = iter(future.result())
+            for payload in members:
+                payload.relation_embeddings = [next(vectors) for _ in payload.relations]
+                yield payload
+
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="relation-embed") as executor:
+        for payload in payloads:
+            if not payload.relations:
+                payload.relation_embeddings = []
+                yield payload
+                continue
+            texts = [rel.description or "" for rel in payload.relations]
+            tokens = sum(approx_tokens(t) for t in texts)
+            if batch and (
+                batch_tokens + tokens > max_batch_tokens
+                or len(batch_texts) + len(texts) > MAX_BATCH_INPUTS
+            ):
+                submit(executor)
+            batch.append(payload)
+            batch_texts.extend(texts)
+            batch_tokens += tokens
+            if batch_tokens >= max_batch_tokens:
+                submit(executor)
+            yield from collect(block=False)
+            while len(inflight) >= max_inflight:
+                yield from collect(block=True)
+        submit(executor)
+        while inflight:
+            yield from collect(block=True)
+
+    if requests:
+        logger.info("embedded %s relation texts in %s requests", texts_total, requests)
+
+
+class RelationEmbeddingPrefetcher:
+    # Embeds relation descriptions while their chunk is still being generated
+    # (streaming extraction). embed() is a drop-in embed_fn for iter_embedded_payloads:
+    # prefetched texts are taken from finished or running requests, anything still
+    # buffered is embedded with the rest of the batch.
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        batch_size: int,
+        max_inflight: int,
+        max_retries: int = 2,
+    ) -> None:
+        self.embed_fn = embed_fn
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_inflight), thread_name_prefix="relation-prefetch")
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._pending: Dict[str, Tuple[Future, int]] = {}
+        self.prefetched = 0
+        self.used = 0
+
+    def add(self, text: str) -> None:
+        with self._lock:
+            if text in self._pending or text in self._buffer:
+                return
+            self._buffer.append(text)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+            future = self._executor.submit(_embed_with_retries, self.embed_fn, batch, self.max_retries)
+            for i, queued in enumerate(batch):
+                self._pending[queued] = (future, i)
+            self.prefetched += len(batch)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            taken = {text: self._pending.pop(text) for text in set(texts) if text in self._pending}
+            buffered = set(texts)
+            self._buffer = [text for text in self._buffer if text not in buffered]
+        vectors: Dict[str, List[float]] = {}
+        for text, (future, i) in taken.items():
+            try:
+                vectors[text] = future.result()[i]
+            except Exception as exc:
+                logger.warning("Prefetched relation embedding failed, embedding again: %s", exc)
+        self.used += len(vectors)
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if missing:
+            vectors.update(zip(missing, self.embed_fn(missing)))
+        return [vectors[text] for text in texts]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.prefetched:
+            logger.info("prefetched %s relation embeddings during extraction, %s used", self.prefetched, self.used)
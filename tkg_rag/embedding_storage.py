@@ -0,0 +1,87 @@
+import os
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+# What embed_texts hands out: float32 arrays by default, plain lists with
+# EMBEDDING_STORAGE=float64. The Neo4j driver packs both as LIST<FLOAT>.
+Vector = Union[np.ndarray, List[float]]
+
+
+def embedding_storage() -> str:
+    # float32: NumPy float32 vectors in Python and float[] vector properties in Neo4j.
+    # float64: the original list[float] / LIST<FLOAT> representation.
+    value = os.getenv("EMBEDDING_STORAGE", "float32").strip().lower()
+    return value if value in {"float32", "float64"} else "float32"
+
+
+def embedding_truncate() -> str:
+    # off: the provider returns EMBEDDING_DIM values.
+    # api: ask the provider for EMBEDDING_DIM values (`dimensions`, Matryoshka models).
+    # local: the provider returns EMBEDDING_SOURCE_DIM values, the first EMBEDDING_DIM
+    #   of them are kept and re-normalized. The full vectors stay available for the
+    #   int8 sidecar.
+    value = os.getenv("EMBEDDING_TRUNCATE", "off").strip().lower()
+    return value if value in {"off", "api", "local"} else "off"
+
+
+def source_embedding_dim(dim: int) -> int:
+    if embedding_truncate() == "local":
+        return int(os.getenv("EMBEDDING_SOURCE_DIM", str(dim)))
+    return dim
+
+
+def embedding_int8_sidecar() -> bool:
+    return os.getenv("EMBEDDING_INT8_SIDECAR", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def truncate_embeddings(vectors: Sequence[Sequence[float]], dim: int, dtype=np.float32) -> np.ndarray:
+    # Matryoshka truncation: keep the leading dims and restore unit length.
+    matrix = np.asarray(vectors, dtype=dtype)
+    if matrix.ndim != 2:
+        return matrix.reshape(0, dim)
+    matrix = matrix[:, :dim]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0.0)
+
+
+def stored_vectors(vectors: Sequence[Sequence[float]], dim: Optional[int] = None) -> List[Vector]:
+    # Vectors as returned by the provider -> the configured storage form, truncated to dim.
+    float32 = embedding_storage() == "float32"
+    if dim is not None and len(vectors) and len(vectors[0]) > dim:
+        matrix = truncate_embeddings(vectors, dim, np.float32 if float32 else np.float64)
+    elif float32:
+        matrix = np.asarray(vectors, dtype=np.float32)
+    else:
+        return [[float(x) for x in v] for v in vectors]
+    return list(matrix) if float32 else matrix.tolist()
+
+
+def stored_vector(vector: Sequence[float]) -> Vector:
+    if embedding_storage() == "float32":
+        return np.asarray(vector, dtype=np.float32)
+    return [float(x) for x in vector]
+
+
+def quantize_int8(vector: Sequence[float]) -> bytes:
+    # Symmetric per-vector scale. Cosine is scale invariant, so the codes alone are
+    # enough for rescoring and no scale is stored.
+    values = np.asarray(vector, dtype=np.float32)
+    peak = float(np.max(np.abs(values))) if values.size else 0.0
+    if peak == 0.0:
+        return bytes(values.size)
+    return np.round(values * (127.0 / peak)).astype(np.int8).tobytes()
+
+
+def int8_cosine(query: Sequence[float], codes: Sequence[Optional[bytes]]) -> np.ndarray:
+    # Cosine of query against each int8 code; 0.0 for missing or mismatched codes.
+    q = np.asarray(query, dtype=np.float32)
+    scores = np.zeros(len(codes), dtype=np.float32)
+    rows = [i for i, code in enumerate(codes) if code is not None and len(code) == q.size]
+    if not rows:
+        return scores
+    matrix = np.stack([np.frombuffer(codes[i], dtype=np.int8) for i in rows]).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(q)
+    dots = matrix @ q
+    scores[rows] = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0.0)
+    return scores
@@ -0,0 +1,196 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .settings import entity_type_strict_dedup
+from .text_utils import iou, tokens
+
+logger = logging.getLogger(__name__)
+
+# Candidates scored per lookup, as the LIMIT of the fulltext query it replaces.
+ENTITY_BM25_K = 10
+
+
+@dataclass
+class IndexedEntity:
+    entity_id: str
+    name: str
+    entity_type: str
+    aliases: List[str]
+    alias_tokens: List[Set[str]]
+    order: int
+    # Tokens of every alias, single-token ones included, as the fulltext index sees them.
+    tokens: Set[str]
+
+
+def scorable_alias_tokens(aliases: List[str]) -> List[Set[str]]:
+    scorable: List[Set[str]] = []
+    for alias in aliases:
+        alias_toks = tokens(alias)
+        if len(aliases) > 1 and len(alias_toks) == 1:
+            continue  # skip single-token aliases if multiple aliases exist.
+            # EOG Resources Inc -> EOG Resources -> EOG shouldnt further match -> EOG Burgers or so
+        scorable.append(alias_toks)
+    return scorable
+
+
+def _alias_iou(incoming_toks: Set[str], entity: IndexedEntity) -> float:
+    best = 0.0
+    for alias_toks in entity.alias_tokens:
+        best = max(best, iou(incoming_toks, alias_toks))
+    return best
+
+
+class EntityIndex:
+    # Inverted index alias token -> entity ids, standing in for the entity_name_aliases
+    # fulltext index during ingest.
+    def __init__(self) -> None:
+        self._entities: Dict[str, IndexedEntity] = {}
+        self._postings: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def __iter__(self) -> Iterator[IndexedEntity]:
+        return iter(list(self._entities.values()))
+
+    def get(self, entity_id: str) -> Optional[IndexedEntity]:
+        return self._entities.get(entity_id)
+
+    def put(self, entity_id: str, name: str, entity_type: str, aliases: Iterable[str]) -> IndexedEntity:
+        aliases = list(aliases)
+        previous = self._entities.get(entity_id)
+        entity = IndexedEntity(
+            entity_id=entity_id,
+            name=name,
+            entity_type=entity_type,
+            aliases=aliases,
+            alias_tokens=scorable_alias_tokens(aliases),
+            order=previous.order if previous else len(self._entities),
+            tokens=set().union(*(tokens(alias) for alias in aliases)),
+        )
+        self._entities[entity_id] = entity
+        for alias in aliases:
+            for tok in tokens(alias):
+                self._postings.setdefault(tok, set()).add(entity_id)
+        return entity
+
+    def remove(self, entity_id: str) -> None:
+        entity = self._entities.pop(entity_id, None)
+        if entity is None:
+            return
+        for alias in entity.aliases:
+            for tok in tokens(alias):
+                postings = self._postings.get(tok)
+                if postings is not None:
+                    postings.discard(entity_id)
+                    if not postings:
+                        del self._postings[tok]
+
+    def candidate_ids(self, incoming_toks: Set[str]) -> Set[str]:
+        ids: Set[str] = set()
+        for tok in incoming_toks:
+            ids |= self._postings.get(tok, set())
+        return ids
+
+    def best_match(self, name: str, entity_type: str) -> Tuple[Optional[IndexedEntity], float]:
+        return _best_match(self, name, entity_type)
+
+    def stage(self) -> "StagedEntityIndex":
+        return StagedEntityIndex(self)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, object]]) -> "EntityIndex":
+        index = cls()
+        for row in rows:
+            entity_id = row.get("entity_id")
+            if not entity_id:
+                continue
+            index.put(entity_id, row.get("name") or "", row.get("entity_type") or "", row.get("aliases") or [])
+        return index
+
+
+def _best_match(index, name: str, entity_type: str) -> Tuple[Optional[IndexedEntity], float]:
+    # Stands in for the fulltext top-k by BM25: candidates are ranked by how many
+    # query tokens they share, then by insertion order (Lucene's tie order), and
+    # only the first ENTITY_BM25_K are scored. The best IoU wins, earlier-ranked
+    # candidates on ties. Term weights are not modeled, so a rare shared token does
+    # not outrank a common one as it would under BM25.
+    type_strict = entity_type_strict_dedup()
+    incoming_toks = tokens(name)
+    candidates = []
+    for entity_id in index.candidate_ids(incoming_toks):
+        entity = index.get(entity_id)
+        if type_strict and entity.entity_type != entity_type:
+            continue
+        candidates.append(entity)
+    candidates.sort(key=lambda e: (-len(incoming_toks & e.tokens), e.order))
+    best = None
+    best_iou = 0.0
+    for entity in candidates[:ENTITY_BM25_K]:
+        iou_alias = _alias_iou(incoming_toks, entity)
+        if iou_alias > best_iou:
+            best_iou = iou_alias
+            best = entity
+    return best, best_iou
+
+
+class StagedEntityIndex:
+    # Overlay used inside a write transaction: the base index only changes on commit(),
+    # so a retried or failed transaction leaves it untouched.
+    def __init__(self, base: EntityIndex) -> None:
+        self.base = base
+        self._staged = EntityIndex()
+        self._created: List[str] = []
+        self._renamed: Set[str] = set()
+
+    def get(self, entity_id: str) -> Optional[IndexedEntity]:
+        return self._staged.get(entity_id) or self.base.get(entity_id)
+
+    def candidate_ids(self, incoming_toks: Set[str]) -> Set[str]:
+        return self.base.candidate_ids(incoming_toks) | self._staged.candidate_ids(incoming_toks)
+
+    def best_match(self, name: str, entity_type: str) -> Tuple[Optional[IndexedEntity], float]:
+        return _best_match(self, name, entity_type)
+
+    def create(self, entity_id: str, name: str, entity_type: str) -> IndexedEntity:
+        entity = self._staged.put(entity_id, name, entity_type, [name])
+        entity.order += len(self.base)
+        self._created.append(entity_id)
+        return entity
+
+    def add_alias(self, entity_id: str, alias: str) -> IndexedEntity:
+        current = self.get(entity_id)
+        entity = self._staged.put(
+            entity_id,
+            current.name,
+            current.entity_type,
+            sorted(set(current.aliases) | {alias}),
+        )
+        entity.order = current.order
+        if entity_id not in self._created:
+            self._renamed.add(entity_id)
+        return entity
+
+    def created(self) -> List[IndexedEntity]:
+        return [self._staged.get(entity_id) for entity_id in self._created]
+
+    def renamed(self) -> List[IndexedEntity]:
+        return [self._staged.get(entity_id) for entity_id in sorted(self._renamed)]
+
+    def commit(self) -> None:
+        for entity_id in self._created + sorted(self._renamed):
+            entity = self._staged.get(entity_id)
+            self.base.put(entity.entity_id, entity.name, entity.entity_type, entity.aliases)
+
+
+def load_entity_index(tx) -> EntityIndex:
+    result = tx.run(
+        """
+        MATCH (e:Entity)
+        RETURN e.entity_id AS entity_id, e.name AS name, e.entity_type AS entity_type, e.aliases AS aliases
+        """
+    )
+    index = EntityIndex.from_rows(record.data() for record in result)
+    logger.info("loaded entity index with %s entities", len(index))
+    return index
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_enabled() -> bool:
+    return os.getenv("EXTRACTION_CACHE", "true").strip().lower() in {"1", "true", "yes"}
+
+
+def reuse_extractions() -> bool:
+    return os.getenv("INGEST_REUSE_EXTRACTIONS", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def _cache_path() -> str:
+    return os.getenv("EXTRACTION_CACHE_PATH", ".cache/extractions.sqlite3")
+
+
+def prompt_hash(system_prompt: str, user_prompt_template: str) -> str:
+    return hashlib.sha256(f"{system_prompt}\0{user_prompt_template}".encode("utf-8")).hexdigest()
+
+
+def extraction_key(model: str, prompts_hash: str, chunk: str) -> str:
+    return hashlib.sha256(f"{model}\0{prompts_hash}\0{chunk}".encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    # Raw completions keyed by (model, prompt templates, chunk text). Parsing happens on
+    # read, so parse_extraction_output changes apply to cached responses too.
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                raw TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT raw FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, prompts_hash: str, raw: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, model, prompt_hash, raw, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, prompts_hash, raw, time.time()),
+            )
+            self._conn.commit()
+            self.writes += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+_CACHE: Optional[ExtractionCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def extraction_cache() -> Optional[ExtractionCache]:
+    global _CACHE
+    if not _cache_enabled():
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ExtractionCache(_cache_path())
+        return _CACHE
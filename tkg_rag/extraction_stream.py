@@ -0,0 +1,104 @@
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+from .models import ExtractedEntity, ExtractedRelation
+
+ExtractionRecord = Union[ExtractedEntity, ExtractedRelation]
+
+
+def parse_extraction_record(record: str, tuple_delimiter: str) -> Optional[ExtractionRecord]:
+    record = record.strip().strip(",")
+    if not record:
+        return None
+    record = record.strip("() ")
+    parts = [p.strip().strip('"') for p in record.split(tuple_delimiter)]
+    if not parts:
+        return None
+    if parts[0] == "entity":
+        if len(parts) >= 3:
+            return ExtractedEntity(parts[1], parts[2])
+    elif parts[0] in {"relationship", "event"}:
+        if len(parts) >= 5:
+            return ExtractedRelation(parts[1], parts[2], parts[3], parts[4])
+    return None
+
+
+def parse_extraction_output(
+    raw: str, tuple_delimiter: str, record_delimiter: str
+) -> Tuple[List[ExtractedEntity], List[ExtractedRelation]]:
+    parser = ExtractionStreamParser(tuple_delimiter, record_delimiter)
+    parser.feed(raw)
+    parser.close()
+    return parser.entities, parser.relations
+
+
+class ExtractionStreamParser:
+    # Incremental parse_extraction_output: feed() completion deltas as they arrive and
+    # get back the records whose record delimiter has been seen. After close() the
+    # collected entities/relations equal a one-shot parse of the full text.
+    def __init__(self, tuple_delimiter: str, record_delimiter: str) -> None:
+        self.tuple_delimiter = tuple_delimiter
+        self.record_delimiter = record_delimiter
+        self.entities: List[ExtractedEntity] = []
+        self.relations: List[ExtractedRelation] = []
+        self._parts: List[str] = []
+        self._buffer = ""
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> List[ExtractionRecord]:
+        if not delta:
+            return []
+        self._parts.append(delta)
+        # Only the unfinished tail plus the new delta is scanned for delimiters.
+        pieces = (self._buffer + delta).split(self.record_delimiter)
+        self._buffer = pieces.pop()
+        return self._collect(pieces)
+
+    def close(self) -> List[ExtractionRecord]:
+        pieces = [self._buffer]
+        self._buffer = ""
+        return self._collect(pieces)
+
+    def _collect(self, pieces: List[str]) -> List[ExtractionRecord]:
+        records: List[ExtractionRecord] = []
+        for piece in pieces:
+            record = parse_extraction_record(piece, self.tuple_delimiter)
+            if isinstance(record, ExtractedEntity):
+                self.entities.append(record)
+            elif isinstance(record, ExtractedRelation):
+                self.relations.append(record)
+            else:
+                continue
+            records.append(record)
+        return records
+
+
+PACKED_CHUNK_MARKER = "### CHUNK {index}"
+_PACKED_MARKER_RE = re.compile(r"^[ \t>*`]*#{2,}\s*CHUNK\s+(\d+)\b[^\n]*$", re.IGNORECASE | re.MULTILINE)
+
+
+def pack_chunks(chunks: List[str]) -> str:
+    return "\n".join(f"{PACKED_CHUNK_MARKER.format(index=i + 1)}\n{chunk}" for i, chunk in enumerate(chunks))
+
+
+def split_packed_output(raw: str, chunk_count: int) -> Dict[int, str]:
+    # Packed completion -> {chunk position: raw records of that chunk}. Chunks whose
+    # marker is missing, repeated or out of range are left out, so the caller can
+    # extract them on their own.
+    matches = list(_PACKED_MARKER_RE.finditer(raw))
+    sections: Dict[int, str] = {}
+    repeated = set()
+    for i, match in enumerate(matches):
+        position = int(match.group(1)) - 1
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(raw)
+        if not 0 <= position < chunk_count or position in repeated:
+            continue
+        if position in sections:
+            repeated.add(position)
+            del sections[position]
+            continue
+        sections[position] = raw[match.end():end].strip()
+    return sections
@@ -0,0 +1,129 @@
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_LOCK = threading.Lock()
+
+
+def _graph_name() -> str:
+    return os.getenv("GDS_GRAPH_NAME", "tkg_entities")
+
+
+def projection_name(version: int) -> str:
+    return f"{_graph_name()}_v{version}"
+
+
+def bump_graph_version(tx) -> int:
+    # Called after ingestion changed the graph; retrieval reprojects on the next query.
+    record = tx.run(
+        """
+        MERGE (m:GraphMeta {name: 'entities'})
+        SET m.version = coalesce(m.version, 0) + 1, m.updated_at = datetime()
+        RETURN m.version AS version
+        """
+    ).single()
+    return int(record["version"])
+
+
+def graph_version(tx) -> int:
+    record = tx.run("MATCH (m:GraphMeta {name: 'entities'}) RETURN m.version AS version").single()
+    return int(record["version"]) if record and record["version"] is not None else 0
+
+
+def _reproject_interval_s() -> float:
+    # A newer graph version is projected only once the newest projection is this old,
+    # so a long ingest does not reproject after every change. Keep it above the PPR
+    # timeout: a projection is dropped once the one after it is superseded, too.
+    return float(os.getenv("GDS_REPROJECT_INTERVAL_S", "300"))
+
+
+def _projections(tx) -> Dict[str, Tuple[int, float]]:
+    # Projection name -> (graph version, age in seconds).
+    pattern = re.compile(re.escape(_graph_name()) + r"_v(\d+)")
+    result = tx.run(
+        "CALL gds.graph.list() YIELD graphName, creationTime "
+        "RETURN graphName, duration.inSeconds(creationTime, datetime()).seconds AS age_s"
+    )
+    projections: Dict[str, Tuple[int, float]] = {}
+    for record in result:
+        match = pattern.fullmatch(record["graphName"])
+        if match:
+            projections[record["graphName"]] = (int(match.group(1)), float(record["age_s"]))
+    return projections
+
+
+def project_entity_graph(tx, name: str) -> Dict[str, int]:
+    # Whole Entity/RELATED_TO graph, without properties.
+    record = tx.run(
+        """
+        MATCH (a:Entity)-[r:RELATED_TO]->(b:Entity)
+        WITH gds.graph.project($name, a, b) AS g
+        RETURN g.nodeCount AS nodes, g.relationshipCount AS relationships
+        """,
+        name=name,
+    ).single()
+    return {"nodes": record["nodes"], "relationships": record["relationships"]} if record else {}
+
+
+def ensure_entity_graph(session) -> str:
+    # Name of the projection to query: the current graph version's, projected first
+    # if the newest projection is older than GDS_REPROJECT_INTERVAL_S, else that
+    # newest one. Besides it, the projection before it is kept for queries still
+    # running on it; older ones are dropped.
+    version = session.execute_read(graph_version)
+    name = projection_name(version)
+    with _PROJECT_LOCK:
+        existing = session.execute_read(_projections)
+        newest = max(existing, key=lambda n: existing[n][0], default=None)
+        if name not in existing and (newest is None or existing[newest][1] >= _reproject_interval_s()):
+            try:
+                counts = session.execute_write(project_entity_graph, name)
+                logger.info("projected GDS graph %s: %s", name, counts)
+            except Exception:
+                # Another process may have projected this version first.
+                if name not in session.execute_read(_projections):
+                    raise
+            existing[name] = (version, 0.0)
+        elif name not in existing:
+            name = newest
+        ordered = sorted(existing, key=lambda n: existing[n][0], reverse=True)
+        keep = set(ordered[ordered.index(name):][:2])
+        for stale in existing:
+            if stale not in keep and existing[stale][0] < existing[name][0]:
+                session.run("CALL gds.graph.drop($name, false)", name=stale).consume()
+    return name
+
+
+def run_ppr_projected(
+    session,
+    graph_name: str,
+    node_ids: List[int],
+    seed_node_ids: List[int],
+    damping: float,
+    max_iter: int,
+    tolerance: float,
+) -> Dict[str, float]:
+    # PPR from the seeds over the whole persistent projection, read back for the
+    # candidate nodes only. Unlike the numpy and gds engines, which walk just the
+    # candidate relations, scores here reflect the entire entity graph (all dates),
+    # and the projection may lag ingestion by up to GDS_REPROJECT_INTERVAL_S.
+    # Nothing is written to the GDS catalog per query.
+    if not node_ids or not seed_node_ids:
+        return {}
+    result = session.run(
+        "CALL gds.pageRank.stream($name, {maxIterations: $max_iter, dampingFactor: $damping, tolerance: $tolerance, sourceNodes: $seed_nodes}) "
+        "YIELD nodeId, score "
+        "WITH nodeId, score WHERE nodeId IN $node_ids "
+        "RETURN gds.util.asNode(nodeId).entity_id AS entity_id, score",
+        name=graph_name,
+        max_iter=max_iter,
+        damping=damping,
+        tolerance=tolerance,
+        seed_nodes=seed_node_ids,
+        node_ids=node_ids,
+    )
+    return {record["entity_id"]: record["score"] for record in result}
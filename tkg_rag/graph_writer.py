@@ -0,0 +1,428 @@
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .embedding_storage import embedding_storage, stored_vector
+from .entity_index import ENTITY_BM25_K, EntityIndex, StagedEntityIndex
+from .models import ExtractedEntity, ExtractedRelation, TimestampRange
+from .relation_dedup import EdgeKey, RelationDedup, _EdgeState
+from .settings import entity_type_strict_dedup
+from .text_utils import escape_lucene_query
+
+logger = logging.getLogger(__name__)
+
+ENTITY_IOU_THRESHOLD = 0.5  # tune: 0.5–0.8 typical for entity names
+
+
+@dataclass
+class ChunkPayload:
+    # entities holds only non-time entities; time entities arrive via timestamp_ranges.
+    text: str
+    embedding: List[float]
+    entities: List[ExtractedEntity]
+    relations: List[ExtractedRelation]
+    relation_embeddings: List[List[float]]
+    timestamp_ranges: Dict[str, TimestampRange]
+    source_id: Optional[str] = None
+    chunk_id: Optional[str] = None
+    # (document index, chunk index) within the ingest run that produced the payload.
+    key: Optional[Tuple[int, int]] = None
+    # int8 codes of the untruncated embedding (EMBEDDING_INT8_SIDECAR).
+    embedding_int8: Optional[bytes] = None
+
+
+def _set_vector(variable: str, prop: str, value: str, relationship: bool = False) -> str:
+    # Cypher clause storing a vector property. float32 mode goes through the vector
+    # procedures, which store a float[] (half the size of a LIST<FLOAT>).
+    if embedding_storage() == "float32":
+        kind = "Relationship" if relationship else "Node"
+        return f"CALL db.create.set{kind}VectorProperty({variable}, '{prop}', {value})"
+    return f"SET {variable}.{prop} = {value}"
+
+
+@dataclass
+class WriteStats:
+    chunks: int = 0
+    entities: int = 0
+    relations: int = 0
+    entities_created: int = 0
+    entities_merged: int = 0
+    relations_created: int = 0
+    relations_merged: int = 0
+    queries: int = 0
+    legacy_queries: int = 0
+
+    @property
+    def round_trips_saved(self) -> int:
+        return max(0, self.legacy_queries - self.queries)
+
+
+def fetch_entity_candidates(tx, entities: List[ExtractedEntity]) -> EntityIndex:
+    keys = []
+    seen = set()
+    for entity in entities:
+        key = (entity.name, entity.entity_type)
+        if key in seen or not entity.name.strip():
+            continue
+        seen.add(key)
+        keys.append(key)
+    if not keys:
+        return EntityIndex()
+    query = """
+    UNWIND $queries AS q
+    CALL {
+        WITH q
+        CALL db.index.fulltext.queryNodes('entity_name_aliases', q.query_text)
+        YIELD node, score
+        WHERE ($type_strict = false OR node.entity_type = q.entity_type)
+        RETURN node, score
+        ORDER BY score DESC
+        LIMIT $k
+    }
+    RETURN node.entity_id AS entity_id,
+           node.name AS name,
+           node.entity_type AS entity_type,
+           node.aliases AS aliases
+    """
+    rows = tx.run(
+        query,
+        queries=[
+            {"query_text": escape_lucene_query(name), "entity_type": entity_type}
+            for name, entity_type in keys
+        ],
+        type_strict=entity_type_strict_dedup(),
+        k=ENTITY_BM25_K,
+    )
+    return EntityIndex.from_rows(record.data() for record in rows)
+
+
+def resolve_entities(
+    payload_entities: List[List[ExtractedEntity]],
+    staged: StagedEntityIndex,
+    stats: WriteStats,
+) -> List[Dict[str, str]]:
+    # Resolves entities in order, with entities created or renamed earlier in the
+    # batch visible to later lookups, just as they would be inside one transaction.
+    resolved: List[Dict[str, str]] = []
+    for entities in payload_entities:
+        entity_ids: Dict[str, str] = {}
+        for entity in entities:
+            stats.legacy_queries += 1
+            best, best_iou = staged.best_match(entity.name, entity.entity_type)
+
+            if best and best_iou >= ENTITY_IOU_THRESHOLD:
+                if entity.name != best.name and entity.name not in best.aliases:
+                    staged.add_alias(best.entity_id, entity.name)
+                    stats.legacy_queries += 1
+                stats.entities_merged += 1
+                entity_ids[entity.name] = best.entity_id
+                continue
+
+            entity_id = str(uuid.uuid4())
+            staged.create(entity_id, entity.name, entity.entity_type)
+            stats.legacy_queries += 1
+            stats.entities_created += 1
+            entity_ids[entity.name] = entity_id
+        resolved.append(entity_ids)
+    return resolved
+
+
+def fetch_edge_candidates(tx, keys: List[EdgeKey]) -> Dict[EdgeKey, List[_EdgeState]]:
+    candidates: Dict[EdgeKey, List[_EdgeState]] = {key: [] for key in keys}
+    if not keys:
+        return candidates
+    query = """
+    UNWIND $keys AS k
+    MATCH (s:Entity {entity_id: k.source_entity_id})-[r:RELATED_TO]->(t:Entity {entity_id: k.target_entity_id})
+    WHERE ((r.start_date IS NULL AND k.start_date IS NULL) OR r.start_date = date(k.start_date))
+      AND ((r.end_date IS NULL AND k.end_date IS NULL) OR r.end_date = date(k.end_date))
+    RETURN k.idx AS idx,
+           r.relation_id AS rel_id,
+           r.relation_text AS relation_text,
+           r.relation_embedding AS embedding,
+           r.chunk_ids AS chunk_ids
+    """
+    rows = tx.run(
+        query,
+        keys=[
+            {
+                "idx": i,
+                "source_entity_id": src,
+                "target_entity_id": tgt,
+                "start_date": start,
+                "end_date": end,
+            }
+            for i, (src, tgt, start, end) in enumerate(keys)
+        ],
+    )
+    for row in rows:
+        key = keys[row["idx"]]
+        candidates[key].append(
+            _EdgeState(
+                relation_id=row["rel_id"],
+                source_entity_id=key[0],
+                target_entity_id=key[1],
+                start_date=key[2],
+                end_date=key[3],
+                relation_text=row["relation_text"] or "",
+                embedding=stored_vector(row["embedding"]) if row["embedding"] is not None else None,
+                chunk_ids=list(row["chunk_ids"] or []),
+            )
+        )
+    return candidates
+
+
+@dataclass
+class ChunkBatchPlan:
+    chunk_ids: List[str]
+    source_ids: List[Optional[str]]
+    resolved: List[Dict[str, str]]
+    mention_rows: List[Dict[str, str]]
+    edge_candidates: Dict[EdgeKey, List[_EdgeState]]
+    new_edges: List[_EdgeState]
+
+    @property
+    def merged_edges(self) -> List[_EdgeState]:
+        return [e for edges in self.edge_candidates.values() for e in edges if e.dirty and not e.is_new]
+
+
+def plan_chunk_batch(
+    payloads: List[ChunkPayload],
+    staged: StagedEntityIndex,
+    fetch_edges: Callable[[List[EdgeKey]], Dict[EdgeKey, List[_EdgeState]]],
+    stats: WriteStats,
+    source_id: Optional[str] = None,
+) -> ChunkBatchPlan:
+    # Entity resolution and relation dedup for a batch, without writing anything.
+    # fetch_edges returns the existing edges for keys whose entities both predate the batch.
+    chunk_ids = [p.chunk_id or str(uuid.uuid4()) for p in payloads]
+    source_ids = [p.source_id or source_id for p in payloads]
+    stats.legacy_queries += sum(2 if sid else 1 for sid in source_ids)
+
+    resolved = resolve_entities([p.entities for p in payloads], staged, stats)
+    created_ids = {e.entity_id for e in staged.created()}
+
+    mention_rows = []
+    for chunk_id, entity_ids in zip(chunk_ids, resolved):
+        stats.legacy_queries += len(entity_ids)
+        mention_rows.extend(
+            {"chunk_id": chunk_id, "entity_id": entity_id} for entity_id in set(entity_ids.values())
+        )
+
+    planned: List[Tuple[str, EdgeKey, ExtractedRelation, List[float]]] = []
+    for chunk_id, payload, entity_ids in zip(chunk_ids, payloads, resolved):
+        for rel, relation_embedding in zip(payload.relations, payload.relation_embeddings):
+            src_id = entity_ids.get(rel.source_entity)
+            tgt_id = entity_ids.get(rel.target_entity)
+            if not src_id or not tgt_id:
+                continue
+            tr = payload.timestamp_ranges.get(rel.timestamp_entity, TimestampRange(None, None))
+            planned.append((chunk_id, (src_id, tgt_id, tr.start_date, tr.end_date), rel, relation_embedding))
+
+    lookup_keys = []
+    seen_keys = set()
+    for _, key, _, _ in planned:
+        if key in seen_keys or key[0] in created_ids or key[1] in created_ids:
+            continue
+        seen_keys.add(key)
+        lookup_keys.append(key)
+    edge_candidates = fetch_edges(lookup_keys)
+
+    dedup = RelationDedup()
+    for key, edges in edge_candidates.items():
+        dedup.add_candidates(key, edges)
+    new_edges: List[_EdgeState] = []
+    for chunk_id, key, rel, relation_embedding in planned:
+        stats.legacy_queries += 2
+        best_edge, best_sim = dedup.match(key, relation_embedding)
+        if best_edge is not None:
+            logger.info(
+                "Merged relation edge rel_id=%s similarity=%.4f chunk_id=%s",
+                best_edge.relation_id,
+                best_sim,
+                chunk_id,
+            )
+            dedup.merge(best_edge, relation_embedding, chunk_id)
+            stats.relations_merged += 1
+            continue
+        edge = _EdgeState(
+            relation_id=str(uuid.uuid4()),
+            source_entity_id=key[0],
+            target_entity_id=key[1],
+            start_date=key[2],
+            end_date=key[3],
+            relation_text=rel.description,
+            embedding=stored_vector(relation_embedding),
+            chunk_ids=[chunk_id],
+            is_new=True,
+        )
+        edge_candidates.setdefault(key, []).append(edge)
+        dedup.add(key, edge)
+        new_edges.append(edge)
+        stats.relations_created += 1
+    # Merged edges get their mean embedding once, however many chunks hit them.
+    dedup.finish()
+
+    stats.chunks = len(payloads)
+    stats.entities = sum(len(entity_ids) for entity_ids in resolved)
+    stats.relations = sum(len(p.relations) for p in payloads)
+    return ChunkBatchPlan(chunk_ids, source_ids, resolved, mention_rows, edge_candidates, new_edges)
+
+
+def write_chunk_batch(
+    tx,
+    payloads: List[ChunkPayload],
+    source_id: Optional[str] = None,
+    entity_index: Optional[EntityIndex] = None,
+) -> Tuple[List[str], WriteStats, StagedEntityIndex]:
+    # With an entity_index, entity resolution needs no database call; the caller
+    # commits the returned staged index once the transaction has succeeded.
+    # Without one, candidates come from one batched fulltext query.
+    stats = WriteStats()
+    if entity_index is None:
+        entities = [e for p in payloads for e in p.entities]
+        entity_index = fetch_entity_candidates(tx, entities)
+        stats.queries += 1 if entities else 0
+    staged = entity_index.stage()
+    if not payloads:
+        return [], stats, staged
+
+    def fetch_edges(keys: List[EdgeKey]) -> Dict[EdgeKey, List[_EdgeState]]:
+        stats.queries += 1 if keys else 0
+        return fetch_edge_candidates(tx, keys)
+
+    plan = plan_chunk_batch(payloads, staged, fetch_edges, stats, source_id)
+    chunk_ids = plan.chunk_ids
+    source_ids = plan.source_ids
+    mention_rows = plan.mention_rows
+    new_edges = plan.new_edges
+
+    tx.run(
+        f"""
+        UNWIND $chunks AS row
+        CREATE (c:Chunk {{chunk_id: row.chunk_id, text: row.text, embedding_int8: row.embedding_int8}})
+        WITH c, row
+        {_set_vector("c", "embedding", "row.embedding")}
+        WITH c, row
+        OPTIONAL MATCH (s:Source {{source_id: row.source_id}})
+        FOREACH (_ IN CASE WHEN s IS NULL THEN [] ELSE [1] END | MERGE (c)-[:FROM_SOURCE]->(s))
+        """,
+        chunks=[
+            {
+                "chunk_id": chunk_id,
+                "text": payload.text,
+                "embedding": payload.embedding,
+                "embedding_int8": payload.embedding_int8,
+                "source_id": sid,
+            }
+            for chunk_id, payload, sid in zip(chunk_ids, payloads, source_ids)
+        ],
+    )
+    stats.queries += 1
+
+    new_entities = staged.created()
+    if new_entities:
+        tx.run(
+            """
+            UNWIND $rows AS row
+            CREATE (e:Entity {
+              entity_id: row.entity_id,
+              name: row.name,
+              entity_type: row.entity_type,
+              aliases: row.aliases
+            })
+            """,
+            rows=[
+                {
+                    "entity_id": s.entity_id,
+                    "name": s.name,
+                    "entity_type": s.entity_type,
+                    "aliases": s.aliases,
+                }
+                for s in new_entities
+            ],
+        )
+        stats.queries += 1
+
+    renamed = staged.renamed()
+    if renamed:
+        tx.run(
+            """
+            UNWIND $rows AS row
+            MATCH (e:Entity {entity_id: row.entity_id})
+            SET e.aliases = row.aliases
+            """,
+            rows=[{"entity_id": s.entity_id, "aliases": s.aliases} for s in renamed],
+        )
+        stats.queries += 1
+
+    if mention_rows:
+        tx.run(
+            """
+            UNWIND $rows AS row
+            MATCH (c:Chunk {chunk_id: row.chunk_id})
+            MATCH (e:Entity {entity_id: row.entity_id})
+            MERGE (c)-[:MENTIONS]->(e)
+            """,
+            rows=mention_rows,
+        )
+        stats.queries += 1
+
+    merged_edges = plan.merged_edges
+    if merged_edges:
+        tx.run(
+            f"""
+            UNWIND $rows AS row
+            MATCH (:Entity {{entity_id: row.source_entity_id}})-[r:RELATED_TO]->(:Entity {{entity_id: row.target_entity_id}})
+            WHERE r.relation_id = row.rel_id
+            SET r.chunk_ids = row.chunk_ids
+            WITH r, row
+            {_set_vector("r", "relation_embedding", "row.relation_embedding", relationship=True)}
+            """,
+            rows=[
+                {
+                    "rel_id": e.relation_id,
+                    "source_entity_id": e.source_entity_id,
+                    "target_entity_id": e.target_entity_id,
+                    "chunk_ids": e.chunk_ids,
+                    "relation_embedding": e.embedding,
+                }
+                for e in merged_edges
+            ],
+        )
+        stats.queries += 1
+
+    if new_edges:
+        tx.run(
+            f"""
+            UNWIND $rows AS row
+            MATCH (s:Entity {{entity_id: row.source_entity_id}})
+            MATCH (t:Entity {{entity_id: row.target_entity_id}})
+            CREATE (s)-[r:RELATED_TO {{
+                relation_id: row.relation_id,
+                relation_text: row.relation_text,
+                start_date: date(row.start_date),
+                end_date: date(row.end_date),
+                chunk_ids: row.chunk_ids
+            }}]->(t)
+            WITH r, row
+            {_set_vector("r", "relation_embedding", "row.relation_embedding", relationship=True)}
+            """,
+            rows=[
+                {
+                    "relation_id": e.relation_id,
+                    "source_entity_id": e.source_entity_id,
+                    "target_entity_id": e.target_entity_id,
+                    "relation_text": e.relation_text,
+                    "start_date": e.start_date,
+                    "end_date": e.end_date,
+                    "chunk_ids": e.chunk_ids,
+                    "relation_embedding": e.embedding,
+                }
+                for e in new_edges
+            ],
+        )
+        stats.queries += 1
+
+    return chunk_ids, stats, staged
@@ -1,125 +1,62 @@
 import asyncio
+import hashlib
 import json
 import logging
 import os
 import queue
 import random
-import re
 import threading
+import time
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-import calendar
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
 
 from neo4j import GraphDatabase
 
 from . import prompts
-from .llm_client import async_openai_client, openai_client
+from .llm_client import async_openai_client, embedding_openai_client
+from .chunk_dedup import ChunkDeduper, chunk_dedup_index
+from .chunking import chunk_settings, chunk_spans
+from .embedding_cache import embedding_cache, embedding_cache_stats
+from .embedding_stage import RelationEmbeddingPrefetcher, approx_tokens, iter_embedded_payloads
+from .embedding_storage import (
+    Vector,
+    embedding_int8_sidecar,
+    embedding_storage,
+    embedding_truncate,
+    quantize_int8,
+    source_embedding_dim,
+    stored_vectors,
+)
+from .entity_index import EntityIndex, load_entity_index
+from .extraction_stream import ExtractionStreamParser, pack_chunks, parse_extraction_output, split_packed_output
+from .extraction_cache import extraction_cache, extraction_key, prompt_hash, reuse_extractions
+from .gds_graph import bump_graph_version, ensure_entity_graph
+from .graph_writer import ChunkPayload, write_chunk_batch
+from .ingest_journal import DeadLetterFile, dead_letter_path, ingest_journal, resume_ingest
+from .llm_limiter import AdaptiveLimiter
 from .logging_utils import setup_logging
+from .models import ExtractedEntity, ExtractedRelation, TimestampRange
+from .ppr import ppr_engine
+from .query_cache import invalidate_query_cache
 from .settings import (
     EMBEDDING_DIM,
     EMBEDDING_MODEL,
     ENTITY_TYPES,
     LLM_MODEL,
-    RELATION_DEDUP_SIM_THRESHOLD,
 )
-from .text_utils import iou, tokens
+from .timestamps import parse_timestamp_range, parse_timestamp_ranges
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class ExtractedEntity:
-    name: str
-    entity_type: str
-
-
-@dataclass
-class ExtractedRelation:
-    timestamp_entity: str
-    source_entity: str
-    target_entity: str
-    description: str
-
-
-@dataclass
-class TimestampRange:
-    start_date: Optional[str]
-    end_date: Optional[str]
-
-
 DEFAULT_TIME_TYPES = ["date", "date_range", "quarter", "year"]
 DEFAULT_TIMESTAMP_FORMAT = "ISO-8601 or ISO-like (YYYY, YYYY-MM-DD, YYYY-Qn)"
 
 
-def _simple_sentence_split(text: str) -> List[str]:
-    # Split on common sentence endings simpler than NLTK
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    return [s.strip() for s in sentences if s.strip()]
-
-
-def _chunk_units(text: str) -> List[str]:
-    paragraphs = re.split(r"\n\s*--\s*\n|\n\s*\n", text)
-    units: List[str] = []
-    for idx, paragraph in enumerate(paragraphs):
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-        sentences = _simple_sentence_split(paragraph)
-        if not sentences:
-            sentences = [paragraph]
-        for s_idx, sentence in enumerate(sentences):
-            if not units:
-                prefix = ""
-            elif s_idx == 0:
-                prefix = "\n\n"
-            else:
-                prefix = " "
-            units.append(f"{prefix}{sentence}")
-    return units
-
-
 def chunk_text(text: str, max_chars: int = 1600, overlap: int = 200) -> List[str]:
-    if not text:
-        return []
-    text = text.strip()
-    units = _chunk_units(text)
-    if not units:
-        return []
-    chunks: List[str] = []
-    start_idx = 0
-    while start_idx < len(units):
-        curr: List[str] = []
-        curr_len = 0
-        idx = start_idx
-        while idx < len(units):
-            piece = units[idx]
-            if not curr:
-                piece = piece.lstrip()
-            if curr_len + len(piece) > max_chars and curr:
-                break
-            curr.append(piece)
-            curr_len += len(piece)
-            idx += 1
-        chunk = "".join(curr).strip()
-        if chunk:
-            chunks.append(chunk)
-        if idx >= len(units):
-            break
-        if overlap <= 0:
-            next_start_idx = idx
-        else:
-            back_chars = 0
-            back_idx = idx - 1
-            while back_idx >= start_idx and back_chars < overlap:
-                back_chars += len(units[back_idx])
-                back_idx -= 1
-            next_start_idx = max(0, back_idx + 1)
-        if next_start_idx <= start_idx:
-            next_start_idx = start_idx + 1
-        start_idx = next_start_idx
-    return [c for c in chunks if c]
+    return [span.text for span in chunk_spans(text, max_chars, overlap)]
 
 
 def _build_extraction_prompts() -> Tuple[str, str, Dict[str, str]]:
@@ -141,47 +78,213 @@ def _build_extraction_prompts() -> Tuple[str, str, Dict[str, str]]:
 
 async def _async_extract_entities_and_relations(
     text: str,
+    on_relation: Optional[Callable[[ExtractedRelation], None]] = None,
 ) -> Tuple[List[ExtractedEntity], List[ExtractedRelation]]:
     system_prompt, user_prompt_template, delimiters = _build_extraction_prompts()
-    client = async_openai_client()
     if not LLM_MODEL:
         raise RuntimeError("LLM_MODEL is not set.")
-    user_prompt = user_prompt_template.format(entity_types=", ".join(ENTITY_TYPES), input_text=text)
-    response = await client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=[
+    cache = extraction_cache()
+    prompts_hash = prompt_hash(system_prompt, user_prompt_template)
+    cache_key = extraction_key(LLM_MODEL, prompts_hash, text)
+    raw = cache.get(cache_key) if cache is not None and reuse_extractions() else None
+    if raw is None:
+        client = async_openai_client()
+        user_prompt = user_prompt_template.format(entity_types=", ".join(ENTITY_TYPES), input_text=text)
+        messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
-        ],
-        temperature=0,
-    )
-    raw = response.choices[0].message.content or ""
+        ]
+        if _llm_stream():
+            # Records are parsed as their delimiter arrives, so relation descriptions
+            # can be handed downstream before the completion finishes.
+            parser = ExtractionStreamParser(delimiters["tuple_delimiter"], delimiters["record_delimiter"])
+            stream = await client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0,
+                stream=True,
+            )
+            async for event in stream:
+                if not event.choices:
+                    continue
+                for record in parser.feed(event.choices[0].delta.content or ""):
+                    if on_relation is not None and isinstance(record, ExtractedRelation):
+                        on_relation(record)
+            for record in parser.close():
+                if on_relation is not None and isinstance(record, ExtractedRelation):
+                    on_relation(record)
+            if cache is not None:
+                cache.put(cache_key, LLM_MODEL, prompts_hash, parser.raw)
+            return parser.entities, parser.relations
+        response = await client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0,
+        )
+        raw = response.choices[0].message.content or ""
+        if cache is not None:
+            cache.put(cache_key, LLM_MODEL, prompts_hash, raw)
     return parse_extraction_output(raw, delimiters["tuple_delimiter"], delimiters["record_delimiter"])
 
 
-def iter_extractions_concurrent(
+async def _async_extract_packed(
     chunks: List[str],
+    on_relation: Optional[Callable[[ExtractedRelation], None]] = None,
+) -> List[Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]]:
+    # One completion for several chunks (INGEST_LLM_PACK_TOKENS). Returns one result per
+    # chunk, None where the packed output had no usable section for it. Sections are
+    # cached per chunk, keyed by the packed prompt so they are never taken for
+    # single-chunk completions.
+    system_prompt, _, delimiters = _build_extraction_prompts()
+    if not LLM_MODEL:
+        raise RuntimeError("LLM_MODEL is not set.")
+    cache = extraction_cache()
+    prompts_hash = prompt_hash(system_prompt, prompts.TEMPORAL_ENTITY_EXTRACTION_PACKED_PROMPT)
+    keys = [extraction_key(LLM_MODEL, prompts_hash, chunk) for chunk in chunks]
+    raws: List[Optional[str]] = [
+        cache.get(key) if cache is not None and reuse_extractions() else None for key in keys
+    ]
+    missing = [i for i, raw in enumerate(raws) if raw is None]
+    if missing:
+        user_prompt = prompts.TEMPORAL_ENTITY_EXTRACTION_PACKED_PROMPT.format(
+            entity_types=", ".join(ENTITY_TYPES),
+            chunk_count=len(missing),
+            input_chunks=pack_chunks([chunks[i] for i in missing]),
+        )
+        response = await async_openai_client().chat.completions.create(
+            model=LLM_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0,
+        )
+        sections = split_packed_output(response.choices[0].message.content or "", len(missing))
+        for position, i in enumerate(missing):
+            raws[i] = sections.get(position)
+    results: List[Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]] = []
+    for i, raw in enumerate(raws):
+        if raw is None:
+            results.append(None)
+            continue
+        entities, relations = parse_extraction_output(raw, delimiters["tuple_delimiter"], delimiters["record_delimiter"])
+        if raw and not entities and not relations:
+            # Text that yields no records is a garbled section, not an empty chunk.
+            results.append(None)
+            continue
+        if cache is not None and i in missing:
+            cache.put(keys[i], LLM_MODEL, prompts_hash, raw)
+        if on_relation is not None:
+            for relation in relations:
+                on_relation(relation)
+        results.append((entities, relations))
+    return results
+
+
+def iter_keyed_extractions(
+    items: Iterable[Tuple[Hashable, str]],
     max_workers: int,
     timeout_s: float,
     max_pending: int,
     max_retries: int,
     retry_base_s: float,
     retry_max_s: float,
-) -> Iterable[Tuple[int, List[ExtractedEntity], List[ExtractedRelation]]]:
-    if not chunks:
-        return []
-    max_workers = max(1, max_workers)
+    limiter: Optional[AdaptiveLimiter] = None,
+    replay: Optional[Callable[[Hashable], Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]]] = None,
+    on_error: Optional[Callable[[Hashable, Exception], None]] = None,
+    on_relation: Optional[Callable[[ExtractedRelation], None]] = None,
+) -> Iterator[Tuple[Hashable, List[ExtractedEntity], List[ExtractedRelation]]]:
+    # items is pulled lazily from a worker thread, so a caller can keep preparing
+    # (chunking, embedding) the next document while the LLM pool stays busy.
+    # Without a limiter, max_workers is a fixed concurrency cap. replay may return a
+    # previous extraction for a key to skip the LLM; with on_error, chunks that fail
+    # after all retries are handed to it and skipped instead of aborting the run.
+    # on_relation sees relations as they stream in (INGEST_LLM_STREAM), or per packed
+    # request once it completes.
+    if limiter is None:
+        limiter = AdaptiveLimiter(max(1, max_workers), min_limit=max(1, max_workers))
+    max_workers = limiter.max_limit
     max_pending = max(1, max_pending)
     max_retries = max(0, max_retries)
-    result_queue: "queue.Queue[Optional[Tuple[int, List[ExtractedEntity], List[ExtractedRelation], Optional[Exception]]]]" = queue.Queue()
+    result_queue: "queue.Queue[Optional[Tuple[Hashable, List[ExtractedEntity], List[ExtractedRelation], Optional[Exception]]]]" = queue.Queue()
+    # INGEST_LLM_PACK_TOKENS: queued chunks up to this many tokens share one request.
+    pack_tokens = _llm_pack_tokens()
+    pack_stats = {"requests": 0, "chunks": 0, "fallbacks": 0}
 
     def _emit_error(exc: Exception) -> None:
         result_queue.put((-1, [], [], exc))
 
     def producer() -> None:
         async def run_all() -> None:
-            sem = asyncio.Semaphore(max_workers)
-            work_queue: "asyncio.Queue[Optional[Tuple[int, str]]]" = asyncio.Queue(maxsize=max_pending)
+            work_queue: "asyncio.Queue[Optional[Tuple[Hashable, str]]]" = asyncio.Queue(maxsize=max_pending)
+
+            async def call_llm(make_call, timeout: float, weight: int = 1):
+                # Retries make_call under the limiter; returns (result, None) or
+                # (None, last error) once max_retries is exhausted.
+                attempt = 0
+                while True:
+                    try:
+                        async with limiter:
+                            started = time.monotonic()
+                            result = await asyncio.wait_for(make_call(), timeout=timeout)
+                            # Packed calls report per-chunk latency so they do not read as spikes.
+                            limiter.record_success((time.monotonic() - started) / weight)
+                        return result, None
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as exc:
+                        retry_after = limiter.record_failure(exc)
+                        attempt += 1
+                        # logger.warning(
+                        #     "Error extracting entities and relations (attempt %s/%s): %s",
+                        #     attempt,
+                        #     max_retries + 1,
+                        #     exc,
+                        # )
+                        if attempt > max_retries:
+                            return None, exc
+                        backoff = min(retry_max_s, retry_base_s * (2 ** (attempt - 1)))
+                        jitter = backoff * random.uniform(0.5, 1.5)
+                        await asyncio.sleep(max(jitter, retry_after or 0.0))
+
+            async def extract_one(key: Hashable, chunk: str) -> None:
+                result, exc = await call_llm(
+                    lambda: _async_extract_entities_and_relations(chunk, on_relation), timeout_s
+                )
+                if exc is not None:
+                    logger.warning(
+                        "Error extracting entities and relations skipping this chunk (attempt %s): %s",
+                        max_retries + 1,
+                        exc,
+                    )
+                    result_queue.put((key, [], [], exc))
+                    return
+                result_queue.put((key, result[0], result[1], None))
+
+            async def extract_packed(batch: List[Tuple[Hashable, str]]) -> None:
+                chunks = [chunk for _, chunk in batch]
+                results, exc = await call_llm(
+                    lambda: _async_extract_packed(chunks, on_relation), timeout_s * len(batch), len(batch)
+                )
+                if exc is not None:
+                    logger.warning("Packed extraction of %s chunks failed, extracting them one by one: %s", len(batch), exc)
+                    results = [None] * len(batch)
+                pack_stats["requests"] += 1
+                pack_stats["chunks"] += len(batch)
+                for (key, chunk), result in zip(batch, results):
+                    if result is None:
+                        pack_stats["fallbacks"] += 1
+                        await extract_one(key, chunk)
+                    else:
+                        result_queue.put((key, result[0], result[1], None))
+
+            def emit_replayed(item: Tuple[Hashable, str]) -> bool:
+                # Emits a replayed extraction for item; False if it needs the LLM.
+                replayed = replay(item[0]) if replay is not None else None
+                if replayed is None:
+                    return False
+                result_queue.put((item[0], replayed[0], replayed[1], None))
+                return True
 
             async def worker() -> None:
                 while True:
@@ -189,298 +292,152 @@ def iter_extractions_concurrent(
                     if item is None:
                         work_queue.task_done()
                         break
-                    idx, chunk = item
-                    attempt = 0
-                    while True:
-                        try:
-                            async with sem:
-                                entities, relations = await asyncio.wait_for(
-                                    _async_extract_entities_and_relations(chunk),
-                                    timeout=timeout_s,
-                                )
-                            result_queue.put((idx, entities, relations, None))
+                    if emit_replayed(item):
+                        work_queue.task_done()
+                        continue
+                    batch = [item]
+                    # Packing only takes what is already queued, so a slow feeder never
+                    # delays a request waiting for a pack to fill.
+                    budget = pack_tokens - approx_tokens(item[1])
+                    while budget > 0 and not work_queue.empty():
+                        queued = work_queue.get_nowait()
+                        if queued is not None and emit_replayed(queued):
+                            work_queue.task_done()
+                            continue
+                        if queued is None or approx_tokens(queued[1]) > budget:
+                            # The slot was just freed, so this cannot raise QueueFull.
+                            work_queue.put_nowait(queued)
+                            work_queue.task_done()
                             break
-                        except asyncio.CancelledError:
-                            raise
-                        except Exception as exc:
-                            attempt += 1
-                            # logger.warning(
-                            #     "Error extracting entities and relations (attempt %s/%s): %s",
-                            #     attempt,
-                            #     max_retries + 1,
-                            #     exc,
-                            # )
-                            if attempt > max_retries:
-                                logger.warning(
-                                "Error extracting entities and relations skipping this chunk (attempt %s): %s",
-                                attempt,
-                                exc,
-                            )
-                                result_queue.put((idx, [], [], exc))
-                                break
-                            backoff = min(retry_max_s, retry_base_s * (2 ** (attempt - 1)))
-                            jitter = backoff * random.uniform(0.5, 1.5)
-                            await asyncio.sleep(jitter)
-                    work_queue.task_done()
+                        batch.append(queued)
+                        budget -= approx_tokens(queued[1])
+                    if len(batch) == 1:
+                        await extract_one(*item)
+                    else:
+                        await extract_packed(batch)
+                    for _ in batch:
+                        work_queue.task_done()
 
             workers = [asyncio.create_task(worker()) for _ in range(max_workers)]
 
-            for idx, chunk in enumerate(chunks):
-                await work_queue.put((idx, chunk))
+            item_iter = iter(items)
+            while True:
+                item = await asyncio.to_thread(next, item_iter, None)
+                if item is None:
+                    break
+                await work_queue.put(item)
 
             await work_queue.join()
             for _ in workers:
                 await work_queue.put(None)
             await asyncio.gather(*workers)
+            if pack_stats["requests"]:
+                logger.info(
+                    "packed extraction: %s requests for %s chunks, %s chunks fell back to single requests",
+                    pack_stats["requests"],
+                    pack_stats["chunks"],
+                    pack_stats["fallbacks"],
+                )
 
         try:
             asyncio.run(run_all())
         except Exception as exc:
             _emit_error(exc)
+        finally:
+            result_queue.put(None)
 
     producer_thread = threading.Thread(target=producer, daemon=True)
     producer_thread.start()
 
-    yielded = 0
-    total = len(chunks)
-    while yielded < total:
+    while True:
         item = result_queue.get()
         if item is None:
+            break
+        key, entities, relations, err = item
+        if err is not None and on_error is not None and key != -1:
+            on_error(key, err)
             continue
-        idx, entities, relations, err = item
         if err is not None:
             raise RuntimeError(
-                f"LLM extraction failed for chunk {idx + 1}: {err}"
+                f"LLM extraction failed for chunk {key}: {err}"
             ) from err
-        yielded += 1
-        yield idx, entities, relations
+        yield key, entities, relations
 
 
-def parse_extraction_output(
-    raw: str, tuple_delimiter: str, record_delimiter: str
-) -> Tuple[List[ExtractedEntity], List[ExtractedRelation]]:
-    entities: List[ExtractedEntity] = []
-    relations: List[ExtractedRelation] = []
-    for record in raw.split(record_delimiter):
-        record = record.strip().strip(",")
-        if not record:
-            continue
-        record = record.strip("() ")
-        parts = [p.strip().strip('"') for p in record.split(tuple_delimiter)]
-        if not parts:
-            continue
-        if parts[0] == "entity":
-            if len(parts) >= 3:
-                entities.append(ExtractedEntity(parts[1], parts[2]))
-        elif parts[0] in {"relationship", "event"}:
-            if len(parts) >= 5:
-                relations.append(ExtractedRelation(parts[1], parts[2], parts[3], parts[4]))
-    return entities, relations
-
-
-def parse_timestamp_range(name: str) -> TimestampRange:
-    name = name.strip()
-    month_map = {
-        "january": 1,
-        "jan": 1,
-        "february": 2,
-        "feb": 2,
-        "march": 3,
-        "mar": 3,
-        "april": 4,
-        "apr": 4,
-        "may": 5,
-        "june": 6,
-        "jun": 6,
-        "july": 7,
-        "jul": 7,
-        "august": 8,
-        "aug": 8,
-        "september": 9,
-        "sep": 9,
-        "sept": 9,
-        "october": 10,
-        "oct": 10,
-        "november": 11,
-        "nov": 11,
-        "december": 12,
-        "dec": 12,
-    }
+_ENTITY_INDEX: Optional[EntityIndex] = None
 
-    def _month_num(month: str) -> Optional[int]:
-        if not month:
-            return None
-        return month_map.get(month.strip().lower())
-
-    if re.match(r"^\d{4}-\d{2}-\d{2}$", name):
-        return TimestampRange(name, name)
-    if re.match(r"^\d{4}$", name):
-        return TimestampRange(f"{name}-01-01", f"{name}-12-31")
-    m_range = re.match(
-        r"^(?P<m1>[A-Za-z]+)\s*(?:-\s*|to\s+)(?P<m2>[A-Za-z]+)\s*(?P<y>\d{4})$",
-        name,
-        re.IGNORECASE,
-    )
-    if m_range:
-        m1 = _month_num(m_range.group("m1"))
-        m2 = _month_num(m_range.group("m2"))
-        y = int(m_range.group("y"))
-        if m1 and m2:
-            end_day = calendar.monthrange(y, m2)[1]
-            return TimestampRange(f"{y}-{m1:02d}-01", f"{y}-{m2:02d}-{end_day:02d}")
-    m_range = re.match(
-        r"^(?P<m1>[A-Za-z]+)\s+(?P<y1>\d{4})\s*(?:-\s*|to\s+)(?P<m2>[A-Za-z]+)\s+(?P<y2>\d{4})$",
-        name,
-        re.IGNORECASE,
+
+def cached_extraction(chunk: str) -> Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]:
+    # The extraction cache's completion for chunk, from the single-chunk prompt or,
+    # with packing on, from a packed request; None if the chunk was never extracted.
+    cache = extraction_cache()
+    if cache is None or not LLM_MODEL:
+        return None
+    system_prompt, user_prompt_template, delimiters = _build_extraction_prompts()
+    templates = [user_prompt_template]
+    if _llm_pack_tokens() > 0:
+        templates.append(prompts.TEMPORAL_ENTITY_EXTRACTION_PACKED_PROMPT)
+    for template in templates:
+        raw = cache.get(extraction_key(LLM_MODEL, prompt_hash(system_prompt, template), chunk))
+        if raw is not None:
+            return parse_extraction_output(raw, delimiters["tuple_delimiter"], delimiters["record_delimiter"])
+    return None
+
+
+def chunk_deduper() -> Optional[ChunkDeduper]:
+    index = chunk_dedup_index()
+    if index is None:
+        return None
+    system_prompt, user_prompt_template, _ = _build_extraction_prompts()
+    return ChunkDeduper(
+        index,
+        cached_extraction,
+        approx_tokens(system_prompt) + approx_tokens(user_prompt_template),
     )
-    if m_range:
-        m1 = _month_num(m_range.group("m1"))
-        m2 = _month_num(m_range.group("m2"))
-        y1 = int(m_range.group("y1"))
-        y2 = int(m_range.group("y2"))
-        if m1 and m2:
-            end_day = calendar.monthrange(y2, m2)[1]
-            return TimestampRange(f"{y1}-{m1:02d}-01", f"{y2}-{m2:02d}-{end_day:02d}")
-    q_match = re.match(r"^(?:Q([1-4])\s*(\d{4})|(\d{4})-Q([1-4]))$", name)
-    if q_match:
-        q = int(q_match.group(1) or q_match.group(4))
-        y = int(q_match.group(2) or q_match.group(3))
-        start_month = 3 * (q - 1) + 1
-        end_month = start_month + 2
-        end_day = calendar.monthrange(y, end_month)[1]
-        return TimestampRange(
-            f"{y}-{start_month:02d}-01",
-            f"{y}-{end_month:02d}-{end_day:02d}",
-        )
-    return TimestampRange(None, None)
 
 
-def _neo4j_driver():
-    uri = os.getenv("NEO4J_URI", "bolt://localhost:7688")
-    user = os.getenv("TKG_NEO4J_USER", "neo4j")
-    password = os.getenv("TKG_NEO4J_PASSWORD", "passworty")
-    return GraphDatabase.driver(uri, auth=(user, password))
+def _entity_resolver() -> str:
+    # "index" resolves entities against the in-process EntityIndex, "fulltext" against
+    # the entity_name_aliases index (use it when several processes ingest at once).
+    return os.getenv("ENTITY_RESOLVER", "index").strip().lower()
 
-def _is_time_entity(entity_type: str) -> bool:
-    return entity_type == "timestamp" or entity_type in DEFAULT_TIME_TYPES
 
+def _llm_stream() -> bool:
+    return os.getenv("INGEST_LLM_STREAM", "false").strip().lower() in {"1", "true", "yes"}
 
-def _escape_lucene_query(text: str) -> str:
-    # Escape Lucene special chars to avoid query parser errors.
-    return re.sub(r'([+\-!(){}[\]^"~*?:\\/]|&&|\|\|)', r"\\\1", text)
 
+def _llm_pack_tokens() -> int:
+    # Token budget of chunk text per packed extraction request; 0 sends one chunk per request.
+    return int(os.getenv("INGEST_LLM_PACK_TOKENS", "0"))
 
-def _entity_type_strict_dedup() -> bool:
-    return os.getenv("ENTITY_DEDUP_TYPE_STRICT", "true").strip().lower() in {
-        "1",
-        "true",
-        "yes",
-    }
 
+def _graph_version_interval_s() -> float:
+    # How often a running ingest bumps the graph version, which clears query caches
+    # and lets retrieval rebuild the query matcher and GDS projection. Bumps are
+    # coalesced to this interval and a final one at the end of the run.
+    return float(os.getenv("INGEST_GRAPH_VERSION_INTERVAL_S", "60"))
 
-def search_entity_by_bm25_and_iou(tx, entity) -> Tuple[Optional[dict], float]:
-    K = 10
-    query = """
-    CALL db.index.fulltext.queryNodes('entity_name_aliases', $query_text)
-    YIELD node, score
-    WHERE ($type_strict = false OR node.entity_type = $entity_type)
-    RETURN node, score
-    ORDER BY score DESC
-    LIMIT $k
-    """
-    rows = list(tx.run(
-        query,
-        query_text=_escape_lucene_query(entity.name),
-        entity_type=entity.entity_type,
-        type_strict=_entity_type_strict_dedup(),
-        k=K,
-    ))
-
-    incoming_toks = tokens(entity.name)
-
-    best = None
-    best_iou = 0.0
-
-    for r in rows:
-        node = r["node"]
-
-        aliases = node.get("aliases") or []
-        iou_alias = 0.0
-        for a in aliases:
-            alias_toks = tokens(a)
-            if len(aliases) > 1 and len(alias_toks) ==1:
-                continue  # skip single-token aliases if multiple aliases exist.
-                # EOG Resources Inc -> EOG Resources -> EOG shouldnt further match -> EOG Burgers or so
-            iou_alias = max(iou_alias, iou(incoming_toks, alias_toks))
-
-
-        if iou_alias > best_iou:
-            best_iou = iou_alias
-            best = node
-
-    return best, best_iou
-
-def upsert_entity(tx, entity) -> str:
-    best, best_iou = search_entity_by_bm25_and_iou(tx, entity)
-
-    IOU_THRESHOLD = 0.5  # tune: 0.5–0.8 typical for entity names
-
-    if best and best_iou >= IOU_THRESHOLD:
-        entity_id = best["entity_id"]
-        aliases = set(best.get("aliases") or [])
-
-        # update aliases
-        if entity.name != best.get("name") and entity.name not in aliases:
-            aliases.add(entity.name)
-            tx.run(
-                "MATCH (e:Entity {entity_id: $id}) SET e.aliases = $aliases",
-                id=entity_id,
-                aliases=sorted(aliases),
-            )
 
-        #print(f"Merged by IoU={best_iou:.2f}: '{entity.name}' -> '{best.get('name')}'")
-        return entity_id
+def _llm_adaptive() -> bool:
+    return os.getenv("INGEST_LLM_ADAPTIVE", "true").strip().lower() in {"1", "true", "yes"}
 
-    # 3) create new if no good lexical overlap
-    entity_id = str(uuid.uuid4())
-    tx.run(
-        """
-        CREATE (e:Entity {
-          entity_id: $entity_id,
-          name: $name,
-          entity_type: $entity_type,
-          aliases: $aliases
-        })
-        """,
-        entity_id=entity_id,
-        name=entity.name,
-        entity_type=entity.entity_type,
-        aliases=[entity.name],
-    )
-    return entity_id
 
+def shared_entity_index(session) -> EntityIndex:
+    global _ENTITY_INDEX
+    if _ENTITY_INDEX is None:
+        _ENTITY_INDEX = session.execute_read(load_entity_index)
+    return _ENTITY_INDEX
 
-def create_chunk(tx, text: str, embedding: List[float], source_id: Optional[str]) -> str:
-    chunk_id = str(uuid.uuid4())
-    tx.run(
-        """
-        CREATE (c:Chunk {chunk_id: $chunk_id, text: $text, embedding: $embedding})
-        """,
-        chunk_id=chunk_id,
-        text=text,
-        embedding=embedding,
-    )
-    if source_id:
-        tx.run(
-            """
-            MATCH (s:Source {source_id: $source_id})
-            MATCH (c:Chunk {chunk_id: $chunk_id})
-            MERGE (c)-[:FROM_SOURCE]->(s)
-            """,
-            source_id=source_id,
-            chunk_id=chunk_id,
-        )
-    return chunk_id
+
+def _neo4j_driver(**config):
+    # config is passed to the driver (pool size, timeouts, ...).
+    uri = os.getenv("NEO4J_URI", "bolt://localhost:7688")
+    user = os.getenv("TKG_NEO4J_USER", "neo4j")
+    password = os.getenv("TKG_NEO4J_PASSWORD", "passworty")
+    return GraphDatabase.driver(uri, auth=(user, password), **config)
+
+def _is_time_entity(entity_type: str) -> bool:
+    return entity_type == "timestamp" or entity_type in DEFAULT_TIME_TYPES
 
 
 def create_source(tx, source_id: str, uri: Optional[str] = None, last_modified: Optional[str] = None) -> None:
@@ -510,132 +467,116 @@ def create_source(tx, source_id: str, uri: Optional[str] = None, last_modified:
     )
 
 
-def link_chunk_mentions(tx, chunk_id: str, entity_ids: Iterable[str]) -> None:
-    for entity_id in entity_ids:
-        tx.run(
-            """
-            MATCH (c:Chunk {chunk_id: $chunk_id})
-            MATCH (e:Entity {entity_id: $entity_id})
-            MERGE (c)-[:MENTIONS]->(e)
-            """,
-            chunk_id=chunk_id,
-            entity_id=entity_id,
-        )
+def source_id_for_uri(uri: Optional[str]) -> str:
+    # Stable ids let a re-ingested document find its Source again.
+    if uri:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, uri))
+    return str(uuid.uuid4())
+
+
+def chunk_id_for(source_id: str, text: str) -> str:
+    return hashlib.sha256(f"{source_id}\0{text}".encode("utf-8")).hexdigest()[:32]
+
 
+def source_fingerprint(chunk_ids: List[str]) -> str:
+    return hashlib.sha256("\0".join(chunk_ids).encode("utf-8")).hexdigest()
 
-def create_relationship(
-    tx,
-    source_entity_id: str,
-    target_entity_id: str,
-    relation_text: str,
-    relation_embedding: List[float],
-    chunk_id: str,
-    start_date: Optional[str],
-    end_date: Optional[str],
-) -> None:
-    existing = tx.run(
+
+def fetch_source_state(tx, source_id: str) -> Tuple[Optional[str], List[str]]:
+    record = tx.run(
         """
-        MATCH (s:Entity {entity_id: $source_entity_id})
-        MATCH (t:Entity {entity_id: $target_entity_id})
-        MATCH (s)-[r:RELATED_TO]->(t)
-        WHERE ((r.start_date IS NULL AND $start_date IS NULL) OR r.start_date = date($start_date))
-          AND ((r.end_date IS NULL AND $end_date IS NULL) OR r.end_date = date($end_date))
-        RETURN r.relation_id AS rel_id,
-               gds.similarity.cosine(r.relation_embedding, $relation_embedding) AS similarity
+        OPTIONAL MATCH (s:Source {source_id: $source_id})
+        OPTIONAL MATCH (c:Chunk)-[:FROM_SOURCE]->(s)
+        RETURN s.content_hash AS content_hash, collect(c.chunk_id) AS chunk_ids
         """,
-        source_entity_id=source_entity_id,
-        target_entity_id=target_entity_id,
-        start_date=start_date,
-        end_date=end_date,
-        relation_embedding=relation_embedding,
+        source_id=source_id,
+    ).single()
+    if record is None:
+        return None, []
+    return record["content_hash"], list(record["chunk_ids"] or [])
+
+
+def mark_source_ingested(tx, source_id: str, content_hash: str) -> None:
+    tx.run(
+        "MATCH (s:Source {source_id: $source_id}) SET s.content_hash = $content_hash",
+        source_id=source_id,
+        content_hash=content_hash,
     )
-    best_rel_id = None
-    best_sim = -1.0
-    for row in existing:
-        sim = row.get("similarity")
-        if sim is None:
-            continue
-        if sim > best_sim:
-            best_sim = sim
-            best_rel_id = row.get("rel_id")
-
-    if best_rel_id is not None and best_sim >= RELATION_DEDUP_SIM_THRESHOLD:
-        logger.info(
-            "Merged relation edge rel_id=%s similarity=%.4f chunk_id=%s",
-            best_rel_id,
-            best_sim,
-            chunk_id,
-        )
-        tx.run(
-            """
-            MATCH ()-[r:RELATED_TO]->()
-            WHERE r.relation_id = $rel_id
-            WITH r, $relation_embedding AS new_emb, $chunk_id AS cid, coalesce(r.chunk_ids, []) AS existing
-            WITH r, new_emb, cid, existing,
-                 CASE WHEN cid IN existing THEN existing ELSE existing + [cid] END AS updated,
-                 CASE WHEN cid IN existing THEN 0 ELSE 1 END AS added
-            SET r.chunk_ids = updated
-            WITH r, new_emb, added, size(existing) AS n
-            WHERE added = 1
-            SET r.relation_embedding = CASE
-                WHEN r.relation_embedding IS NULL THEN new_emb
-                ELSE [i IN range(0, size(new_emb) - 1) |
-                    (r.relation_embedding[i] * n + new_emb[i]) / (n + 1)
-                ]
-            END
-            """,
-            rel_id=best_rel_id,
-            chunk_id=chunk_id,
-            relation_embedding=relation_embedding,
-        )
-        return
 
-    relation_id = str(uuid.uuid4())
+
+def retract_chunks(tx, chunk_ids: List[str]) -> Dict[str, object]:
+    # Edges extracted from a chunk always join entities that chunk MENTIONS, so the
+    # evidence lists to clean up are reachable without scanning every RELATED_TO.
+    mentioned = tx.run(
+        """
+        UNWIND $chunk_ids AS cid
+        MATCH (:Chunk {chunk_id: cid})-[:MENTIONS]->(e:Entity)
+        RETURN collect(DISTINCT e.entity_id) AS entity_ids
+        """,
+        chunk_ids=chunk_ids,
+    ).single()
+    edges = tx.run(
+        """
+        UNWIND $chunk_ids AS cid
+        MATCH (:Chunk {chunk_id: cid})-[:MENTIONS]->(:Entity)-[r:RELATED_TO]->()
+        WHERE cid IN r.chunk_ids
+        WITH r, collect(DISTINCT cid) AS removed
+        SET r.chunk_ids = [x IN r.chunk_ids WHERE NOT x IN removed]
+        WITH r, size(r.chunk_ids) = 0 AS empty
+        FOREACH (_ IN CASE WHEN empty THEN [1] ELSE [] END | DELETE r)
+        RETURN count(*) AS edges_touched, sum(CASE WHEN empty THEN 1 ELSE 0 END) AS edges_deleted
+        """,
+        chunk_ids=chunk_ids,
+    ).single()
     tx.run(
         """
-        MATCH (s:Entity {entity_id: $source_entity_id})
-        MATCH (t:Entity {entity_id: $target_entity_id})
-        CREATE (s)-[r:RELATED_TO {
-            relation_id: $relation_id,
-            relation_text: $relation_text,
-            start_date: date($start_date),
-            end_date: date($end_date),
-            chunk_ids: [$chunk_id],
-            relation_embedding: $relation_embedding
-        }]->(t)
+        UNWIND $chunk_ids AS cid
+        MATCH (c:Chunk {chunk_id: cid})
+        DETACH DELETE c
         """,
-        source_entity_id=source_entity_id,
-        target_entity_id=target_entity_id,
-        relation_id=relation_id,
-        relation_text=relation_text,
-        relation_embedding=relation_embedding,
-        chunk_id=chunk_id,
-        start_date=start_date,
-        end_date=end_date,
+        chunk_ids=chunk_ids,
     )
+    deleted = tx.run(
+        """
+        UNWIND $entity_ids AS eid
+        MATCH (e:Entity {entity_id: eid})
+        WHERE NOT (e)<-[:MENTIONS]-()
+        DETACH DELETE e
+        RETURN collect(eid) AS entity_ids
+        """,
+        entity_ids=list(mentioned["entity_ids"] or []) if mentioned else [],
+    ).single()
+    return {
+        "chunks": len(chunk_ids),
+        "edges_touched": edges["edges_touched"] if edges else 0,
+        "edges_deleted": (edges["edges_deleted"] or 0) if edges else 0,
+        "entity_ids_deleted": list(deleted["entity_ids"] or []) if deleted else [],
+    }
 
 
-def try_embed_texts(texts: List[str], model: Optional[str] = None, expected_dim: Optional[int] = None, max_retries: int = 3) -> Optional[List[List[float]]]:
+def try_embed_texts(
+    texts: List[str],
+    model: Optional[str] = None,
+    expected_dim: Optional[int] = None,
+    max_retries: int = 3,
+    source: bool = False,
+) -> Optional[List[Vector]]:
+    embed_fn = embed_source_texts if source else embed_texts
     for attempt in range(max_retries):
         try:
-            return embed_texts(texts, model=model, expected_dim=expected_dim)
+            return embed_fn(texts, model=model, expected_dim=expected_dim)
             time.sleep(2**attempt)  # exponential backoff
         except:
             continue
     return None
 
 
-def embed_texts(
-    texts: List[str], model: Optional[str] = None, expected_dim: Optional[int] = None
-) -> List[List[float]]:
-    api_key_env = "EMBEDDING_API_KEY" if os.getenv("EMBEDDING_API_KEY") else "MODEL_API_KEY"
-    base_url_env = "EMBEDDING_BASE_URL" if os.getenv("EMBEDDING_BASE_URL") else "MODEL_BASE_URL"
-    client = openai_client(api_key_env=api_key_env, base_url_env=base_url_env)
-    model = model or EMBEDDING_MODEL
-    expected_dim = expected_dim or EMBEDDING_DIM
-    if not model:
-        raise RuntimeError("EMBEDDING_MODEL is not set.")
-    response = client.embeddings.create(model=model, input=texts)
+def _embed_uncached(texts: List[str], model: str, expected_dim: int, client=None) -> List[List[float]]:
+    client = client or embedding_openai_client()
+    if embedding_truncate() == "api":
+        response = client.embeddings.create(model=model, input=texts, dimensions=expected_dim)
+    else:
+        response = client.embeddings.create(model=model, input=texts)
     vectors = [item.embedding for item in response.data]
     for vec in vectors:
         if len(vec) != expected_dim:
@@ -645,111 +586,456 @@ def embed_texts(
     return vectors
 
 
-def ingest_text(
-    text: str,
-    source_id: Optional[str] = None,
-    source_uri: Optional[str] = None,
-    source_last_modified: Optional[str] = None,
-) -> Dict[str, int]:
-    chunks = chunk_text(text)
-    logger.info("got chunks: %s", len(chunks or []))
+def embed_source_texts(
+    texts: List[str], model: Optional[str] = None, expected_dim: Optional[int] = None, client=None
+) -> List[Vector]:
+    # Vectors as the provider returns them; longer than expected_dim with EMBEDDING_TRUNCATE=local.
+    model = model or EMBEDDING_MODEL
+    dim = source_embedding_dim(expected_dim or EMBEDDING_DIM)
+    if not model:
+        raise RuntimeError("EMBEDDING_MODEL is not set.")
+    cache = embedding_cache(model, dim)
+    if cache is None:
+        return stored_vectors(_embed_uncached(texts, model, dim, client))
+    vectors = cache.get_many(texts, as_arrays=embedding_storage() == "float32")
+    # Only texts missing from the cache go to the provider, each distinct text once.
+    missing = list(dict.fromkeys(text for text, vec in zip(texts, vectors) if vec is None))
+    if missing:
+        fresh = stored_vectors(_embed_uncached(missing, model, dim, client))
+        cache.put_many(missing, fresh)
+        by_text = dict(zip(missing, fresh))
+        vectors = [vec if vec is not None else by_text[text] for text, vec in zip(texts, vectors)]
+    return vectors
 
-    if not chunks:
-        return {"chunks": 0, "entities": 0, "relations": 0}
-    max_embedding_retries = 3
-    embeddings = try_embed_texts(chunks, max_retries=max_embedding_retries)
 
-    if embeddings is None:
-        logger.warning("Failed to embed texts after %s attempts.", max_embedding_retries)
-        return {"chunks": 0, "entities": 0, "relations": 0}
-    
+def embed_texts(
+    texts: List[str], model: Optional[str] = None, expected_dim: Optional[int] = None, client=None
+) -> List[Vector]:
+    dim = expected_dim or EMBEDDING_DIM
+    vectors = embed_source_texts(texts, model=model, expected_dim=dim, client=client)
+    if vectors and len(vectors[0]) > dim:
+        return stored_vectors(vectors, dim)
+    return vectors
+
+
+def embed_chunks(texts: List[str], max_retries: int = 3) -> Optional[Tuple[List[Vector], List[Optional[bytes]]]]:
+    # Chunk embeddings plus, with EMBEDDING_INT8_SIDECAR, int8 codes of the
+    # untruncated vectors for rescoring.
+    if not embedding_int8_sidecar():
+        vectors = try_embed_texts(texts, max_retries=max_retries)
+        return None if vectors is None else (vectors, [None] * len(vectors))
+    full = try_embed_texts(texts, max_retries=max_retries, source=True)
+    if full is None:
+        return None
+    codes = [quantize_int8(v) for v in full]
+    if full and len(full[0]) > EMBEDDING_DIM:
+        return stored_vectors(full, EMBEDDING_DIM), codes
+    return full, codes
+
+
+@dataclass
+class CorpusDocument:
+    text: str
+    source_id: Optional[str] = None
+    source_uri: Optional[str] = None
+    source_last_modified: Optional[object] = None
+
+
+def document_chunks(document: CorpusDocument, chunk_options: Dict[str, object]) -> Tuple[str, List[str], List[str]]:
+    # (source_id, chunks, chunk_ids) with repeated chunks of the document dropped.
+    source_id = document.source_id or source_id_for_uri(document.source_uri)
+    chunks: List[str] = []
+    chunk_ids: List[str] = []
+    seen_chunk_ids = set()
+    for span in chunk_spans(document.text, **chunk_options):
+        chunk = span.text
+        chunk_id = chunk_id_for(source_id, chunk)
+        if chunk_id not in seen_chunk_ids:
+            seen_chunk_ids.add(chunk_id)
+            chunks.append(chunk)
+            chunk_ids.append(chunk_id)
+    return source_id, chunks, chunk_ids
+
+
+def _empty_totals() -> Dict[str, int]:
+    return {"chunks": 0, "entities": 0, "relations": 0, "round_trips_saved": 0}
+
+
+@dataclass
+class _DocumentState:
+    document: CorpusDocument
+    source_id: str
+    chunks: List[str]
+    embeddings: List[Vector]
+    started_at: float
+    chunk_ids: List[str] = field(default_factory=list)
+    embedding_codes: List[Optional[bytes]] = field(default_factory=list)
+    # Per chunk ChunkDeduper decision (exact repeat, boilerplate or None).
+    dedup: List[Optional[str]] = field(default_factory=list)
+    orphan_chunk_ids: List[str] = field(default_factory=list)
+    fingerprint: Optional[str] = None
+    written: int = 0
+    failed: int = 0
+    reported: bool = False
+    totals: Dict[str, int] = field(default_factory=_empty_totals)
+
+
+def llm_extraction_options() -> Dict[str, object]:
+    # Keyword arguments for iter_keyed_extractions, read from INGEST_LLM_*.
     #openais client also supports max retries and timeout but probly doesnt support backoff and fails at dns sometimes -> own logic
     llm_concurrency = int(os.getenv("INGEST_LLM_CONCURRENCY", "8"))
     llm_timeout_s = float(os.getenv("INGEST_LLM_TIMEOUT_S", "180"))
     llm_max_pending = int(os.getenv("INGEST_LLM_MAX_PENDING", "32"))
     llm_max_retries = int(os.getenv("INGEST_LLM_MAX_RETRIES", "2"))
-    llm_retry_base_s = float(os.getenv("INGEST_LLM_RETRY_BASE_S", "0.5"))
-    llm_retry_max_s = float(os.getenv("INGEST_LLM_RETRY_MAX_S", "10"))
+    # INGEST_LLM_CONCURRENCY is the starting window; with INGEST_LLM_ADAPTIVE it moves
+    # between INGEST_LLM_MIN_CONCURRENCY and INGEST_LLM_MAX_CONCURRENCY.
+    if _llm_adaptive():
+        llm_limiter = AdaptiveLimiter(
+            llm_concurrency,
+            min_limit=int(os.getenv("INGEST_LLM_MIN_CONCURRENCY", "1")),
+            max_limit=int(os.getenv("INGEST_LLM_MAX_CONCURRENCY", str(max(32, llm_concurrency)))),
+        )
+    else:
+        llm_limiter = AdaptiveLimiter(llm_concurrency, min_limit=llm_concurrency)
     logger.info(
-        "extracting entities/relations with %s workers (async), timeout=%ss, max_pending=%s, retries=%s",
+        "extracting entities/relations with %s workers (async, window %s-%s), timeout=%ss, max_pending=%s, retries=%s",
         llm_concurrency,
+        llm_limiter.min_limit,
+        llm_limiter.max_limit,
         llm_timeout_s,
         llm_max_pending,
         llm_max_retries,
     )
+    return {
+        "max_workers": llm_concurrency,
+        "timeout_s": llm_timeout_s,
+        "max_pending": llm_max_pending,
+        "max_retries": llm_max_retries,
+        "retry_base_s": float(os.getenv("INGEST_LLM_RETRY_BASE_S", "0.5")),
+        "retry_max_s": float(os.getenv("INGEST_LLM_RETRY_MAX_S", "10")),
+        "limiter": llm_limiter,
+    }
 
-    driver = _neo4j_driver()
-    totals = {"chunks": 0, "entities": 0, "relations": 0}
 
-    with driver.session() as session:
-        if not source_id:
-            source_id = str(uuid.uuid4())
-
-        session.execute_write(
-            create_source,
-            source_id,
-            source_uri,
-            source_last_modified,
+def ingest_corpus(
+    documents: Iterable[CorpusDocument],
+    on_document: Optional[Callable[[int, CorpusDocument, Dict[str, int]], None]] = None,
+) -> Dict[str, object]:
+    # One driver, one extraction pool, one embedding stage and one writer for the
+    # whole corpus: the next document is chunked and embedded while the previous
+    # one is still being extracted, so the LLM window never drains at boundaries.
+    max_embedding_retries = 3
+    extraction_options = llm_extraction_options()
+    llm_limiter = extraction_options["limiter"]
+    # Chunks are resolved in memory and written in windows of this many with UNWIND.
+    write_batch_chunks = max(1, int(os.getenv("INGEST_WRITE_BATCH_CHUNKS", "8")))
+    embed_batch_tokens = int(os.getenv("INGEST_EMBED_BATCH_TOKENS", "16000"))
+    embed_concurrency = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+    prefetcher = None
+    if _llm_stream():
+        prefetcher = RelationEmbeddingPrefetcher(
+            embed_texts,
+            int(os.getenv("INGEST_STREAM_PREFETCH_BATCH", "16")),
+            embed_concurrency,
         )
-            
-        for idx, extracted_entities, extracted_relations in iter_extractions_concurrent(
-            chunks,
-            llm_concurrency,
-            llm_timeout_s,
-            llm_max_pending,
-            llm_max_retries,
-            llm_retry_base_s,
-            llm_retry_max_s,
-        ):
-            chunk = chunks[idx]
-            embedding = embeddings[idx]
-        
-
-            timestamp_ranges = {
-                e.name: parse_timestamp_range(e.name)
-                for e in extracted_entities
-                if _is_time_entity(e.entity_type)
-            }
 
-            def ingest_chunk(tx):
-                chunk_id = create_chunk(tx, chunk, embedding, source_id)
-                entity_ids: Dict[str, str] = {}
-                for entity in extracted_entities:
-                    if _is_time_entity(entity.entity_type):
-                        continue
-                    entity_id = upsert_entity(tx, entity)
-                    entity_ids[entity.name] = entity_id
-                link_chunk_mentions(tx, chunk_id, entity_ids.values())
-
-                relation_embeddings: List[List[float]] = []
-                if extracted_relations:
-                    relation_texts = [rel.description or "" for rel in extracted_relations]
-                    relation_embeddings = embed_texts(relation_texts)
-                relation_embedding_iter = iter(relation_embeddings)
-
-                for rel in extracted_relations:
-                    relation_embedding = next(relation_embedding_iter)
-                    src_id = entity_ids.get(rel.source_entity)
-                    tgt_id = entity_ids.get(rel.target_entity)
-                    if not src_id or not tgt_id:
-                        continue
-                    tr = timestamp_ranges.get(rel.timestamp_entity, TimestampRange(None, None))
-                    create_relationship(
-                        tx,
-                        src_id,
-                        tgt_id,
-                        rel.description,
-                        relation_embedding,
-                        chunk_id,
-                        tr.start_date,
-                        tr.end_date,
+    journal = ingest_journal()
+    resume = resume_ingest() and journal is not None
+    if resume_ingest() and journal is None:
+        logger.warning("INGEST_RESUME is set but INGEST_JOURNAL is off; ingesting every document from scratch")
+    dead_letters = DeadLetterFile(dead_letter_path())
+    deduper = chunk_deduper()
+
+    # Character budgets by default; INGEST_CHUNK_BUDGET=tokens budgets by tokenizer counts.
+    chunk_options = chunk_settings()
+
+    driver = _neo4j_driver()
+    states: Dict[int, _DocumentState] = {}
+    states_lock = threading.Lock()
+    aggregate = _empty_totals()
+    all_start_ts = time.time()
+
+    def work_items() -> Iterator[Tuple[Tuple[int, int], str]]:
+        # Runs on a worker thread of the extraction pool; uses its own sessions.
+        for doc_idx, document in enumerate(documents):
+            started_at = time.time()
+            source_id, chunks, chunk_ids = document_chunks(document, chunk_options)
+            fingerprint = source_fingerprint(chunk_ids)
+            if resume and journal.source_done(source_id, fingerprint):
+                logger.info(
+                    "document %s (%s) finished in journal, skipping",
+                    doc_idx + 1,
+                    document.source_uri or source_id,
+                )
+                with states_lock:
+                    states[doc_idx] = _DocumentState(document, source_id, [], [], started_at)
+                continue
+            with driver.session() as feeder_session:
+                stored_hash, stored_ids = feeder_session.execute_read(fetch_source_state, source_id)
+            if stored_hash == fingerprint:
+                logger.info("document %s (%s) unchanged, skipping", doc_idx + 1, document.source_uri or source_id)
+                with states_lock:
+                    states[doc_idx] = _DocumentState(document, source_id, [], [], started_at)
+                continue
+            # Chunks already in the graph keep their extractions; only new text goes to the LLM.
+            stored = set(stored_ids)
+            pending = [(cid, chunk) for cid, chunk in zip(chunk_ids, chunks) if cid not in stored]
+            orphans = sorted(stored - set(chunk_ids))
+            logger.info(
+                "document %s: got chunks: %s (%s new, %s retracted)",
+                doc_idx + 1,
+                len(chunks),
+                len(pending),
+                len(orphans),
+            )
+            chunk_ids = [cid for cid, _ in pending]
+            chunks = [chunk for _, chunk in pending]
+            embeddings: List[Vector] = []
+            codes: List[Optional[bytes]] = []
+            if chunks:
+                embedded = embed_chunks(chunks, max_retries=max_embedding_retries)
+                if embedded is None:
+                    logger.warning("Failed to embed texts after %s attempts.", max_embedding_retries)
+                    # Leave the Source untouched so the next run retries this document.
+                    chunks, chunk_ids, orphans, fingerprint = [], [], [], None
+                else:
+                    embeddings, codes = embedded
+            decisions = deduper.classify(chunks, chunk_ids) if deduper is not None else [None] * len(chunks)
+            if chunks:
+                with driver.session() as feeder_session:
+                    feeder_session.execute_write(
+                        create_source,
+                        source_id,
+                        document.source_uri,
+                        document.source_last_modified,
                     )
-                return chunk_id, len(entity_ids), len(extracted_relations)
+            with states_lock:
+                states[doc_idx] = _DocumentState(
+                    document,
+                    source_id,
+                    chunks,
+                    embeddings,
+                    started_at,
+                    chunk_ids=chunk_ids,
+                    embedding_codes=codes,
+                    dedup=decisions,
+                    orphan_chunk_ids=orphans,
+                    fingerprint=fingerprint,
+                )
+            for chunk_idx, chunk in enumerate(chunks):
+                yield (doc_idx, chunk_idx), chunk
+
+    def replayed_extraction(key: Tuple[int, int]):
+        doc_idx, chunk_idx = key
+        with states_lock:
+            state = states[doc_idx]
+        replayed = journal.extraction(state.chunk_ids[chunk_idx]) if resume else None
+        if replayed is None and deduper is not None:
+            replayed = deduper.replay(state.chunks[chunk_idx], state.dedup[chunk_idx])
+        return replayed
+
+    def dead_letter(key: Tuple[int, int], exc: Exception) -> None:
+        doc_idx, chunk_idx = key
+        with states_lock:
+            state = states[doc_idx]
+            state.failed += 1
+        dead_letters.append(
+            {
+                "source_id": state.source_id,
+                "source_uri": state.document.source_uri,
+                "chunk_id": state.chunk_ids[chunk_idx],
+                "chunk_idx": chunk_idx,
+                "error": repr(exc),
+            }
+        )
+
+    def extracted_payloads() -> Iterator[ChunkPayload]:
+        for key, extracted_entities, extracted_relations in iter_keyed_extractions(
+            work_items(),
+            replay=replayed_extraction if resume or deduper is not None else None,
+            on_error=dead_letter,
+            on_relation=(lambda rel: prefetcher.add(rel.description or "")) if prefetcher is not None else None,
+            **extraction_options,
+        ):
+            doc_idx, chunk_idx = key
+            with states_lock:
+                state = states[doc_idx]
+            if journal is not None:
+                journal.record_extraction(
+                    state.source_id,
+                    state.chunk_ids[chunk_idx],
+                    extracted_entities,
+                    extracted_relations,
+                )
+            yield ChunkPayload(
+                text=state.chunks[chunk_idx],
+                embedding=state.embeddings[chunk_idx],
+                embedding_int8=state.embedding_codes[chunk_idx],
+                entities=[e for e in extracted_entities if not _is_time_entity(e.entity_type)],
+                relations=extracted_relations,
+                relation_embeddings=[],
+                timestamp_ranges=parse_timestamp_ranges(
+                    e.name for e in extracted_entities if _is_time_entity(e.entity_type)
+                ),
+                source_id=state.source_id,
+                chunk_id=state.chunk_ids[chunk_idx],
+                key=key,
+            )
+
+    def report_finished() -> None:
+        with states_lock:
+            finished = [
+                (doc_idx, state)
+                for doc_idx, state in sorted(states.items())
+                if not state.reported and state.written + state.failed == len(state.chunks)
+            ]
+        for doc_idx, state in finished:
+            state.reported = True
+            if state.orphan_chunk_ids:
+                retracted = session.execute_write(retract_chunks, state.orphan_chunk_ids)
+                graph_changes["pending"] = True
+                if entity_index is not None:
+                    for entity_id in retracted["entity_ids_deleted"]:
+                        entity_index.remove(entity_id)
+                logger.info(
+                    "document %s: retracted %s chunks (%s edges touched, %s deleted, %s entities deleted)",
+                    doc_idx + 1,
+                    retracted["chunks"],
+                    retracted["edges_touched"],
+                    retracted["edges_deleted"],
+                    len(retracted["entity_ids_deleted"]),
+                )
+            # A source with dead-lettered chunks stays unfinished so the next run retries them.
+            if state.failed:
+                logger.warning(
+                    "document %s: %s chunks failed extraction, see %s",
+                    doc_idx + 1,
+                    state.failed,
+                    dead_letters.path,
+                )
+            elif state.fingerprint is not None:
+                session.execute_write(mark_source_ingested, state.source_id, state.fingerprint)
+                if journal is not None:
+                    journal.mark_source_done(state.source_id, state.document.source_uri, state.fingerprint)
+            logger.info(
+                "document %s (%s) ingested in %.2f seconds: %s",
+                doc_idx + 1,
+                state.document.source_uri or state.source_id,
+                time.time() - state.started_at,
+                state.totals,
+            )
+            if on_document is not None:
+                on_document(doc_idx, state.document, dict(state.totals))
 
-            _, entity_count, rel_count = session.execute_write(ingest_chunk)
-            totals["chunks"] += 1
-            totals["entities"] += entity_count
-            totals["relations"] += rel_count
+    graph_changes = {"pending": False, "published_at": time.monotonic()}
 
+    with driver.session() as session:
+        entity_index = shared_entity_index(session) if _entity_resolver() == "index" else None
+        window: List[ChunkPayload] = []
+
+        def flush_window() -> None:
+            if not window:
+                report_finished()
+                return
+            chunk_ids, stats, staged = session.execute_write(write_chunk_batch, list(window), None, entity_index)
+            staged.commit()
+            graph_changes["pending"] = True
+            if journal is not None:
+                journal.mark_written(chunk_ids)
+            logger.info(
+                "wrote %s chunks in %s queries (%s round trips saved; entities +%s/~%s, relations +%s/~%s)",
+                stats.chunks,
+                stats.queries,
+                stats.round_trips_saved,
+                stats.entities_created,
+                stats.entities_merged,
+                stats.relations_created,
+                stats.relations_merged,
+            )
+            # Round trips are saved per window; attribute them to documents by chunk share.
+            saved_share, saved_rest = divmod(stats.round_trips_saved, len(window))
+            for i, payload in enumerate(window):
+                with states_lock:
+                    state = states[payload.key[0]]
+                    state.written += 1
+                state.totals["chunks"] += 1
+                state.totals["entities"] += len({e.name for e in payload.entities})
+                state.totals["relations"] += len(payload.relations)
+                state.totals["round_trips_saved"] += saved_share + (1 if i < saved_rest else 0)
+            aggregate["chunks"] += stats.chunks
+            aggregate["entities"] += stats.entities
+            aggregate["relations"] += stats.relations
+            aggregate["round_trips_saved"] += stats.round_trips_saved
+            window.clear()
+            report_finished()
+            publish_changes()
+
+        def publish_changes(final: bool = False) -> None:
+            # One GraphMeta write per INGEST_GRAPH_VERSION_INTERVAL_S rather than per
+            # window, so writers do not queue on its lock and caches get to be used.
+            now = time.monotonic()
+            if not graph_changes["pending"]:
+                return
+            if not final and now - graph_changes["published_at"] < _graph_version_interval_s():
+                return
+            session.execute_write(bump_graph_version)
+            invalidate_query_cache()
+            graph_changes.update(pending=False, published_at=now)
+
+        # Relation descriptions are embedded across chunks before they reach the
+        # writer, so write transactions never wait on the embedding provider.
+        for payload in iter_embedded_payloads(
+            extracted_payloads(),
+            prefetcher.embed if prefetcher is not None else embed_texts,
+            embed_batch_tokens,
+            embed_concurrency,
+        ):
+            window.append(payload)
+            if len(window) >= write_batch_chunks:
+                flush_window()
+        flush_window()
+
+        if graph_changes["pending"]:
+            publish_changes(final=True)
+            # With PPR_ENGINE=gds_graph the projection is refreshed right away
+            # (within GDS_REPROJECT_INTERVAL_S) instead of on the next query.
+            if ppr_engine() == "gds_graph":
+                ensure_entity_graph(session)
+
+    if prefetcher is not None:
+        prefetcher.close()
     driver.close()
-    return totals
+    logger.info(
+        "ingested %s documents in %.2f seconds: %s",
+        len(states),
+        time.time() - all_start_ts,
+        aggregate,
+    )
+    logger.info("llm limiter: %s", llm_limiter.stats())
+    if journal is not None:
+        logger.info("ingest journal (resume=%s): %s", resume, journal.stats())
+    if dead_letters.count:
+        logger.warning("%s chunks failed extraction and were written to %s", dead_letters.count, dead_letters.path)
+    logger.info("embedding cache: %s", embedding_cache_stats())
+    cache = extraction_cache()
+    if cache is not None:
+        logger.info("extraction cache (reuse=%s): %s", reuse_extractions(), cache.stats())
+    result = {
+        "documents": [states[doc_idx].totals for doc_idx in sorted(states)],
+        "totals": aggregate,
+    }
+    if deduper is not None:
+        result["dedup"] = deduper.stats()
+        logger.info("chunk dedup: %s (index: %s)", result["dedup"], deduper.index.stats())
+    return result
+
+
+def ingest_text(
+    text: str,
+    source_id: Optional[str] = None,
+    source_uri: Optional[str] = None,
+    source_last_modified: Optional[str] = None,
+) -> Dict[str, int]:
+    result = ingest_corpus([CorpusDocument(text, source_id, source_uri, source_last_modified)])
+    documents = result["documents"]
+    return documents[0] if documents else _empty_totals()
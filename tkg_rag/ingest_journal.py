@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import ExtractedEntity, ExtractedRelation
+
+logger = logging.getLogger(__name__)
+
+
+def journal_enabled() -> bool:
+    return os.getenv("INGEST_JOURNAL", "true").strip().lower() in {"1", "true", "yes"}
+
+
+def resume_ingest() -> bool:
+    return os.getenv("INGEST_RESUME", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def journal_path() -> str:
+    return os.getenv("INGEST_JOURNAL_PATH", ".cache/ingest_journal.sqlite3")
+
+
+def dead_letter_path() -> str:
+    return os.getenv("INGEST_DEAD_LETTER_PATH", ".cache/ingest_dead_letter.jsonl")
+
+
+class IngestJournal:
+    # Local record of ingest progress: extraction results per chunk, which chunks made
+    # it into the graph and which sources finished. Only meaningful for the graph it
+    # was written against; clear it whenever the database is reset.
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                source_id TEXT NOT NULL,
+                entities TEXT NOT NULL,
+                relations TEXT NOT NULL,
+                written INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source_id);
+            CREATE TABLE IF NOT EXISTS sources (
+                source_id TEXT PRIMARY KEY,
+                source_uri TEXT,
+                fingerprint TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self.replayed = 0
+
+    def record_extraction(
+        self,
+        source_id: str,
+        chunk_id: str,
+        entities: List[ExtractedEntity],
+        relations: List[ExtractedRelation],
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO chunks (chunk_id, source_id, entities, relations, written, updated_at)
+                VALUES (?, ?, ?, ?, 0, ?)
+                ON CONFLICT (chunk_id) DO UPDATE SET
+                    entities = excluded.entities, relations = excluded.relations, updated_at = excluded.updated_at
+                """,
+                (
+                    chunk_id,
+                    source_id,
+                    json.dumps([asdict(e) for e in entities]),
+                    json.dumps([asdict(r) for r in relations]),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def extraction(self, chunk_id: str) -> Optional[Tuple[List[ExtractedEntity], List[ExtractedRelation]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entities, relations FROM chunks WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.replayed += 1
+        return (
+            [ExtractedEntity(**e) for e in json.loads(row[0])],
+            [ExtractedRelation(**r) for r in json.loads(row[1])],
+        )
+
+    def mark_written(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET written = 1, updated_at = ? WHERE chunk_id = ?",
+                [(time.time(), chunk_id) for chunk_id in chunk_ids],
+            )
+            self._conn.commit()
+
+    def mark_source_done(self, source_id: str, source_uri: Optional[str], fingerprint: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (source_id, source_uri, fingerprint, updated_at) VALUES (?, ?, ?, ?)",
+                (source_id, source_uri, fingerprint, time.time()),
+            )
+            self._conn.commit()
+
+    def source_done(self, source_id: str, fingerprint: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM sources WHERE source_id = ?", (source_id,)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            chunks, written = self._conn.execute(
+                "SELECT count(*), coalesce(sum(written), 0) FROM chunks"
+            ).fetchone()
+            sources = self._conn.execute("SELECT count(*) FROM sources").fetchone()[0]
+        return {"chunks": chunks, "written": written, "sources": sources, "replayed": self.replayed}
+
+
+_JOURNAL: Optional[IngestJournal] = None
+_JOURNAL_LOCK = threading.Lock()
+
+
+def ingest_journal() -> Optional[IngestJournal]:
+    global _JOURNAL
+    if not journal_enabled():
+        return None
+    with _JOURNAL_LOCK:
+        if _JOURNAL is None:
+            _JOURNAL = IngestJournal(journal_path())
+        return _JOURNAL
+
+
+def reset_ingest_journal() -> None:
+    global _JOURNAL
+    with _JOURNAL_LOCK:
+        if _JOURNAL is not None:
+            _JOURNAL._conn.close()
+            _JOURNAL = None
+        path = journal_path()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+class DeadLetterFile:
+    # Chunks whose extraction failed after all retries, one JSON object per line.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def append(self, entry: Dict[str, object]) -> None:
+        directory = os.path.dirname(self.path)
+        with self._lock:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps({**entry, "failed_at": time.time()}) + "\n")
+            self.count += 1
+
+
+def _retrying_path(path: str) -> str:
+    return path + ".retrying"
+
+
+def take_dead_letters(path: str) -> List[Dict[str, object]]:
+    # Moves the dead-letter file aside and returns its entries, together with those of
+    # a retry that never finished; chunks that fail again are re-appended to path.
+    # Call finish_dead_letters once the retry has gone through.
+    retrying = _retrying_path(path)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as handle:
+            pending = handle.read()
+        if os.path.exists(retrying):
+            with open(retrying, "a", encoding="utf-8") as handle:
+                handle.write(pending)
+            os.remove(path)
+        else:
+            os.replace(path, retrying)
+    if not os.path.exists(retrying):
+        return []
+    with open(retrying, "r", encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def finish_dead_letters(path: str) -> None:
+    retrying = _retrying_path(path)
+    if os.path.exists(retrying):
+        os.remove(retrying)
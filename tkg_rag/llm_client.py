@@ -1,7 +1,7 @@
 import os
 
 
-def openai_client(api_key_env: str = "MODEL_API_KEY", base_url_env: str = "MODEL_BASE_URL"):
+def openai_client(api_key_env: str = "MODEL_API_KEY", base_url_env: str = "MODEL_BASE_URL", http_client=None):
     api_key = os.getenv(api_key_env, "")
     base_url = os.getenv(base_url_env, "") or None
     if not api_key:
@@ -10,10 +10,10 @@ def openai_client(api_key_env: str = "MODEL_API_KEY", base_url_env: str = "MODEL
         from openai import OpenAI
     except ImportError as exc:
         raise RuntimeError("openai package is required. Install it to run this action.") from exc
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
 
 
-def async_openai_client(api_key_env: str = "MODEL_API_KEY", base_url_env: str = "MODEL_BASE_URL"):
+def async_openai_client(api_key_env: str = "MODEL_API_KEY", base_url_env: str = "MODEL_BASE_URL", http_client=None):
     api_key = os.getenv(api_key_env, "")
     base_url = os.getenv(base_url_env, "") or None
     if not api_key:
@@ -22,4 +22,16 @@ def async_openai_client(api_key_env: str = "MODEL_API_KEY", base_url_env: str =
         from openai import AsyncOpenAI
     except ImportError as exc:
         raise RuntimeError("openai package is required. Install it to run this action.") from exc
-    return AsyncOpenAI(api_key=api_key, base_url=base_url)
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+
+def _embedding_envs():
+    # Embeddings may use their own provider; fall back to the LLM credentials.
+    api_key_env = "EMBEDDING_API_KEY" if os.getenv("EMBEDDING_API_KEY") else "MODEL_API_KEY"
+    base_url_env = "EMBEDDING_BASE_URL" if os.getenv("EMBEDDING_BASE_URL") else "MODEL_BASE_URL"
+    return api_key_env, base_url_env
+
+
+def embedding_openai_client(http_client=None):
+    api_key_env, base_url_env = _embedding_envs()
+    return openai_client(api_key_env=api_key_env, base_url_env=base_url_env, http_client=http_client)
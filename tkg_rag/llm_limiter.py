@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_STATS_LOG_INTERVAL_S = 60.0
+
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    # openai errors carry the httpx response; other clients may not.
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def error_kind(exc: BaseException) -> str:
+    status = getattr(exc, "status_code", None)
+    if status == 429 or type(exc).__name__ == "RateLimitError":
+        return "rate_limited"
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(exc).__name__:
+        return "timeouts"
+    if isinstance(status, int) and status >= 500:
+        return "server_errors"
+    return "other_errors"
+
+
+class AdaptiveLimiter:
+    # AIMD window for concurrent LLM calls: +1 after a full window of healthy calls,
+    # x decrease_factor on 429s, timeouts, 5xx or latency spikes (at most once per
+    # average call latency, so a burst of failures from one window counts once).
+    # Retry-After pauses new acquisitions for everyone, not only the failed call.
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        decrease_factor: float = 0.7,
+        latency_tolerance: float = 2.0,
+    ) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit if max_limit is not None else initial)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.inflight = 0
+        self.completed = 0
+        self.errors: Dict[str, int] = {"rate_limited": 0, "timeouts": 0, "server_errors": 0, "other_errors": 0}
+        self._healthy_in_window = 0
+        self._latency_fast: Optional[float] = None
+        self._latency_slow: Optional[float] = None
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._started_at: Optional[float] = None
+        self._last_stats_log = time.monotonic()
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self) -> None:
+        cond = self._condition()
+        async with cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.inflight < int(self.limit):
+                    break
+                await cond.wait()
+            self.inflight += 1
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+
+    async def release(self) -> None:
+        cond = self._condition()
+        async with cond:
+            self.inflight -= 1
+            cond.notify_all()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.release()
+
+    def record_success(self, latency_s: float) -> None:
+        self.completed += 1
+        if self._latency_slow is None:
+            self._latency_fast = self._latency_slow = latency_s
+        else:
+            self._latency_fast = 0.3 * latency_s + 0.7 * self._latency_fast
+            self._latency_slow = 0.05 * latency_s + 0.95 * self._latency_slow
+        if self.completed > 10 and self._latency_fast > self.latency_tolerance * self._latency_slow:
+            self._decrease("latency spike")
+        else:
+            self._healthy_in_window += 1
+            if self._healthy_in_window >= int(self.limit) and self.limit < self.max_limit:
+                self.limit += 1
+                self._healthy_in_window = 0
+                self._notify()
+        self._maybe_log_stats()
+
+    def record_failure(self, exc: BaseException) -> Optional[float]:
+        kind = error_kind(exc)
+        self.errors[kind] += 1
+        retry_after = retry_after_s(exc)
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        if kind != "other_errors":
+            self._decrease(kind)
+        self._maybe_log_stats()
+        return retry_after
+
+    def _decrease(self, reason: str) -> None:
+        self._healthy_in_window = 0
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency_slow or 0.0):
+            return
+        self._last_decrease = now
+        previous = int(self.limit)
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        if int(self.limit) != previous:
+            logger.info("llm concurrency %s -> %s (%s)", previous, int(self.limit), reason)
+
+    def _notify(self) -> None:
+        # Wake waiters so a raised limit takes effect immediately; no-op outside a loop.
+        cond = self._cond
+        if cond is None:
+            return
+
+        async def notify() -> None:
+            async with cond:
+                cond.notify_all()
+
+        try:
+            asyncio.get_running_loop().create_task(notify())
+        except RuntimeError:
+            pass
+
+    def stats(self) -> Dict[str, object]:
+        elapsed = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "completed": self.completed,
+            "throughput_per_min": round(self.completed * 60.0 / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_s": round(self._latency_fast or 0.0, 2),
+            **self.errors,
+        }
+
+    def _maybe_log_stats(self) -> None:
+        now = time.monotonic()
+        if now - self._last_stats_log >= _STATS_LOG_INTERVAL_S:
+            self._last_stats_log = now
+            logger.info("llm limiter: %s", self.stats())
@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+
+@dataclass
+class ExtractedEntity:
+    name: str
+    entity_type: str
+
+
+@dataclass
+class ExtractedRelation:
+    timestamp_entity: str
+    source_entity: str
+    target_entity: str
+    description: str
+
+
+@lru_cache(maxsize=8192)
+def date_ordinal(value: Optional[str]) -> Optional[int]:
+    # Proleptic Gregorian day number of an ISO date (or the date part of a datetime string).
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class TimestampRange:
+    start_date: Optional[str]
+    end_date: Optional[str]
+
+    @property
+    def start_ordinal(self) -> Optional[int]:
+        return date_ordinal(self.start_date)
+
+    @property
+    def end_ordinal(self) -> Optional[int]:
+        return date_ordinal(self.end_date)
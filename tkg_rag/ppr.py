@@ -0,0 +1,98 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def ppr_engine() -> str:
+    # numpy: in-process PPR over the candidate edges (read-only, safe to run
+    # concurrently). gds: project the candidates into GDS per query.
+    # gds_graph: PPR on a persistent GDS projection of the whole entity graph
+    # (all relations and dates, reprojected at most every GDS_REPROJECT_INTERVAL_S).
+    return os.getenv("PPR_ENGINE", "numpy").strip().lower()
+
+
+@dataclass
+class CsrGraph:
+    # Incoming edges in CSR form: the sources of the edges into node i are
+    # indices[indptr[i]:indptr[i + 1]]. Parallel edges are kept, as in a GDS projection.
+    indptr: np.ndarray
+    indices: np.ndarray
+    out_degree: np.ndarray
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.out_degree)
+
+    @classmethod
+    def from_edges(cls, sources: Sequence[int], targets: Sequence[int], num_nodes: int) -> "CsrGraph":
+        src = np.asarray(sources, dtype=np.int64)
+        dst = np.asarray(targets, dtype=np.int64)
+        order = np.argsort(dst, kind="stable")
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, src[order], np.bincount(src, minlength=num_nodes).astype(np.float64))
+
+    def pull(self, values: np.ndarray) -> np.ndarray:
+        # y[i] = sum of values[j] over edges j -> i
+        out = np.zeros(self.num_nodes, dtype=np.float64)
+        rows = np.flatnonzero(np.diff(self.indptr))
+        if rows.size:
+            out[rows] = np.add.reduceat(values[self.indices], self.indptr[rows])
+        return out
+
+
+def personalized_pagerank(
+    graph: CsrGraph,
+    seeds: Iterable[int],
+    damping: float = 0.85,
+    max_iter: int = 20,
+    tolerance: float = 1e-7,
+    weights: Optional[Sequence[float]] = None,
+) -> np.ndarray:
+    # Same scheme as gds.pageRank with sourceNodes: seeds start at 1 - damping
+    # (times their weight, if given), every iteration passes each node's last
+    # increase (delta) on split over its out-edges, nodes stop sending once their
+    # delta is at most tolerance, and dangling mass is dropped. Scores are not normalized.
+    scores = np.zeros(graph.num_nodes, dtype=np.float64)
+    seed_rows = np.asarray(list(seeds), dtype=np.int64)
+    if not seed_rows.size:
+        return scores
+    scale = np.asarray(weights, dtype=np.float64) if weights is not None else 1.0
+    scores[seed_rows] = (1.0 - damping) * scale
+    delta = scores.copy()
+    share = np.divide(1.0, graph.out_degree, out=np.zeros_like(graph.out_degree), where=graph.out_degree > 0)
+    sending = delta > 0.0
+    for _ in range(max_iter - 1):
+        delta = damping * graph.pull(np.where(sending, delta, 0.0) * share)
+        scores += delta
+        sending = delta > tolerance
+        if not sending.any():
+            break
+    return scores
+
+
+def ppr_scores(
+    edges: Iterable[Tuple[Hashable, Hashable]],
+    seeds: Iterable[Hashable],
+    damping: float = 0.85,
+    max_iter: int = 20,
+    tolerance: float = 1e-7,
+    seed_weights: Optional[Dict[Hashable, float]] = None,
+) -> Dict[Hashable, float]:
+    # PPR over an edge list of arbitrary node keys; returns a score per node. Seeds
+    # missing from seed_weights weigh 1.
+    nodes: Dict[Hashable, int] = {}
+    sources: List[int] = []
+    targets: List[int] = []
+    for source, target in edges:
+        sources.append(nodes.setdefault(source, len(nodes)))
+        targets.append(nodes.setdefault(target, len(nodes)))
+    present = list(dict.fromkeys(seed for seed in seeds if seed in nodes))
+    if not sources or not present:
+        return {}
+    graph = CsrGraph.from_edges(sources, targets, len(nodes))
+    weights = [seed_weights.get(seed, 1.0) for seed in present] if seed_weights else None
+    scores = personalized_pagerank(graph, [nodes[seed] for seed in present], damping, max_iter, tolerance, weights)
+    return {node: float(scores[row]) for node, row in nodes.items()}
@@ -56,6 +56,18 @@ Text: {input_text}
 Your output:
 """
 
+#packed extraction: several chunks per request, each answered in its own section
+TEMPORAL_ENTITY_EXTRACTION_PACKED_PROMPT = """
+Entity_types: {entity_types}
+The text below consists of {chunk_count} independent chunks. Each chunk starts with a marker line "### CHUNK <n>".
+Process every chunk separately, as if it were the only text. For each chunk, first output its marker line exactly as given, then that chunk's entities and relationships in the output format above.
+Output the marker of every chunk, in order, even when a chunk has no entities or relationships.
+Text:
+{input_chunks}
+######################
+Your output:
+"""
+
 QUERY_ENTITY_TIME_EXTRACTION_SYS_PROMPT = """
 -Goal-
 Extract only the entities and time expressions needed to interpret a user question for a temporal knowledge graph.
@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import TimestampRange
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_enabled() -> bool:
+    return os.getenv("QUERY_CACHE", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def _cache_max_entries() -> int:
+    return int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+
+
+def _cache_ttl_s() -> float:
+    return float(os.getenv("QUERY_CACHE_TTL_S", "3600"))
+
+
+def _similarity_threshold() -> float:
+    # Cosine between question embeddings for the second tier; above 1 disables it.
+    return float(os.getenv("QUERY_CACHE_SIM_THRESHOLD", "0.97"))
+
+
+def _version_check_s() -> float:
+    # How often the graph version is re-read; ingestion elsewhere shows up this late.
+    return float(os.getenv("QUERY_CACHE_VERSION_CHECK_S", "5"))
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+@dataclass
+class _CacheEntry:
+    result: Dict[str, object]
+    params: Hashable
+    embedding: Optional[np.ndarray]
+    time_range: TimestampRange
+    cost_s: float
+    expires_at: float
+
+
+class QueryCache:
+    # Retrieval results keyed by normalized question text and retrieval parameters,
+    # with a second tier that reuses the result of a near-duplicate question (cosine
+    # of the question embeddings at or above the threshold) with the same time range.
+    # LRU with a TTL; everything is dropped when the graph version moves.
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600.0, threshold: float = 0.97) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], _CacheEntry]" = OrderedDict()
+        # Row-normalized embeddings of the entries per params, rebuilt after changes.
+        self._matrices: Dict[Hashable, Tuple[List[Tuple[str, Hashable]], np.ndarray]] = {}
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._stats = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+        self._saved_s = 0.0
+
+    def validate(self, load_version: Callable[[], int], check_s: Optional[float] = None) -> None:
+        # Calls load_version at most every check_s seconds and clears the cache when
+        # the graph version changed since the entries were stored.
+        check_s = _version_check_s() if check_s is None else check_s
+        now = time.monotonic()
+        with self._lock:
+            if now - self._version_checked_at < check_s:
+                return
+            self._version_checked_at = now
+        version = load_version()
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._clear()
+            self._version = version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clear()
+            self._version_checked_at = 0.0
+
+    def _clear(self) -> None:
+        if self._entries:
+            self._stats["invalidations"] += 1
+        self._entries.clear()
+        self._matrices.clear()
+
+    def _hit(self, key: Tuple[str, Hashable], question: str, tier: str, spent_s: float) -> Dict[str, object]:
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        self._stats[f"{tier}_hits"] += 1
+        self._saved_s += max(0.0, entry.cost_s - spent_s)
+        result = dict(entry.result)
+        result["question"] = question
+        result["cache"] = tier
+        return result
+
+    def _live(self, key: Tuple[str, Hashable], now: float) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry.expires_at < now:
+            del self._entries[key]
+            self._matrices.pop(key[1], None)
+            return False
+        return True
+
+    def lookup(self, question: str, params: Hashable) -> Optional[Dict[str, object]]:
+        # Exact tier; counts one lookup per question.
+        key = (normalize_question(question), params)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if not self._live(key, time.monotonic()):
+                return None
+            return self._hit(key, question, "exact", 0.0)
+
+    def _matrix(self, params: Hashable) -> Tuple[List[Tuple[str, Hashable]], np.ndarray]:
+        cached = self._matrices.get(params)
+        if cached is None:
+            keys = [k for k, e in self._entries.items() if k[1] == params and e.embedding is not None]
+            dim = len(self._entries[keys[0]].embedding) if keys else 0
+            matrix = np.stack([self._entries[k].embedding for k in keys]) if keys else np.zeros((0, dim), np.float32)
+            cached = self._matrices[params] = (keys, matrix)
+        return cached
+
+    def _similar(self, embedding: Sequence[float], params: Hashable) -> List[Tuple[str, Hashable]]:
+        if self.threshold > 1.0:
+            return []
+        keys, matrix = self._matrix(params)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if not keys or norm == 0.0 or matrix.shape[1] != vector.size:
+            return []
+        sims = matrix @ (vector / norm)
+        now = time.monotonic()
+        return [keys[row] for row in np.argsort(-sims) if sims[row] >= self.threshold and self._live(keys[row], now)]
+
+    def has_similar(self, embedding: Sequence[float], params: Hashable) -> bool:
+        with self._lock:
+            return bool(self._similar(embedding, params))
+
+    def lookup_similar(
+        self,
+        question: str,
+        embedding: Sequence[float],
+        time_range: TimestampRange,
+        params: Hashable,
+        spent_s: float = 0.0,
+    ) -> Optional[Dict[str, object]]:
+        # Second tier, after the exact lookup missed; spent_s is what the caller already
+        # paid (extraction, embedding) and is not counted as saved.
+        with self._lock:
+            for key in self._similar(embedding, params):
+                if self._entries[key].time_range == time_range:
+                    return self._hit(key, question, "semantic", spent_s)
+        return None
+
+    def put(
+        self,
+        question: str,
+        params: Hashable,
+        result: Dict[str, object],
+        embedding: Optional[Sequence[float]],
+        time_range: TimestampRange,
+        cost_s: float,
+    ) -> None:
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            vector = vector / norm if norm > 0.0 else None
+        key = (normalize_question(question), params)
+        with self._lock:
+            self._entries[key] = _CacheEntry(
+                dict(result), params, vector, time_range, cost_s, time.monotonic() + self.ttl_s
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._matrices.pop(params, None)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats: Dict[str, object] = dict(self._stats)
+            hits = stats["exact_hits"] + stats["semantic_hits"]
+            stats["misses"] = stats["lookups"] - hits
+            stats["hit_rate"] = round(hits / stats["lookups"], 4) if stats["lookups"] else 0.0
+            stats["saved_s"] = round(self._saved_s, 3)
+            stats["entries"] = len(self._entries)
+            return stats
+
+
+_CACHE: Optional[QueryCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def query_cache() -> Optional[QueryCache]:
+    global _CACHE
+    if not _cache_enabled():
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = QueryCache(_cache_max_entries(), _cache_ttl_s(), _similarity_threshold())
+        return _CACHE
+
+
+def invalidate_query_cache() -> None:
+    # For ingestion in this process; other processes notice the graph version instead.
+    with _CACHE_LOCK:
+        cache = _CACHE
+    if cache is not None:
+        cache.invalidate()
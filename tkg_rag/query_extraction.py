@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
 from . import prompts
-from .llm_client import openai_client
+from .llm_client import async_openai_client, openai_client
 from .settings import ENTITY_TYPES, LLM_MODEL
 
 
@@ -52,18 +52,35 @@ def _parse_query_output(raw: str, tuple_delimiter: str, record_delimiter: str) -
     return entities
 
 
-def extract_query_entities(question: str) -> List[QueryEntity]:
+def _query_messages(question: str) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
     if not LLM_MODEL:
         raise RuntimeError("LLM_MODEL is not set.")
     system_prompt, user_prompt_template, delimiters = _build_query_prompts()
-    client = openai_client()
     user_prompt = user_prompt_template.format(entity_types=", ".join(ENTITY_TYPES), question=question)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ], delimiters
+
+
+def extract_query_entities(question: str, client=None) -> List[QueryEntity]:
+    messages, delimiters = _query_messages(question)
+    client = client or openai_client()
     response = client.chat.completions.create(
         model=LLM_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
+        messages=messages,
+        temperature=0,
+    )
+    raw = response.choices[0].message.content or ""
+    return _parse_query_output(raw, delimiters["tuple_delimiter"], delimiters["record_delimiter"])
+
+
+async def async_extract_query_entities(question: str, client=None) -> List[QueryEntity]:
+    messages, delimiters = _query_messages(question)
+    client = client or async_openai_client()
+    response = await client.chat.completions.create(
+        model=LLM_MODEL,
+        messages=messages,
         temperature=0,
     )
     raw = response.choices[0].message.content or ""
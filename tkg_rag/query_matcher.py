@@ -0,0 +1,240 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .entity_index import EntityIndex
+from .query_extraction import QueryEntity
+from .timestamps import find_timestamp_mentions
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Question and function words; capitalized at the start of a question, they do not
+# hint at an entity the automaton missed.
+_FUNCTION_WORDS = {
+    "a", "about", "according", "across", "all", "also", "an", "and", "any", "are", "as", "at",
+    "be", "between", "both", "by", "can", "compare", "compared", "could", "describe", "did", "do", "does",
+    "during", "each", "explain", "for", "from", "give", "had", "has", "have", "how", "i", "if", "in", "into",
+    "is", "it", "its", "list", "name", "of", "on", "or", "please", "provide", "related", "regarding",
+    "should", "summarize", "tell", "than", "that", "the", "their", "there", "these", "this",
+    "those", "to", "was", "were", "what", "when", "where", "which", "who", "whom", "whose", "why", "will",
+    "with", "would",
+}
+
+# Time words the grammar cannot turn into a range ("before 2020", "last quarter");
+# a question holding one goes to the LLM.
+_RELATIVE_TIME_WORDS = {
+    "after", "ago", "before", "current", "earlier", "last", "later", "latest", "next", "previous",
+    "prior", "recent", "recently", "since", "until", "ytd",
+}
+
+
+def _fast_path_enabled() -> bool:
+    return os.getenv("QUERY_FAST_PATH", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def _min_confidence() -> float:
+    return float(os.getenv("QUERY_FAST_PATH_MIN_CONFIDENCE", "1.0"))
+
+
+def _version_check_s() -> float:
+    return float(os.getenv("QUERY_FAST_PATH_VERSION_CHECK_S", "5"))
+
+
+class AhoCorasick:
+    # Aho-Corasick automaton over token sequences, so matches always fall on word
+    # boundaries. add() every pattern, then build() once before find().
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._depth: List[int] = [0]
+        self._values: List[Set[Hashable]] = [set()]
+        # Nearest state on the fail chain that ends a pattern.
+        self._output: List[int] = [0]
+
+    def add(self, pattern: Sequence[str], value: Hashable) -> None:
+        if not pattern:
+            return
+        state = 0
+        for token in pattern:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[state] + 1)
+                self._values.append(set())
+                self._output.append(0)
+            state = nxt
+        self._values[state].add(value)
+
+    def build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                if state:
+                    fail = self._fail[state]
+                    while fail and token not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(token, 0)
+                link = self._fail[nxt]
+                self._output[nxt] = link if self._values[link] else self._output[link]
+                queue.append(nxt)
+
+    def find(self, words: Sequence[str]) -> Iterator[Tuple[int, int, Set[Hashable]]]:
+        # (start, end, values) for every pattern occurrence, as token offsets.
+        state = 0
+        for i, token in enumerate(words):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            hit = state if self._values[state] else self._output[state]
+            while hit:
+                yield i + 1 - self._depth[hit], i + 1, self._values[hit]
+                hit = self._output[hit]
+
+
+class QueryMatcher:
+    # Local stand-in for the query extraction LLM call: entity names and aliases from
+    # the graph via Aho-Corasick, time expressions via the timestamp grammar. It only
+    # answers when every salient token of the question (capitalized or numeric, not a
+    # question word) is covered by an unambiguous match.
+    def __init__(self, automaton: AhoCorasick, entity_count: int = 0) -> None:
+        self.automaton = automaton
+        self.entity_count = entity_count
+        self._lock = threading.Lock()
+        self._local = 0
+        self._llm = 0
+        self._llm_avg_s: Optional[float] = None
+        self._saved_s = 0.0
+
+    @classmethod
+    def from_index(cls, index: EntityIndex) -> "QueryMatcher":
+        automaton = AhoCorasick()
+        for entity in index:
+            for alias in {entity.name, *entity.aliases}:
+                words = [word.lower() for word in _WORD_RE.findall(alias or "")]
+                if words and not all(word in _FUNCTION_WORDS for word in words):
+                    automaton.add(tuple(words), (entity.name, entity.entity_type))
+        automaton.build()
+        return cls(automaton, len(index))
+
+    def match(self, question: str) -> Tuple[List[QueryEntity], float, List[str]]:
+        # (entities incl. time entities, confidence, uncovered salient words)
+        spans = [(m.start(), m.end(), m.group(0)) for m in _WORD_RE.finditer(question)]
+        words = [word.lower() for _, _, word in spans]
+        covered = [False] * len(words)
+        entities: List[QueryEntity] = []
+
+        for start, end, name, time_type in find_timestamp_mentions(question):
+            entities.append(QueryEntity(name, time_type))
+            for i, (word_start, word_end, _) in enumerate(spans):
+                if word_start >= start and word_end <= end:
+                    covered[i] = True
+        if any(word in _RELATIVE_TIME_WORDS for word in words):
+            return entities, 0.0, [word for word in words if word in _RELATIVE_TIME_WORDS]
+
+        # Leftmost-longest, unambiguous, not overlapping a time expression.
+        matches = sorted(self.automaton.find(words), key=lambda m: (m[0], -(m[1] - m[0])))
+        taken = list(covered)
+        seen: Set[Tuple[str, str]] = set()
+        for start, end, values in matches:
+            if len(values) != 1 or any(taken[start:end]):
+                continue
+            for i in range(start, end):
+                taken[i] = covered[i] = True
+            name, entity_type = next(iter(values))
+            if (name, entity_type) not in seen:
+                seen.add((name, entity_type))
+                entities.append(QueryEntity(name, entity_type))
+
+        salient = [
+            i for i, (_, _, word) in enumerate(spans)
+            if (word != word.lower() or any(ch.isdigit() for ch in word)) and words[i] not in _FUNCTION_WORDS
+        ]
+        uncovered = [spans[i][2] for i in salient if not covered[i]]
+        if not entities:
+            return entities, 0.0, uncovered
+        confidence = 1.0 - len(uncovered) / len(salient) if salient else 1.0
+        return entities, confidence, uncovered
+
+    def extract(self, question: str) -> Optional[List[QueryEntity]]:
+        # The query entities without an LLM call, or None when the LLM should decide.
+        started = time.monotonic()
+        entities, confidence, uncovered = self.match(question)
+        elapsed = time.monotonic() - started
+        if confidence < _min_confidence():
+            logger.info(
+                "query fast path: LLM fallback (confidence %.2f, uncovered %s) for %r", confidence, uncovered, question
+            )
+            return None
+        with self._lock:
+            self._local += 1
+            saved = max(0.0, self._llm_avg_s - elapsed) if self._llm_avg_s is not None else None
+            self._saved_s += saved or 0.0
+        logger.info(
+            "query fast path: answered locally in %.1f ms (%s entities, ~%s saved) for %r",
+            elapsed * 1000,
+            len(entities),
+            f"{saved:.2f}s" if saved is not None else "n/a",
+            question,
+        )
+        return entities
+
+    def record_llm(self, elapsed_s: float) -> None:
+        # LLM extraction latency, averaged to estimate what each local answer saves.
+        with self._lock:
+            self._llm += 1
+            self._llm_avg_s = elapsed_s if self._llm_avg_s is None else 0.8 * self._llm_avg_s + 0.2 * elapsed_s
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            total = self._local + self._llm
+            return {
+                "local": self._local,
+                "llm": self._llm,
+                "local_rate": round(self._local / total, 4) if total else 0.0,
+                "llm_avg_s": round(self._llm_avg_s, 3) if self._llm_avg_s is not None else None,
+                "saved_s": round(self._saved_s, 3),
+                "entities": self.entity_count,
+            }
+
+
+_MATCHER: Optional[QueryMatcher] = None
+_MATCHER_VERSION: Optional[int] = None
+_MATCHER_CHECKED_AT = 0.0
+_MATCHER_LOCK = threading.Lock()
+
+
+def query_matcher(load_version: Callable[[], int], load_index: Callable[[], EntityIndex]) -> Optional[QueryMatcher]:
+    # Shared matcher, rebuilt from the graph when its version moves (checked at most
+    # every QUERY_FAST_PATH_VERSION_CHECK_S). Counters carry over a rebuild.
+    global _MATCHER, _MATCHER_VERSION, _MATCHER_CHECKED_AT
+    if not _fast_path_enabled():
+        return None
+    with _MATCHER_LOCK:
+        now = time.monotonic()
+        if _MATCHER is not None and now - _MATCHER_CHECKED_AT < _version_check_s():
+            return _MATCHER
+        _MATCHER_CHECKED_AT = now
+        version = load_version()
+        if _MATCHER is None or version != _MATCHER_VERSION:
+            started = time.monotonic()
+            matcher = QueryMatcher.from_index(load_index())
+            if _MATCHER is None:
+                _MATCHER = matcher
+            else:
+                _MATCHER.automaton, _MATCHER.entity_count = matcher.automaton, matcher.entity_count
+            _MATCHER_VERSION = version
+            logger.info(
+                "built query matcher over %s entities in %.2f seconds", matcher.entity_count, time.monotonic() - started
+            )
+        return _MATCHER
+
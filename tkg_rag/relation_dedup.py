@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embedding_storage import stored_vector
+from .settings import RELATION_DEDUP_SIM_THRESHOLD
+
+# (source entity id, target entity id, start date, end date)
+EdgeKey = Tuple[str, str, Optional[str], Optional[str]]
+
+
+@dataclass
+class _EdgeState:
+    relation_id: str
+    source_entity_id: str
+    target_entity_id: str
+    start_date: Optional[str]
+    end_date: Optional[str]
+    relation_text: str
+    embedding: Optional[List[float]]
+    chunk_ids: List[str] = field(default_factory=list)
+    is_new: bool = False
+    dirty: bool = False
+
+
+class _EdgeGroup:
+    # Candidate edges of one key as rows of a running-sum matrix. Cosine similarity is
+    # scale invariant, so matching against the sums equals matching against the means.
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.edges: List[_EdgeState] = []
+        self.sums = np.zeros((0, dim), dtype=np.float64)
+        self.counts: List[int] = []
+
+    def append(self, edge: _EdgeState, vector: np.ndarray, count: int) -> int:
+        self.edges.append(edge)
+        self.sums = np.vstack([self.sums, vector[None, :] * count])
+        self.counts.append(count)
+        return len(self.edges) - 1
+
+    def best(self, vector: np.ndarray) -> Tuple[int, float]:
+        norms = np.linalg.norm(self.sums, axis=1) * np.linalg.norm(vector)
+        dots = self.sums @ vector
+        sims = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0.0)
+        row = int(np.argmax(sims))
+        return row, float(sims[row])
+
+
+class RelationDedup:
+    # Relation dedup for one write batch. Candidate edges per EdgeKey are kept as
+    # NumPy running sums and counts; a relation merges into its most similar candidate
+    # at or above the threshold, otherwise it becomes a new candidate. finish() writes
+    # each touched edge's mean embedding back once.
+    def __init__(self, threshold: float = RELATION_DEDUP_SIM_THRESHOLD) -> None:
+        self.threshold = threshold
+        self._groups: Dict[Tuple[EdgeKey, int], _EdgeGroup] = {}
+        # id(edge) -> (group, row); _touched holds the edges merged into since finish().
+        self._rows: Dict[int, Tuple[_EdgeGroup, int]] = {}
+        self._touched: Dict[int, Tuple[_EdgeGroup, int]] = {}
+
+    def _group(self, key: EdgeKey, dim: int) -> _EdgeGroup:
+        # Embeddings of another dimension (a model change) are never compared.
+        group = self._groups.get((key, dim))
+        if group is None:
+            group = self._groups[(key, dim)] = _EdgeGroup(dim)
+        return group
+
+    def add_candidates(self, key: EdgeKey, edges: Sequence[_EdgeState]) -> None:
+        for edge in edges:
+            if edge.embedding is None:
+                continue
+            self._add(key, edge, max(1, len(edge.chunk_ids)))
+
+    def _add(self, key: EdgeKey, edge: _EdgeState, count: int) -> None:
+        vector = np.asarray(edge.embedding, dtype=np.float64)
+        group = self._group(key, len(vector))
+        self._rows[id(edge)] = (group, group.append(edge, vector, count))
+
+    def match(self, key: EdgeKey, embedding: Sequence[float]) -> Tuple[Optional[_EdgeState], float]:
+        vector = np.asarray(embedding, dtype=np.float64)
+        group = self._groups.get((key, len(vector)))
+        if group is None or not group.edges:
+            return None, -1.0
+        row, sim = group.best(vector)
+        if sim < self.threshold:
+            return None, sim
+        return group.edges[row], sim
+
+    def merge(self, edge: _EdgeState, embedding: Sequence[float], chunk_id: str) -> None:
+        # Each chunk counts once towards an edge's mean embedding.
+        if chunk_id in edge.chunk_ids:
+            return
+        group, row = self._rows[id(edge)]
+        group.sums[row] += np.asarray(embedding, dtype=np.float64)
+        group.counts[row] += 1
+        edge.chunk_ids.append(chunk_id)
+        edge.dirty = True
+        self._touched[id(edge)] = (group, row)
+
+    def add(self, key: EdgeKey, edge: _EdgeState) -> None:
+        self._add(key, edge, 1)
+
+    def finish(self) -> None:
+        for group, row in self._touched.values():
+            group.edges[row].embedding = stored_vector(group.sums[row] / group.counts[row])
+        self._touched.clear()
@@ -1,16 +1,31 @@
+import asyncio
+import logging
 import os
-from typing import Dict, Iterable, List, Optional, Tuple
+import time
+from functools import lru_cache
+from typing import Awaitable, Dict, FrozenSet, Iterable, List, Optional, Tuple, TypeVar
 
+from .embedding_storage import embedding_int8_sidecar, int8_cosine, stored_vectors
 from .ingest import (
     TimestampRange,
-    _entity_type_strict_dedup,
-    _escape_lucene_query,
     _neo4j_driver,
+    embed_source_texts,
     embed_texts,
     parse_timestamp_range,
 )
-from .query_extraction import QueryEntity, extract_query_entities, is_time_entity
-from .text_utils import iou, tokens
+from .models import date_ordinal
+from .entity_index import load_entity_index, scorable_alias_tokens
+from .gds_graph import ensure_entity_graph, graph_version, run_ppr_projected
+from .ppr import ppr_engine, ppr_scores
+from .query_cache import QueryCache, query_cache
+from .query_extraction import QueryEntity, async_extract_query_entities, extract_query_entities, is_time_entity
+from .query_matcher import QueryMatcher, query_matcher
+from .settings import EMBEDDING_DIM, entity_type_strict_dedup
+from .text_utils import escape_lucene_query, iou, tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
 def _chunk_vector_k() -> int:
@@ -21,6 +36,10 @@ def _chunk_vector_threshold() -> float:
     return float(os.getenv("CHUNK_VECTOR_THRESHOLD", "0.7"))
 
 
+def _chunk_rescore_oversample() -> int:
+    return max(1, int(os.getenv("CHUNK_RESCORE_OVERSAMPLE", "4")))
+
+
 def _relation_vector_k() -> int:
     return int(os.getenv("RELATION_VECTOR_K", "12"))
 
@@ -37,6 +56,19 @@ def _ppr_max_iter() -> int:
     return int(os.getenv("PPR_MAX_ITER", "20"))
 
 
+def _retrieve_many_batch() -> int:
+    # Questions per embedding call and per batched vector search in retrieve_many.
+    return max(1, int(os.getenv("RETRIEVE_MANY_BATCH", "64")))
+
+
+def _retrieve_many_concurrency() -> int:
+    return max(1, int(os.getenv("RETRIEVE_MANY_CONCURRENCY", "8")))
+
+
+def _ppr_tolerance() -> float:
+    return float(os.getenv("PPR_TOLERANCE", "1e-7"))
+
+
 def _rrf_k() -> int:
     return int(os.getenv("RRF_K", "60"))
 
@@ -49,16 +81,72 @@ def _entity_iou_threshold() -> float:
     return float(os.getenv("ENTITY_IOU_THRESHOLD", "0.5"))
 
 
+def _retrieve_edges() -> bool:
+    # retrieve_async runs the edge path (relation search, entity linking, PPR) too.
+    return os.getenv("RETRIEVE_EDGES", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def _stage_timeout(stage: str, default: str) -> float:
+    # RETRIEVE_EXTRACT_TIMEOUT_S, RETRIEVE_EMBED_TIMEOUT_S, RETRIEVE_SEARCH_TIMEOUT_S, RETRIEVE_PPR_TIMEOUT_S
+    return float(os.getenv(f"RETRIEVE_{stage}_TIMEOUT_S", default))
+
+
+def _cache_params(max_edges: int, max_chunks: int, with_edges: bool) -> Tuple[int, int, bool]:
+    return max_edges, max_chunks, with_edges
+
+
+def _validated_cache(driver) -> Optional[QueryCache]:
+    # The query cache, emptied first if ingestion moved the graph version.
+    cache = query_cache()
+    if cache is not None:
+        cache.validate(lambda: _read(driver, graph_version))
+    return cache
+
+
 def _merge_time_ranges(ranges: List[TimestampRange]) -> TimestampRange:
-    starts = [r.start_date for r in ranges if r.start_date]
-    ends = [r.end_date for r in ranges if r.end_date]
-    start = min(starts) if starts else None
-    end = max(ends) if ends else None
+    starts = [r for r in ranges if r.start_ordinal is not None]
+    ends = [r for r in ranges if r.end_ordinal is not None]
+    start = min(starts, key=lambda r: r.start_ordinal).start_date if starts else None
+    end = max(ends, key=lambda r: r.end_ordinal).end_date if ends else None
     return TimestampRange(start, end)
 
 
-def extract_query_entities_and_time(question: str) -> Tuple[List[QueryEntity], TimestampRange]:
-    entities = extract_query_entities(question)
+def _query_matcher(driver) -> Optional[QueryMatcher]:
+    # The QUERY_FAST_PATH matcher, rebuilt from the graph when ingestion moved it.
+    return query_matcher(lambda: _read(driver, graph_version), lambda: _read(driver, load_entity_index))
+
+
+def extract_query_entities_and_time(
+    question: str, client=None, matcher: Optional[QueryMatcher] = None
+) -> Tuple[List[QueryEntity], TimestampRange]:
+    entities = matcher.extract(question) if matcher is not None else None
+    if entities is None:
+        started = time.monotonic()
+        entities = extract_query_entities(question, client)
+        if matcher is not None:
+            matcher.record_llm(time.monotonic() - started)
+    return _split_time_entities(entities)
+
+
+async def async_extract_query_entities_and_time(
+    question: str, client=None, matcher: Optional[QueryMatcher] = None
+) -> Tuple[List[QueryEntity], TimestampRange]:
+    entities = matcher.extract(question) if matcher is not None else None
+    if entities is None:
+        started = time.monotonic()
+        entities = await async_extract_query_entities(question, client)
+        if matcher is not None:
+            matcher.record_llm(time.monotonic() - started)
+    return _split_time_entities(entities)
+
+
+async def _query_entities_and_time(question: str, client, driver) -> Tuple[List[QueryEntity], TimestampRange]:
+    # Inside the extraction stage, so a first matcher build counts against its timeout.
+    matcher = await asyncio.to_thread(_query_matcher, driver)
+    return await async_extract_query_entities_and_time(question, client, matcher)
+
+
+def _split_time_entities(entities: List[QueryEntity]) -> Tuple[List[QueryEntity], TimestampRange]:
     time_ranges = [parse_timestamp_range(e.name) for e in entities if is_time_entity(e.entity_type)]
     time_range = _merge_time_ranges([r for r in time_ranges if r.start_date or r.end_date])
     non_time_entities = [e for e in entities if not is_time_entity(e.entity_type)]
@@ -66,11 +154,14 @@ def extract_query_entities_and_time(question: str) -> Tuple[List[QueryEntity], T
 
 
 def _time_overlaps(start_date: Optional[str], end_date: Optional[str], time_range: TimestampRange) -> bool:
-    if not time_range.start_date and not time_range.end_date:
+    range_start, range_end = time_range.start_ordinal, time_range.end_ordinal
+    if range_start is None and range_end is None:
         return True
-    if time_range.start_date and end_date and end_date < time_range.start_date:
+    end = date_ordinal(end_date)
+    if range_start is not None and end is not None and end < range_start:
         return False
-    if time_range.end_date and start_date and start_date > time_range.end_date:
+    start = date_ordinal(start_date)
+    if range_end is not None and start is not None and start > range_end:
         return False
     return True
 
@@ -110,52 +201,133 @@ def search_chunks(
     query_embedding: List[float],
     k: int,
     min_score: float,
+    with_codes: bool = False,
 ) -> List[Dict[str, object]]:
-    query = """
+    codes = ", node.embedding_int8 AS embedding_int8" if with_codes else ""
+    query = f"""
     CALL db.index.vector.queryNodes('chunk_embedding', $k, $embedding)
     YIELD node, score
     WHERE score >= $min_score
-    RETURN node.chunk_id AS chunk_id, node.text AS text, score
+    RETURN node.chunk_id AS chunk_id, node.text AS text, score{codes}
     ORDER BY score DESC
     """
     result = tx.run(query, k=k, embedding=query_embedding, min_score=min_score)
     return [record.data() for record in result]
 
 
-def link_entities_bm25(tx, entities: List[QueryEntity]) -> List[str]:
-    entity_ids: List[str] = []
-    for entity in entities:
-        query = """
-        CALL db.index.fulltext.queryNodes('entity_name_aliases', $query_text)
+def search_chunks_many(
+    tx,
+    query_embeddings: List[List[float]],
+    k: int,
+    min_score: float,
+    with_codes: bool = False,
+) -> List[List[Dict[str, object]]]:
+    # search_chunks for several query embeddings in one round trip; hits per query, in order.
+    codes = ", node.embedding_int8 AS embedding_int8" if with_codes else ""
+    query = f"""
+    UNWIND range(0, size($embeddings) - 1) AS i
+    CALL db.index.vector.queryNodes('chunk_embedding', $k, $embeddings[i])
+    YIELD node, score
+    WHERE score >= $min_score
+    RETURN i, node.chunk_id AS chunk_id, node.text AS text, score{codes}
+    ORDER BY i, score DESC
+    """
+    hits: List[List[Dict[str, object]]] = [[] for _ in query_embeddings]
+    for record in tx.run(query, k=k, embeddings=list(query_embeddings), min_score=min_score):
+        row = record.data()
+        hits[row.pop("i")].append(row)
+    return hits
+
+
+def search_relations_many(
+    tx,
+    query_embeddings: List[List[float]],
+    k: int,
+    min_score: float,
+) -> List[List[Dict[str, object]]]:
+    query = """
+    UNWIND range(0, size($embeddings) - 1) AS i
+    CALL db.index.vector.queryRelationships('relation_embedding', $k, $embeddings[i])
+    YIELD relationship, score
+    WHERE score >= $min_score
+    RETURN i,
+           id(relationship) AS rel_id,
+           score AS similarity,
+           relationship.relation_text AS relation_text,
+           toString(relationship.start_date) AS start_date,
+           toString(relationship.end_date) AS end_date,
+           relationship.chunk_ids AS chunk_ids,
+           id(startNode(relationship)) AS source_node_id,
+           id(endNode(relationship)) AS target_node_id,
+           startNode(relationship).entity_id AS source_entity_id,
+           endNode(relationship).entity_id AS target_entity_id,
+           startNode(relationship).name AS source_name,
+           endNode(relationship).name AS target_name,
+           startNode(relationship).entity_type AS source_type,
+           endNode(relationship).entity_type AS target_type
+    ORDER BY i, score DESC
+    """
+    hits: List[List[Dict[str, object]]] = [[] for _ in query_embeddings]
+    for record in tx.run(query, k=k, embeddings=list(query_embeddings), min_score=min_score):
+        row = record.data()
+        hits[row.pop("i")].append(row)
+    return hits
+
+
+@lru_cache(maxsize=65536)
+def _alias_token_sets(aliases: Tuple[str, ...]) -> Tuple[FrozenSet[str], ...]:
+    # Alias token sets per alias list, tokenized once per process instead of per row.
+    return tuple(frozenset(toks) for toks in scorable_alias_tokens(list(aliases)))
+
+
+def link_entities(tx, entities: List[QueryEntity]) -> List[Tuple[str, float]]:
+    # Links every query entity in one fulltext round trip; returns (entity_id, IoU)
+    # for candidates at or above ENTITY_IOU_THRESHOLD, best first, each id once.
+    keys = list(dict.fromkeys((e.name, e.entity_type) for e in entities if e.name.strip()))
+    if not keys:
+        return []
+    query = """
+    UNWIND range(0, size($queries) - 1) AS i
+    CALL {
+        WITH i
+        CALL db.index.fulltext.queryNodes('entity_name_aliases', $queries[i].query_text)
         YIELD node, score
-        WHERE ($type_strict = false OR node.entity_type = $entity_type)
+        WHERE ($type_strict = false OR node.entity_type = $queries[i].entity_type)
         RETURN node, score
         ORDER BY score DESC
         LIMIT $k
-        """
-        result = tx.run(
-            query,
-            query_text=_escape_lucene_query(entity.name),
-            entity_type=entity.entity_type,
-            type_strict=_entity_type_strict_dedup(),
-            k=_entity_bm25_k(),
+    }
+    RETURN i, node.entity_id AS entity_id, node.aliases AS aliases, score
+    """
+    result = tx.run(
+        query,
+        queries=[
+            {"query_text": escape_lucene_query(name), "entity_type": entity_type}
+            for name, entity_type in keys
+        ],
+        type_strict=entity_type_strict_dedup(),
+        k=_entity_bm25_k(),
+    )
+    threshold = _entity_iou_threshold()
+    query_tokens = [tokens(name) for name, _ in keys]
+    best: Dict[str, Tuple[float, float]] = {}
+    for record in result:
+        entity_id = record["entity_id"]
+        if not entity_id:
+            continue
+        incoming_toks = query_tokens[record["i"]]
+        link_iou = max(
+            (iou(incoming_toks, alias_toks) for alias_toks in _alias_token_sets(tuple(record["aliases"] or []))),
+            default=0.0,
         )
-        incoming_toks = tokens(entity.name)
-        for row in result:
-            node = row["node"]
-            aliases = node.get("aliases") or []
-            iou_alias = 0.0
-            for alias in aliases:
-                alias_toks = tokens(alias)
-                if len(aliases) > 1 and len(alias_toks) == 1:
-                    continue
-                iou_alias = max(iou_alias, iou(incoming_toks, alias_toks))
-            if iou_alias < _entity_iou_threshold():
-                continue
-            entity_id = node.get("entity_id")
-            if entity_id:
-                entity_ids.append(entity_id)
-    return entity_ids
+        if link_iou >= threshold:
+            best[entity_id] = max(best.get(entity_id, (0.0, 0.0)), (link_iou, record["score"]))
+    ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+    return [(entity_id, link_iou) for entity_id, (link_iou, _) in ranked]
+
+
+def link_entities_bm25(tx, entities: List[QueryEntity]) -> List[str]:
+    return [entity_id for entity_id, _ in link_entities(tx, entities)]
 
 
 def edges_for_entities(
@@ -239,12 +411,13 @@ def run_ppr_gds(
     )
 
     result = tx.run(
-        "CALL gds.pageRank.stream($name, {maxIterations: $max_iter, dampingFactor: $damping, sourceNodes: $seed_nodes}) "
+        "CALL gds.pageRank.stream($name, {maxIterations: $max_iter, dampingFactor: $damping, tolerance: $tolerance, sourceNodes: $seed_nodes}) "
         "YIELD nodeId, score "
         "RETURN gds.util.asNode(nodeId).entity_id AS entity_id, score",
         name=graph_name,
         max_iter=_ppr_max_iter(),
         damping=_ppr_damping(),
+        tolerance=_ppr_tolerance(),
         seed_nodes=seed_node_ids,
     )
     scores = {record["entity_id"]: record["score"] for record in result}
@@ -253,6 +426,28 @@ def run_ppr_gds(
     return scores
 
 
+def run_ppr_local(
+    time_valid_relations: List[Dict[str, object]], link_scores: Optional[Dict[str, float]] = None
+) -> Dict[str, float]:
+    # run_ppr_gds without the projection: the candidate edges are already in hand,
+    # so PPR runs on them in memory with every endpoint as a seed. Entities linked
+    # from the question seed with weight 1 + their link score.
+    edges = [(hit["source_node_id"], hit["target_node_id"]) for hit in time_valid_relations]
+    entity_ids: Dict[int, str] = {}
+    for hit in time_valid_relations:
+        entity_ids[hit["source_node_id"]] = hit["source_entity_id"]
+        entity_ids[hit["target_node_id"]] = hit["target_entity_id"]
+    seed_weights = {
+        node_id: 1.0 + link_scores[entity_id]
+        for node_id, entity_id in entity_ids.items()
+        if link_scores and entity_id in link_scores
+    }
+    scores = ppr_scores(
+        edges, list(entity_ids), _ppr_damping(), _ppr_max_iter(), _ppr_tolerance(), seed_weights or None
+    )
+    return {entity_ids[node_id]: score for node_id, score in scores.items()}
+
+
 def score_edges(time_valid_relations: List[Dict[str, object]], ppr_scores: Dict[str, float]) -> List[Dict[str, object]]:
     edges: List[Dict[str, object]] = []
     for hit in time_valid_relations:
@@ -324,9 +519,18 @@ def edge_search(session, query_embedding: List[float], entities: List[QueryEntit
         _relation_vector_threshold(),
     )
 
-    matched_entity_ids = session.execute_read(link_entities_bm25, entities)
-    alias_edges = session.execute_read(edges_for_entities, matched_entity_ids, time_range)
+    links = session.execute_read(link_entities, entities)
+    alias_edges = session.execute_read(edges_for_entities, [entity_id for entity_id, _ in links], time_range)
+
+    time_valid_relations = combine_relations(relation_hits, alias_edges, time_range)
+    return rank_edges(session, time_valid_relations, max_edges, dict(links))
 
+
+def combine_relations(
+    relation_hits: List[Dict[str, object]],
+    alias_edges: List[Dict[str, object]],
+    time_range: TimestampRange,
+) -> List[Dict[str, object]]:
     by_rel_id: Dict[int, Dict[str, object]] = {
         hit["rel_id"]: hit for hit in relation_hits
     }
@@ -334,12 +538,20 @@ def edge_search(session, query_embedding: List[float], entities: List[QueryEntit
         by_rel_id.setdefault(edge["rel_id"], edge)
 
     combined_relations = list(by_rel_id.values())
-    time_valid_relations = [
+    return [
         hit
         for hit in combined_relations
         if _time_overlaps(hit.get("start_date"), hit.get("end_date"), time_range)
     ]
 
+
+def rank_edges(
+    session,
+    time_valid_relations: List[Dict[str, object]],
+    max_edges: int,
+    link_scores: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, object]]:
+    # link_scores (entity id -> link score) weight the PPR seeds with the numpy engine.
     node_ids = set()
     rel_ids = []
     seed_node_ids = set()
@@ -350,28 +562,80 @@ def edge_search(session, query_embedding: List[float], entities: List[QueryEntit
         seed_node_ids.add(hit["source_node_id"])
         seed_node_ids.add(hit["target_node_id"])
 
-    ppr_scores = session.execute_write(
-        run_ppr_gds,
-        list(node_ids),
-        rel_ids,
-        list(seed_node_ids),
-    )
-
-    edges = score_edges(time_valid_relations, ppr_scores)
+    engine = ppr_engine()
+    if engine == "gds":
+        scores = session.execute_write(
+            run_ppr_gds,
+            list(node_ids),
+            rel_ids,
+            list(seed_node_ids),
+        )
+    elif engine == "gds_graph" and time_valid_relations:
+        try:
+            scores = run_ppr_projected(
+                session,
+                ensure_entity_graph(session),
+                list(node_ids),
+                list(seed_node_ids),
+                _ppr_damping(),
+                _ppr_max_iter(),
+                _ppr_tolerance(),
+            )
+        except Exception as exc:
+            # E.g. another process dropped the projection mid-query.
+            logger.warning("projected PPR failed, using the numpy engine: %r", exc)
+            scores = run_ppr_local(time_valid_relations, link_scores)
+    elif engine == "gds_graph":
+        scores = {}
+    else:
+        scores = run_ppr_local(time_valid_relations, link_scores)
+
+    edges = score_edges(time_valid_relations, scores)
     edges.sort(key=lambda e: e.get("edge_score", 0.0), reverse=True)
-    edges = edges[:max_edges]
+    return edges[:max_edges]
 
-    return edges
 
-def vector_search(session, query_embedding: List[float], max_chunks: int) -> List[Dict[str, object]]:
-    chunk_hits = session.execute_read(
-        search_chunks,
-        query_embedding,
-        _chunk_vector_k(),
-        _chunk_vector_threshold(),
-    )
+def rescore_chunk_hits(hits: List[Dict[str, object]], rescore_embedding: List[float], k: int) -> List[Dict[str, object]]:
+    # Re-ranks index hits by cosine against the int8 sidecar of the full embedding;
+    # hits without a sidecar keep their index score.
+    codes = [hit.pop("embedding_int8", None) for hit in hits]
+    for hit, code, score in zip(hits, codes, int8_cosine(rescore_embedding, codes)):
+        if code is not None:
+            hit["score"] = float(score)
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits[:k]
+
+
+def vector_search(
+    session,
+    query_embedding: List[float],
+    max_chunks: int,
+    rescore_embedding: Optional[List[float]] = None,
+) -> List[Dict[str, object]]:
+    if rescore_embedding is None:
+        chunk_hits = session.execute_read(
+            search_chunks,
+            query_embedding,
+            _chunk_vector_k(),
+            _chunk_vector_threshold(),
+        )
+    else:
+        chunk_hits = session.execute_read(
+            search_chunks,
+            query_embedding,
+            _chunk_vector_k() * _chunk_rescore_oversample(),
+            _chunk_vector_threshold(),
+            True,
+        )
+        chunk_hits = rescore_chunk_hits(chunk_hits, rescore_embedding, _chunk_vector_k())
     chunk_ids = [hit["chunk_id"] for hit in chunk_hits][:max_chunks]
     chunk_texts = session.execute_read(fetch_chunks, chunk_ids)
+    return _chunk_results(chunk_hits, chunk_texts, max_chunks)
+
+
+def _chunk_results(
+    chunk_hits: List[Dict[str, object]], chunk_texts: Dict[str, str], max_chunks: int
+) -> List[Dict[str, object]]:
     chunks: List[Dict[str, object]] = []
     for hit in chunk_hits[:max_chunks]:
         chunks.append({
@@ -382,28 +646,461 @@ def vector_search(session, query_embedding: List[float], max_chunks: int) -> Lis
 
     return chunks
 
-def retrieve(question: str, max_edges: int = 50, max_chunks: int = 12) -> Dict[str, object]:
-    entities, time_range = extract_query_entities_and_time(question)
-    driver = _neo4j_driver()
+
+def vector_search_many(
+    session,
+    query_embeddings: List[List[float]],
+    max_chunks: int,
+    rescore_embeddings: Optional[List[List[float]]] = None,
+) -> List[List[Dict[str, object]]]:
+    # vector_search for a batch of questions: one vector query and one text fetch.
+    if rescore_embeddings is None:
+        hits_per_query = session.execute_read(
+            search_chunks_many,
+            query_embeddings,
+            _chunk_vector_k(),
+            _chunk_vector_threshold(),
+        )
+    else:
+        hits_per_query = session.execute_read(
+            search_chunks_many,
+            query_embeddings,
+            _chunk_vector_k() * _chunk_rescore_oversample(),
+            _chunk_vector_threshold(),
+            True,
+        )
+        hits_per_query = [
+            rescore_chunk_hits(hits, rescore, _chunk_vector_k())
+            for hits, rescore in zip(hits_per_query, rescore_embeddings)
+        ]
+    chunk_ids = list(dict.fromkeys(hit["chunk_id"] for hits in hits_per_query for hit in hits[:max_chunks]))
+    chunk_texts = session.execute_read(fetch_chunks, chunk_ids)
+    return [_chunk_results(hits, chunk_texts, max_chunks) for hits in hits_per_query]
+
+def embed_question(question: str, client=None) -> Tuple[List[float], Optional[List[float]]]:
+    # (query embedding, full embedding for int8 rescoring or None)
+    query_embeddings, rescore_embeddings = embed_questions([question], client)
+    return query_embeddings[0], rescore_embeddings[0] if rescore_embeddings is not None else None
+
+
+def embed_questions(
+    questions: List[str], client=None
+) -> Tuple[List[List[float]], Optional[List[List[float]]]]:
+    if embedding_int8_sidecar():
+        rescore_embeddings = embed_source_texts(questions, client=client)
+        return stored_vectors(rescore_embeddings, EMBEDDING_DIM), rescore_embeddings
+    return embed_texts(questions, client=client), None
+
+
+def retrieve(
+    question: str,
+    max_edges: int = 50,
+    max_chunks: int = 12,
+    driver=None,
+    llm_client=None,
+    embedding_client=None,
+) -> Dict[str, object]:
+    # Without a driver or clients, each call opens its own (see RetrievalService).
+    # With QUERY_CACHE, repeated and near-duplicate questions skip the searches.
+    started = time.monotonic()
+    params = _cache_params(max_edges, max_chunks, False)
+    owns_driver = driver is None
+    driver = driver or _neo4j_driver()
+    try:
+        cache = _validated_cache(driver)
+        cached = cache.lookup(question, params) if cache is not None else None
+        if cached is not None:
+            return cached
+        entities, time_range = extract_query_entities_and_time(question, llm_client, _query_matcher(driver))
+        query_embedding, rescore_embedding = embed_question(question, embedding_client)
+        if cache is not None:
+            cached = cache.lookup_similar(
+                question, query_embedding, time_range, params, time.monotonic() - started
+            )
+            if cached is not None:
+                return cached
+        with driver.session() as session:
+            #todo maybe run both edge_search and vector_search async Promise.all style but probly not worth it
+            #edges = edge_search(session, query_embedding, entities, time_range, max_edges)
+
+            chunks = vector_search(session, query_embedding, max_chunks, rescore_embedding)
+            #fused = chunks
+            fused = rrf_fuse(
+                #edges,
+                [],
+                chunks, _rrf_k())
+            context = format_context(fused)
+    finally:
+        if owns_driver:
+            driver.close()
+
+    result = {
+        "question": question,
+        "time_range": time_range,
+        #"edges": edges,
+        "chunks": chunks,
+        "context": context,
+    }
+    if cache is not None:
+        cache.put(question, params, result, query_embedding, time_range, time.monotonic() - started)
+    return result
+
+
+_REQUIRED = object()
+
+
+async def _stage(
+    timings: Dict[str, float],
+    name: str,
+    awaitable: Awaitable[T],
+    timeout_s: float,
+    fallback: object = _REQUIRED,
+) -> T:
+    # Awaits one retrieval stage with its own timeout. Optional stages (with a
+    # fallback) degrade to it on timeout or error; required ones raise.
+    started = time.monotonic()
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout_s)
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        if fallback is _REQUIRED:
+            raise
+        logger.warning("retrieval stage %s failed, continuing without it: %r", name, exc)
+        return fallback
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.monotonic() - started
+
+
+def _read(driver, work, *args):
     with driver.session() as session:
-        query_embedding = embed_texts([question])[0]
+        return session.execute_read(work, *args)
+
 
-        #todo maybe run both edge_search and vector_search async Promise.all style but probly not worth it
-        #edges = edge_search(session, query_embedding, entities, time_range, max_edges)
+def _with_session(driver, work, *args):
+    with driver.session() as session:
+        return work(session, *args)
+
+
+async def retrieve_async(
+    question: str,
+    max_edges: int = 50,
+    max_chunks: int = 12,
+    with_edges: Optional[bool] = None,
+    driver=None,
+    llm_client=None,
+    embedding_client=None,
+) -> Dict[str, object]:
+    # retrieve() with independent stages overlapped: query entity extraction runs
+    # alongside the question embedding; chunk and relation vector search start as soon
+    # as the embedding is there, entity linking as soon as the entities are. Neo4j
+    # stages run in threads, each with its own session. A slow or failing entity
+    # extraction only costs the time filter and the linked edges, never the chunks.
+    with_edges = _retrieve_edges() if with_edges is None else with_edges
+    timings: Dict[str, float] = {}
+    started = time.monotonic()
+    params = _cache_params(max_edges, max_chunks, with_edges)
+    owns_driver = driver is None
+    driver = driver or _neo4j_driver()
+    search_timeout = _stage_timeout("SEARCH", "15")
+    try:
+        cache = await asyncio.to_thread(_validated_cache, driver)
+    except BaseException:
+        if owns_driver:
+            driver.close()
+        raise
+    cached = cache.lookup(question, params) if cache is not None else None
+    if cached is not None:
+        if owns_driver:
+            driver.close()
+        cached["timings"] = {"total": time.monotonic() - started}
+        return cached
+
+    entities_task = asyncio.ensure_future(_stage(
+        timings,
+        "query_entities",
+        _query_entities_and_time(question, llm_client, driver),
+        _stage_timeout("EXTRACT", "15"),
+        ([], TimestampRange(None, None)),
+    ))
+    embedding_task = asyncio.ensure_future(_stage(
+        timings,
+        "embedding",
+        asyncio.to_thread(embed_question, question, embedding_client),
+        _stage_timeout("EMBED", "15"),
+    ))
+
+    async def chunk_path() -> List[Dict[str, object]]:
+        query_embedding, rescore_embedding = await embedding_task
+        return await _stage(
+            timings,
+            "chunk_search",
+            asyncio.to_thread(_with_session, driver, vector_search, query_embedding, max_chunks, rescore_embedding),
+            search_timeout,
+        )
 
-        chunks = vector_search(session, query_embedding, max_chunks)
-        #fused = chunks
-        fused = rrf_fuse(
-            #edges,
+    async def relation_hits() -> List[Dict[str, object]]:
+        query_embedding, _ = await embedding_task
+        return await _stage(
+            timings,
+            "relation_search",
+            asyncio.to_thread(
+                _read, driver, search_relations, query_embedding, _relation_vector_k(), _relation_vector_threshold()
+            ),
+            search_timeout,
             [],
-            chunks, _rrf_k())
-        context = format_context(fused)
+        )
 
-    driver.close()
-    return {
+    async def alias_edges() -> Tuple[List[Dict[str, object]], Dict[str, float]]:
+        entities, time_range = await entities_task
+        if not entities:
+            return [], {}
+        links = await _stage(
+            timings, "entity_linking", asyncio.to_thread(_read, driver, link_entities, entities), search_timeout, []
+        )
+        return await _stage(
+            timings,
+            "alias_edges",
+            asyncio.to_thread(_read, driver, edges_for_entities, [entity_id for entity_id, _ in links], time_range),
+            search_timeout,
+            [],
+        ), dict(links)
+
+    async def edge_path() -> List[Dict[str, object]]:
+        hits, (aliases, link_scores) = await asyncio.gather(relation_hits(), alias_edges())
+        _, time_range = await entities_task
+        return await _stage(
+            timings,
+            "ppr",
+            asyncio.to_thread(
+                _with_session,
+                driver,
+                rank_edges,
+                combine_relations(hits, aliases, time_range),
+                max_edges,
+                link_scores,
+            ),
+            _stage_timeout("PPR", "30"),
+            [],
+        )
+
+    async def similar_hit() -> Optional[Dict[str, object]]:
+        # Searches wait for the embedding anyway; only when a cached question is
+        # close enough do they also wait for the time range to confirm the hit.
+        query_embedding, _ = await embedding_task
+        if not cache.has_similar(query_embedding, params):
+            return None
+        _, time_range = await entities_task
+        return cache.lookup_similar(question, query_embedding, time_range, params, time.monotonic() - started)
+
+    tasks = [entities_task, embedding_task]
+    try:
+        if cache is not None:
+            cached = await similar_hit()
+        if cached is None:
+            tasks.append(asyncio.ensure_future(chunk_path()))
+            if with_edges:
+                tasks.append(asyncio.ensure_future(edge_path()))
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if owns_driver:
+            driver.close()
+
+    timings["total"] = time.monotonic() - started
+    if cached is not None:
+        cached["timings"] = timings
+        return cached
+    _, time_range = entities_task.result()
+    query_embedding, _ = embedding_task.result()
+    chunks = tasks[2].result()
+    edges = tasks[3].result() if with_edges else []
+    fused = rrf_fuse(edges, chunks, _rrf_k())
+    result = {
         "question": question,
         "time_range": time_range,
-        #"edges": edges,
+        "edges": edges,
         "chunks": chunks,
-        "context": context,
+        "context": format_context(fused),
+        "timings": timings,
     }
+    if cache is not None:
+        cache.put(question, params, result, query_embedding, time_range, timings["total"])
+    return result
+
+
+async def retrieve_many_async(
+    questions: List[str],
+    max_edges: int = 50,
+    max_chunks: int = 12,
+    with_edges: Optional[bool] = None,
+    driver=None,
+    llm_client=None,
+    embedding_client=None,
+) -> List[Dict[str, object]]:
+    # retrieve_async for many questions: query entities are extracted concurrently
+    # (RETRIEVE_MANY_CONCURRENCY at a time) while questions are embedded and searched
+    # in batches of RETRIEVE_MANY_BATCH, one embedding call and one UNWIND vector
+    # query per batch. Results come back in input order. With QUERY_CACHE, repeated
+    # questions are answered from the cache and only the rest go through the batches
+    # (the near-duplicate tier needs per-question time ranges before the search and
+    # is left to retrieve and retrieve_async).
+    with_edges = _retrieve_edges() if with_edges is None else with_edges
+    params = _cache_params(max_edges, max_chunks, with_edges)
+    owns_driver = driver is None
+    driver = driver or _neo4j_driver()
+    try:
+        cache = await asyncio.to_thread(_validated_cache, driver)
+        results: List[Optional[Dict[str, object]]] = [
+            cache.lookup(question, params) if cache is not None else None for question in questions
+        ]
+        misses = [i for i, result in enumerate(results) if result is None]
+        started = time.monotonic()
+        fresh, embeddings = await _retrieve_many_uncached(
+            [questions[i] for i in misses], max_edges, max_chunks, with_edges, driver, llm_client, embedding_client
+        ) if misses else ([], [])
+    finally:
+        if owns_driver:
+            driver.close()
+    # Batched questions share their cost; each entry is charged an equal part.
+    cost_s = (time.monotonic() - started) / len(misses) if misses else 0.0
+    for i, result, embedding in zip(misses, fresh, embeddings):
+        results[i] = result
+        if cache is not None:
+            cache.put(questions[i], params, result, embedding, result["time_range"], cost_s)
+    return results
+
+
+async def _retrieve_many_uncached(
+    questions: List[str],
+    max_edges: int,
+    max_chunks: int,
+    with_edges: bool,
+    driver,
+    llm_client,
+    embedding_client,
+) -> Tuple[List[Dict[str, object]], List[List[float]]]:
+    # Results and query embeddings, in input order.
+    limit = asyncio.Semaphore(_retrieve_many_concurrency())
+    search_timeout = _stage_timeout("SEARCH", "15")
+    started = time.monotonic()
+    timings: Dict[str, float] = {}
+
+    async def entities_for(question: str) -> Tuple[List[QueryEntity], TimestampRange]:
+        async with limit:
+            return await _stage(
+                {},
+                "query_entities",
+                _query_entities_and_time(question, llm_client, driver),
+                _stage_timeout("EXTRACT", "15"),
+                ([], TimestampRange(None, None)),
+            )
+
+    async def edges_for(
+        entity_task: "asyncio.Future[Tuple[List[QueryEntity], TimestampRange]]", relation_hits: List[Dict[str, object]]
+    ) -> List[Dict[str, object]]:
+        entities, time_range = await entity_task
+        async with limit:
+            aliases: List[Dict[str, object]] = []
+            links: List[Tuple[str, float]] = []
+            if entities:
+                links = await _stage(
+                    {}, "entity_linking", asyncio.to_thread(_read, driver, link_entities, entities), search_timeout, []
+                )
+                aliases = await _stage(
+                    {},
+                    "alias_edges",
+                    asyncio.to_thread(
+                        _read, driver, edges_for_entities, [entity_id for entity_id, _ in links], time_range
+                    ),
+                    search_timeout,
+                    [],
+                )
+            return await _stage(
+                {},
+                "ppr",
+                asyncio.to_thread(
+                    _with_session,
+                    driver,
+                    rank_edges,
+                    combine_relations(relation_hits, aliases, time_range),
+                    max_edges,
+                    dict(links),
+                ),
+                _stage_timeout("PPR", "30"),
+                [],
+            )
+
+    entity_tasks = [asyncio.ensure_future(entities_for(question)) for question in questions]
+    edge_tasks: List["asyncio.Future[List[Dict[str, object]]]"] = []
+    chunks: List[List[Dict[str, object]]] = []
+    embeddings: List[List[float]] = []
+    try:
+        batch_size = _retrieve_many_batch()
+        for offset in range(0, len(questions), batch_size):
+            batch = questions[offset:offset + batch_size]
+            query_embeddings, rescore_embeddings = await _stage(
+                timings,
+                "embedding",
+                asyncio.to_thread(embed_questions, batch, embedding_client),
+                _stage_timeout("EMBED", "15"),
+            )
+            embeddings.extend(query_embeddings)
+            chunks.extend(await _stage(
+                timings,
+                "chunk_search",
+                asyncio.to_thread(
+                    _with_session, driver, vector_search_many, query_embeddings, max_chunks, rescore_embeddings
+                ),
+                search_timeout,
+            ))
+            if with_edges:
+                relation_hits = await _stage(
+                    timings,
+                    "relation_search",
+                    asyncio.to_thread(
+                        _read,
+                        driver,
+                        search_relations_many,
+                        query_embeddings,
+                        _relation_vector_k(),
+                        _relation_vector_threshold(),
+                    ),
+                    search_timeout,
+                    [[] for _ in batch],
+                )
+                edge_tasks.extend(
+                    asyncio.ensure_future(edges_for(entity_tasks[offset + i], hits))
+                    for i, hits in enumerate(relation_hits)
+                )
+        entity_results = await asyncio.gather(*entity_tasks)
+        edge_results = await asyncio.gather(*edge_tasks) if with_edges else [[] for _ in questions]
+    finally:
+        pending = entity_tasks + edge_tasks
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    logger.info(
+        "retrieved %s questions in %.2f seconds (embedding %.2fs, chunk search %.2fs)",
+        len(questions),
+        time.monotonic() - started,
+        timings.get("embedding", 0.0),
+        timings.get("chunk_search", 0.0),
+    )
+    results: List[Dict[str, object]] = []
+    for question, (_, time_range), question_chunks, edges in zip(questions, entity_results, chunks, edge_results):
+        results.append({
+            "question": question,
+            "time_range": time_range,
+            "edges": edges,
+            "chunks": question_chunks,
+            "context": format_context(rrf_fuse(edges, question_chunks, _rrf_k())),
+        })
+    return results, embeddings
+
+
+def retrieve_many(questions: List[str], max_edges: int = 50, max_chunks: int = 12, **kwargs) -> List[Dict[str, object]]:
+    return asyncio.run(retrieve_many_async(questions, max_edges, max_chunks, **kwargs))
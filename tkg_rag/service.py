@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .answer import generate_answer
+from .ingest import _neo4j_driver
+from .llm_client import async_openai_client, embedding_openai_client, openai_client
+from .query_cache import query_cache
+from .retrieve import _query_matcher, embed_question, retrieve, retrieve_async, retrieve_many_async, search_chunks
+from .settings import EMBEDDING_MODEL, LLM_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+def _neo4j_pool_config() -> Dict[str, object]:
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_S", "30")),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME_S", "3600")),
+        "keep_alive": True,
+    }
+
+
+def _http_limits():
+    try:
+        import httpx
+    except ImportError as exc:
+        raise RuntimeError("httpx package is required. Install it to run this action.") from exc
+    max_connections = int(os.getenv("RETRIEVAL_HTTP_MAX_CONNECTIONS", "20"))
+    return httpx, httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=float(os.getenv("RETRIEVAL_HTTP_KEEPALIVE_S", "60")),
+    )
+
+
+def _overlap_stages() -> bool:
+    return os.getenv("RETRIEVAL_OVERLAP_STAGES", "false").strip().lower() in {"1", "true", "yes"}
+
+
+class RetrievalService:
+    # Long-lived retrieval: one Neo4j driver with a sized pool and keep-alive HTTP
+    # clients for the LLM and the embedding provider, shared by every question. With
+    # overlap_stages, retrieve() runs retrieve_async on a loop owned by the service
+    # (as retrieve_many always does), so the async client and its connections
+    # survive between questions too.
+    def __init__(self, warm_up: bool = False, overlap_stages: Optional[bool] = None) -> None:
+        httpx, self._limits = _http_limits()
+        self.overlap_stages = _overlap_stages() if overlap_stages is None else overlap_stages
+        self.driver = _neo4j_driver(**_neo4j_pool_config())
+        self._http = httpx.Client(limits=self._limits)
+        self.llm_client = openai_client(http_client=self._http)
+        self.embedding_client = embedding_openai_client(http_client=self._http)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_http = None
+        self.async_llm_client = None
+        if self.overlap_stages:
+            self._start_loop()
+        if warm_up:
+            self.warm_up()
+
+    def _start_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            httpx, _ = _http_limits()
+            self._loop = asyncio.new_event_loop()
+            self._async_http = httpx.AsyncClient(limits=self._limits)
+            self.async_llm_client = async_openai_client(http_client=self._async_http)
+        return self._loop
+
+    def __enter__(self) -> "RetrievalService":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def warm_up(self) -> None:
+        # Opens the Bolt and HTTP connections, touches the chunk vector index and builds
+        # the QUERY_FAST_PATH matcher, so the first question does not pay for them.
+        started = time.monotonic()
+        self.driver.verify_connectivity()
+        query_embedding, _ = embed_question("warm-up", self.embedding_client)
+        with self.driver.session() as session:
+            session.execute_read(search_chunks, query_embedding, 1, 0.0)
+        _query_matcher(self.driver)
+        if EMBEDDING_MODEL:
+            self.embedding_client.embeddings.create(model=EMBEDDING_MODEL, input=["warm-up"])
+        if LLM_MODEL:
+            self.llm_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1,
+            )
+            if self.overlap_stages:
+                self._start_loop().run_until_complete(self.async_llm_client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[{"role": "user", "content": "ping"}],
+                    max_tokens=1,
+                ))
+        logger.info("retrieval service warmed up in %.2f seconds", time.monotonic() - started)
+
+    def retrieve(self, question: str, max_edges: int = 50, max_chunks: int = 12) -> Dict[str, object]:
+        if self.overlap_stages:
+            return self._start_loop().run_until_complete(retrieve_async(
+                question,
+                max_edges,
+                max_chunks,
+                driver=self.driver,
+                llm_client=self.async_llm_client,
+                embedding_client=self.embedding_client,
+            ))
+        return retrieve(
+            question,
+            max_edges,
+            max_chunks,
+            driver=self.driver,
+            llm_client=self.llm_client,
+            embedding_client=self.embedding_client,
+        )
+
+    def retrieve_many(self, questions: List[str], max_edges: int = 50, max_chunks: int = 12) -> List[Dict[str, object]]:
+        return self._start_loop().run_until_complete(retrieve_many_async(
+            questions,
+            max_edges,
+            max_chunks,
+            driver=self.driver,
+            llm_client=self.async_llm_client,
+            embedding_client=self.embedding_client,
+        ))
+
+    def answer(self, question: str, context: Optional[str] = None) -> str:
+        if context is None:
+            context = self.retrieve(question)["context"]
+        return generate_answer(question, context, self.llm_client)
+
+    def answer_many(self, questions: List[str], contexts: List[str]) -> List[str]:
+        # Answers in input order, RETRIEVE_MANY_CONCURRENCY completions at a time.
+        workers = max(1, int(os.getenv("RETRIEVE_MANY_CONCURRENCY", "8")))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.answer, questions, contexts))
+
+    def cache_stats(self) -> Optional[Dict[str, object]]:
+        # Hits per tier, hit rate and retrieval seconds saved, or None without QUERY_CACHE.
+        cache = query_cache()
+        return cache.stats() if cache is not None else None
+
+    def fast_path_stats(self) -> Optional[Dict[str, object]]:
+        # Questions answered by the local extractor vs the LLM, or None without QUERY_FAST_PATH.
+        matcher = _query_matcher(self.driver)
+        return matcher.stats() if matcher is not None else None
+
+    def close(self) -> None:
+        self.driver.close()
+        self._http.close()
+        if self._loop is not None:
+            self._loop.run_until_complete(self._async_http.aclose())
+            self._loop.close()
+            self._loop = None
@@ -16,3 +16,10 @@ EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "4096"))
 RELATION_DEDUP_SIM_THRESHOLD = float(os.getenv("RELATION_DEDUP_SIM_THRESHOLD", "0.85"))
 
+
+def entity_type_strict_dedup() -> bool:
+    return os.getenv("ENTITY_DEDUP_TYPE_STRICT", "true").strip().lower() in {
+        "1",
+        "true",
+        "yes",
+    }
@@ -17,3 +17,8 @@ def iou(a: set[str], b: set[str]) -> float:
     inter = len(a & b)
     union = len(a | b)
     return inter / union
+
+
+def escape_lucene_query(text: str) -> str:
+    # Escape Lucene special chars to avoid query parser errors.
+    return re.sub(r'([+\-!(){}[\]^"~*?:\\/]|&&|\|\|)', r"\\\1", text)
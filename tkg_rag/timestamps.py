@@ -0,0 +1,185 @@
+import calendar
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Tuple
+
+from .models import TimestampRange
+
+_MONTHS = {
+    "january": 1,
+    "jan": 1,
+    "february": 2,
+    "feb": 2,
+    "march": 3,
+    "mar": 3,
+    "april": 4,
+    "apr": 4,
+    "may": 5,
+    "june": 6,
+    "jun": 6,
+    "july": 7,
+    "jul": 7,
+    "august": 8,
+    "aug": 8,
+    "september": 9,
+    "sep": 9,
+    "sept": 9,
+    "october": 10,
+    "oct": 10,
+    "november": 11,
+    "nov": 11,
+    "december": 12,
+    "dec": 12,
+}
+
+_RANGE_SEP = r"\s*(?:-\s*|to\s+)"
+
+
+def _month_end(year: int, month: int) -> str:
+    return f"{year}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}"
+
+
+def _month_num(month: str) -> Optional[int]:
+    return _MONTHS.get(month.lower())
+
+
+def _date(m) -> TimestampRange:
+    # Passed through unvalidated; date_ordinal() is None for impossible dates.
+    return TimestampRange(m.group(0), m.group(0))
+
+
+def _year(m) -> TimestampRange:
+    y = m.group("y")
+    return TimestampRange(f"{y}-01-01", f"{y}-12-31")
+
+
+def _year_month(m) -> Optional[TimestampRange]:
+    y, mo = int(m.group("y")), int(m.group("m"))
+    if not 1 <= mo <= 12:
+        return None
+    return TimestampRange(f"{y}-{mo:02d}-01", _month_end(y, mo))
+
+
+def _quarter(m) -> TimestampRange:
+    q = int(m.group("q1") or m.group("q2"))
+    y = int(m.group("y1") or m.group("y2"))
+    start_month = 3 * (q - 1) + 1
+    return TimestampRange(f"{y}-{start_month:02d}-01", _month_end(y, start_month + 2))
+
+
+def _month_range(m) -> Optional[TimestampRange]:
+    m1, m2 = _month_num(m.group("m1")), _month_num(m.group("m2"))
+    if not (m1 and m2):
+        return None
+    groups = m.groupdict()
+    y1 = int(groups.get("y1") or groups["y2"])
+    y2 = int(groups["y2"])
+    return TimestampRange(f"{y1}-{m1:02d}-01", _month_end(y2, m2))
+
+
+def _point_range(m) -> Optional[TimestampRange]:
+    # "<start> to <end>" as the extraction prompt asks for; either side may be missing
+    # and each side may be any single-period format above.
+    start = _parse_point(m.group("start")) if m.group("start") else None
+    end = _parse_point(m.group("end")) if m.group("end") else None
+    if (m.group("start") and start is None) or (m.group("end") and end is None):
+        return None
+    if start is None and end is None:
+        return None
+    return TimestampRange(start.start_date if start else None, end.end_date if end else None)
+
+
+_Rule = Tuple[Pattern[str], Callable[..., Optional[TimestampRange]]]
+
+# Single periods; a range side must match one of these.
+_POINT_RULES: List[_Rule] = [
+    (re.compile(r"^\d{4}-\d{2}-\d{2}$"), _date),
+    (re.compile(r"^(?P<y>\d{4})$"), _year),
+    (re.compile(r"^(?P<y>\d{4})-(?P<m>\d{2})$"), _year_month),
+    (re.compile(r"^(?:Q(?P<q1>[1-4])\s*(?P<y1>\d{4})|(?P<y2>\d{4})-Q(?P<q2>[1-4]))$"), _quarter),
+]
+
+_RULES: List[_Rule] = _POINT_RULES + [
+    (
+        re.compile(rf"^(?P<m1>[A-Za-z]+){_RANGE_SEP}(?P<m2>[A-Za-z]+)\s*(?P<y2>\d{{4}})$", re.IGNORECASE),
+        _month_range,
+    ),
+    (
+        re.compile(
+            rf"^(?P<m1>[A-Za-z]+)\s+(?P<y1>\d{{4}}){_RANGE_SEP}(?P<m2>[A-Za-z]+)\s+(?P<y2>\d{{4}})$",
+            re.IGNORECASE,
+        ),
+        _month_range,
+    ),
+    (
+        re.compile(r"^(?P<start>\S+(?:\s\S+)?)?\s*\bto\b\s*(?P<end>\S+(?:\s\S+)?)?$", re.IGNORECASE),
+        _point_range,
+    ),
+]
+
+
+def _apply(rules: List[_Rule], name: str) -> Optional[TimestampRange]:
+    for pattern, handler in rules:
+        m = pattern.match(name)
+        if m:
+            parsed = handler(m)
+            if parsed is not None:
+                return parsed
+    return None
+
+
+def _parse_point(name: str) -> Optional[TimestampRange]:
+    return _apply(_POINT_RULES, name.strip())
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp_range(name: str) -> TimestampRange:
+    return _apply(_RULES, name.strip()) or TimestampRange(None, None)
+
+
+def parse_timestamp_ranges(names: Iterable[str]) -> Dict[str, TimestampRange]:
+    return {name: parse_timestamp_range(name) for name in names}
+
+
+_ORDINAL_QUARTERS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+_YEAR = r"(?:19|20)\d{2}"
+
+# Time expressions inside free text (questions), most specific first.
+_MENTION_RE = re.compile(
+    rf"""\b(?:
+        (?P<date>{_YEAR}-\d{{2}}-\d{{2}})
+      | (?P<ym_y>{_YEAR})-(?P<ym_m>\d{{2}})(?![\d-])
+      | Q(?P<q1>[1-4])\s*(?:of\s+)?(?:FY\s*)?(?P<qy1>{_YEAR})
+      | (?P<qy2>{_YEAR})[\s-]*Q(?P<q2>[1-4])
+      | (?P<qo>{"|".join(_ORDINAL_QUARTERS)})\s+quarter\s+(?:of\s+)?(?P<qy3>{_YEAR})
+      | (?P<mn>{"|".join(sorted(_MONTHS, key=len, reverse=True))})\.?\s+(?P<my>{_YEAR})
+      | (?P<year>{_YEAR})
+    )\b""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def _mention_name(m) -> Optional[Tuple[str, str]]:
+    # (name in a format parse_timestamp_range reads, query time type)
+    if m.group("date"):
+        return m.group("date"), "date"
+    if m.group("ym_y"):
+        return f"{m.group('ym_y')}-{m.group('ym_m')}", "date_range"
+    quarter = m.group("q1") or m.group("q2") or _ORDINAL_QUARTERS.get((m.group("qo") or "").lower())
+    if quarter:
+        year = m.group("qy1") or m.group("qy2") or m.group("qy3")
+        return f"{year}-Q{quarter}", "quarter"
+    if m.group("mn"):
+        return f"{m.group('my')}-{_month_num(m.group('mn')):02d}", "date_range"
+    return m.group("year"), "year"
+
+
+def find_timestamp_mentions(text: str) -> List[Tuple[int, int, str, str]]:
+    # (start, end, name, time type) of each time expression in text; every name
+    # parses with parse_timestamp_range.
+    mentions: List[Tuple[int, int, str, str]] = []
+    for m in _MENTION_RE.finditer(text):
+        named = _mention_name(m)
+        if named and parse_timestamp_range(named[0]).start_date:
+            mentions.append((m.start(), m.end(), named[0], named[1]))
+    return mentions